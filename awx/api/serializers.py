@@ -49,7 +49,7 @@ from ansible_base.rbac.models import RoleEvaluation, ObjectRole
 from ansible_base.rbac import permission_registry
 
 # AWX
-from awx.main.access import get_user_capabilities
+from awx.main.access import get_page_user_capabilities, get_user_capabilities
 from awx.main.constants import ACTIVE_STATES, CENSOR_VALUE, org_role_to_permission
 from awx.main.models import (
     ActivityStream,
@@ -120,6 +120,7 @@ from awx.main.utils import (
     get_licenser,
 )
 from awx.main.utils.filters import SmartFilter
+from awx.main.utils.inventory_cache import bump_inventory_revision
 from awx.main.utils.named_url_graph import reset_counters
 from awx.main.scheduler.task_manager_models import TaskManagerModels
 from awx.main.redact import UriCleaner, REPLACE_STR
@@ -492,8 +493,8 @@ class BaseSerializer(serializers.ModelSerializer, metaclass=BaseSerializerMetacl
     def _obj_capability_dict(self, obj):
         """
         Returns the user_capabilities dictionary for a single item
-        If inside of a list view, it runs the prefetching algorithm for
-        the entire current page, saves it into context
+        If inside of a list view, it computes the capabilities of all items
+        of the same type on the current page at once, saves them into context
         """
         view = self.context.get('view', None)
         parent_obj = None
@@ -501,6 +502,7 @@ class BaseSerializer(serializers.ModelSerializer, metaclass=BaseSerializerMetacl
             parent_obj = view.get_parent_object()
         if view and view.request and view.request.user:
             capabilities_cache = {}
+            capabilities_map = {}
             # if serializer has parent, it is ListView, apply page capabilities prefetch
             if self.parent and hasattr(self, 'capabilities_prefetch') and self.capabilities_prefetch:
                 qs = self.parent.instance
@@ -512,8 +514,23 @@ class BaseSerializer(serializers.ModelSerializer, metaclass=BaseSerializerMetacl
                         model = self.Meta.model
                         prefetch_list = self.capabilities_prefetch
                     self.context['capability_map'] = prefetch_page_capabilities(model, qs, prefetch_list, view.request.user)
-                if obj.id in self.context['capability_map']:
-                    capabilities_cache = self.context['capability_map'][obj.id]
+                capabilities_map = self.context['capability_map']
+                if obj.id in capabilities_map:
+                    capabilities_cache = capabilities_map[obj.id]
+            if isinstance(self.parent, serializers.ListSerializer):
+                page_capabilities = self.context.setdefault('page_capabilities', {})
+                if type(obj) not in page_capabilities:
+                    page = [item for item in self.parent.instance if type(item) is type(obj)]
+                    page_capabilities[type(obj)] = get_page_user_capabilities(
+                        view.request.user,
+                        type(obj),
+                        page,
+                        method_list=self.show_capabilities,
+                        parent_obj=parent_obj,
+                        capabilities_map=capabilities_map,
+                    )
+                if obj.pk in page_capabilities[type(obj)]:
+                    return page_capabilities[type(obj)][obj.pk]
             return get_user_capabilities(
                 view.request.user, obj, method_list=self.show_capabilities, parent_obj=parent_obj, capabilities_cache=capabilities_cache
             )
@@ -1321,6 +1338,7 @@ class OAuth2ApplicationSerializer(BaseSerializer):
 
 class OrganizationSerializer(BaseSerializer):
     show_capabilities = ['edit', 'delete']
+    capabilities_prefetch = ['admin']
 
     class Meta:
         model = Organization
@@ -2178,6 +2196,8 @@ class BulkHostCreateSerializer(serializers.Serializer):
             Host.objects.bulk_create(result)
         except Exception as e:
             raise serializers.ValidationError({"detail": _(f"cannot create host, host creation error {e}")})
+        # bulk_create sends no signals
+        bump_inventory_revision(validated_data['inventory'].id)
         new_total_hosts = old_total_hosts + len(result)
         request = self.context.get('request', None)
         changes = {'total_hosts': [old_total_hosts, new_total_hosts]}
@@ -2669,6 +2689,7 @@ class InventoryUpdateCancelSerializer(InventoryUpdateSerializer):
 
 class TeamSerializer(BaseSerializer):
     show_capabilities = ['edit', 'delete']
+    capabilities_prefetch = ['admin']
 
     class Meta:
         model = Team
@@ -29,7 +29,7 @@ from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from django.template.loader import render_to_string
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import gettext_lazy as _
 
@@ -58,7 +58,6 @@ from social_core.backends.utils import load_backends
 from oauth2_provider.models import get_access_token_model
 
 import pytz
-from wsgiref.util import FileWrapper
 
 # django-ansible-base
 from ansible_base.rbac.models import RoleEvaluation, ObjectRole
@@ -102,6 +101,7 @@ from awx.main.utils import (
 )
 from awx.main.utils.encryption import encrypt_value
 from awx.main.utils.filters import SmartFilter
+from awx.main.utils.stdout import split_lines
 from awx.main.redact import UriCleaner
 from awx.api.permissions import (
     JobTemplateCallbackPermission,
@@ -599,7 +599,7 @@ class SchedulePreview(GenericAPIView):
         if serializer.is_valid():
             next_stamp = now()
             schedule = []
-            gen = models.Schedule.rrulestr(serializer.validated_data['rrule']).xafter(next_stamp, count=20)
+            gen = models.Schedule.occurrences(serializer.validated_data['rrule']).xafter(next_stamp, count=20)
 
             # loop across the entire generator and grab the first 10 events
             for event in gen:
@@ -3713,106 +3713,22 @@ class JobJobEventsList(BaseJobEventsList):
 
 class JobJobEventsChildrenSummary(APIView):
     renderer_classes = [JSONRenderer]
-    meta_events = ('debug', 'verbose', 'warning', 'error', 'system_warning', 'deprecated')
 
     def get(self, request, **kwargs):
         resp = dict(children_summary={}, meta_event_nested_uuid={}, event_processing_finished=False, is_tree=True)
         job = get_object_or_404(models.Job, pk=kwargs['pk'])
-        if not job.event_processing_finished:
-            return Response(resp)
-        else:
-            resp["event_processing_finished"] = True
-
-        events = list(job.get_event_queryset().values('counter', 'uuid', 'parent_uuid', 'event').order_by('counter'))
-        if len(events) == 0:
-            return Response(resp)
-
-        # key is counter, value is number of total children (including children of children, etc.)
-        map_counter_children_tally = {i['counter']: {"rowNumber": 0, "numChildren": 0} for i in events}
-        # key is uuid, value is counter
-        map_uuid_counter = {i['uuid']: i['counter'] for i in events}
-        # key is uuid, value is parent uuid. Used as a quick lookup
-        map_uuid_puuid = {i['uuid']: i['parent_uuid'] for i in events}
-        # key is counter of meta events (i.e. verbose), value is uuid of the assigned parent
-        map_meta_counter_nested_uuid = {}
-
-        # collapsible tree view in the UI only makes sense for tree-like
-        # hierarchy. If ansible is ran with a strategy like free or host_pinned, then
-        # events can be out of sequential order, and no longer follow a tree structure
-        # E1
-        #  E2
-        # E3
-        #  E4  <- parent is E3
-        #  E5  <- parent is E1
-        # in the above, there is no clear way to collapse E1, because E5 comes after
-        # E3, which occurs after E1. Thus the tree view should be disabled.
-
-        # mark the last seen uuid at a given level (0-3)
-        # if a parent uuid is not in this list, then we know the events are not tree-like
-        # and return a response with is_tree: False
-        level_current_uuid = [None, None, None, None]
-
-        prev_non_meta_event = events[0]
-        for i, e in enumerate(events):
-            if not e['event'] in JobJobEventsChildrenSummary.meta_events:
-                prev_non_meta_event = e
-            if not e['uuid']:
-                continue
-
-            if not e['event'] in JobJobEventsChildrenSummary.meta_events:
-                level = models.JobEvent.LEVEL_FOR_EVENT[e['event']]
-                level_current_uuid[level] = e['uuid']
-                # if setting level 1, for example, set levels 2 and 3 back to None
-                for u in range(level + 1, len(level_current_uuid)):
-                    level_current_uuid[u] = None
-
-            puuid = e['parent_uuid']
-            if puuid and puuid not in level_current_uuid:
-                # improper tree detected, so bail out early
-                resp['is_tree'] = False
+        try:
+            summary = models.JobEventTreeSummary.objects.get(job=job)
+        except models.JobEventTreeSummary.DoesNotExist:
+            if not job.event_processing_finished:
                 return Response(resp)
+            # computed once, every later request is served from the stored summary
+            summary = models.JobEventTreeSummary.build(job)
 
-            # if event is verbose (or debug, etc), we need to "assign" it a
-            # parent. This code looks at the event level of the previous
-            # non-verbose event, and the level of the next (by looking ahead)
-            # non-verbose event. The verbose event is assigned the same parent
-            # uuid of the higher level event.
-            # e.g.
-            # E1
-            #  E2
-            # verbose
-            # verbose <- we are on this event currently
-            #    E4
-            # We'll compare E2 and E4, and the verbose event
-            # will be assigned the parent uuid of E4 (higher event level)
-            if e['event'] in JobJobEventsChildrenSummary.meta_events:
-                event_level_before = models.JobEvent.LEVEL_FOR_EVENT[prev_non_meta_event['event']]
-                # find next non meta event
-                z = i
-                next_non_meta_event = events[-1]
-                while z < len(events):
-                    if events[z]['event'] not in JobJobEventsChildrenSummary.meta_events:
-                        next_non_meta_event = events[z]
-                        break
-                    z += 1
-                event_level_after = models.JobEvent.LEVEL_FOR_EVENT[next_non_meta_event['event']]
-                if event_level_after and event_level_after > event_level_before:
-                    puuid = next_non_meta_event['parent_uuid']
-                else:
-                    puuid = prev_non_meta_event['parent_uuid']
-                if puuid:
-                    map_meta_counter_nested_uuid[e['counter']] = puuid
-            map_counter_children_tally[e['counter']]['rowNumber'] = i
-            if not puuid:
-                continue
-            # now traverse up the parent, grandparent, etc. events and tally those
-            while puuid:
-                map_counter_children_tally[map_uuid_counter[puuid]]['numChildren'] += 1
-                puuid = map_uuid_puuid.get(puuid, None)
-
-        # create new dictionary, dropping events with 0 children
-        resp["children_summary"] = {k: v for k, v in map_counter_children_tally.items() if v['numChildren'] != 0}
-        resp["meta_event_nested_uuid"] = map_meta_counter_nested_uuid
+        resp["event_processing_finished"] = True
+        resp["is_tree"] = summary.is_tree
+        resp["children_summary"] = summary.children_summary
+        resp["meta_event_nested_uuid"] = summary.meta_event_nested_uuid
         return Response(resp)
 
 
@@ -4052,36 +3968,15 @@ def redact_ansi(line):
     return re.sub(r'\x1b[^m]*m', '', line)
 
 
-class StdoutFilter(object):
-    def __init__(self, fileobj):
-        self._functions = []
-        self.fileobj = fileobj
-        self.extra_data = ''
-        if hasattr(fileobj, 'close'):
-            self.close = fileobj.close
-
-    def read(self, size=-1):
-        data = self.extra_data
-        while size > 0 and len(data) < size:
-            line = self.fileobj.readline(size)
-            if not line:
-                break
-            line = self.process_line(line)
-            data += line
-        if size > 0 and len(data) > size:
-            self.extra_data = data[size:]
-            data = data[:size]
-        else:
-            self.extra_data = ''
-        return data
-
-    def register(self, func):
-        self._functions.append(func)
-
-    def process_line(self, line):
-        for func in self._functions:
-            line = func(line)
-        return line
+def filter_stdout(pieces, functions):
+    """Apply each of the line filter functions to every line of stdout, as it is streamed"""
+    for piece in pieces:
+        if functions:
+            lines = split_lines(piece)
+            for func in functions:
+                lines = [func(line) for line in lines]
+            piece = ''.join(lines)
+        yield piece
 
 
 class UnifiedJobStdout(RetrieveAPIView):
@@ -4136,13 +4031,12 @@ class UnifiedJobStdout(RetrieveAPIView):
                 filename = '{type}_{pk}{suffix}.txt'.format(
                     type=camelcase_to_underscore(unified_job.__class__.__name__), pk=unified_job.id, suffix='.ansi' if target_format == 'ansi_download' else ''
                 )
-                content_fd = unified_job.result_stdout_raw_handle(enforce_max_bytes=False)
-                redactor = StdoutFilter(content_fd)
+                redactors = []
                 if target_format == 'txt_download':
-                    redactor.register(redact_ansi)
+                    redactors.append(redact_ansi)
                 if type(unified_job) == models.ProjectUpdate:
-                    redactor.register(UriCleaner.remove_sensitive)
-                response = HttpResponse(FileWrapper(redactor), content_type='text/plain')
+                    redactors.append(UriCleaner.remove_sensitive)
+                response = StreamingHttpResponse(filter_stdout(unified_job.iter_result_stdout_raw(), redactors), content_type='text/plain')
                 response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
                 return response
             else:
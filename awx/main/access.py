@@ -185,6 +185,16 @@ def get_user_capabilities(user, instance, **kwargs):
     return access_class(user).get_user_capabilities(instance, **kwargs)
 
 
+def get_page_user_capabilities(user, model, objs, **kwargs):
+    """
+    Returns the capabilities the user has on each of a page of objs of model,
+    by pk. Role memberships are resolved for the whole page in a few queries
+    where the access class knows how to.
+    """
+    access_class = access_registry[model]
+    return access_class(user).get_page_user_capabilities(objs, **kwargs)
+
+
 def check_superuser(func):
     """
     check_superuser is a decorator that provides a simple short circuit
@@ -491,6 +501,36 @@ class BaseAccess(object):
 
         return user_capabilities
 
+    def get_page_user_capabilities(self, objs, method_list=[], parent_obj=None, capabilities_map={}):
+        """
+        Returns the result of get_user_capabilities for each of objs, by pk.
+        capabilities_map holds the capabilities already known by pk, like the
+        result of prefetch_page_capabilities, and is completed with what
+        prefetch_capabilities finds for the entire page.
+        """
+        page_map = {obj.pk: dict(capabilities_map.get(obj.pk, {})) for obj in objs}
+        if objs and not self.user.is_superuser:
+            for pk, capabilities in self.prefetch_capabilities(objs, method_list).items():
+                for display_method, value in capabilities.items():
+                    page_map[pk].setdefault(display_method, value)
+        return {obj.pk: self.get_user_capabilities(obj, method_list=method_list, parent_obj=parent_obj, capabilities_cache=page_map[obj.pk]) for obj in objs}
+
+    def prefetch_capabilities(self, objs, method_list):
+        """
+        Override in subclasses to return the capabilities of a non superuser
+        that can be found for all of objs at once, by pk. These must match what
+        get_method_capability returns, anything left out is computed object by
+        object.
+        """
+        return {}
+
+    def pks_with_role(self, model, role_field, pks):
+        "Returns the pks, among the given ones, of the model objects the user has role_field to"
+        pks = set(pk for pk in pks if pk is not None)
+        if not pks:
+            return set()
+        return set(model.objects.filter(pk__in=pks).filter(pk__in=model.accessible_pk_qs(self.user, role_field)).values_list('pk', flat=True))
+
     def get_method_capability(self, method, obj, parent_obj):
         try:
             if method in ['change']:  # 3 args
@@ -1165,6 +1205,19 @@ class InventoryUpdateAccess(BaseAccess):
     def can_delete(self, obj):
         return self.user in obj.inventory_source.inventory.admin_role
 
+    def prefetch_capabilities(self, objs, method_list):
+        capabilities = {obj.pk: {} for obj in objs}
+        if 'start' in method_list:
+            updatable = self.pks_with_role(Inventory, 'update_role', [obj.inventory_id for obj in objs])
+            for obj in objs:
+                capabilities[obj.pk]['start'] = obj.inventory_id in updatable
+        if 'delete' in method_list:
+            source_inventories = dict(InventorySource.objects.filter(pk__in=[obj.inventory_source_id for obj in objs]).values_list('pk', 'inventory_id'))
+            administered = self.pks_with_role(Inventory, 'admin_role', source_inventories.values())
+            for obj in objs:
+                capabilities[obj.pk]['delete'] = source_inventories.get(obj.inventory_source_id) in administered
+        return capabilities
+
 
 class CredentialTypeAccess(BaseAccess):
     """
@@ -1533,6 +1586,15 @@ class ProjectUpdateAccess(BaseAccess):
     def can_delete(self, obj):
         return obj and self.user in obj.project.admin_role
 
+    def prefetch_capabilities(self, objs, method_list):
+        capabilities = {obj.pk: {} for obj in objs}
+        for display_method, role_field in (('start', 'update_role'), ('delete', 'admin_role')):
+            if display_method in method_list:
+                projects = self.pks_with_role(Project, role_field, [obj.project_id for obj in objs])
+                for obj in objs:
+                    capabilities[obj.pk][display_method] = obj.project_id in projects
+        return capabilities
+
 
 class JobTemplateAccess(NotificationAttachMixin, UnifiedCredentialsMixin, BaseAccess):
     """
@@ -1828,6 +1890,18 @@ class JobAccess(BaseAccess):
             return self.user in obj.job_template.execute_role
         return super(JobAccess, self).get_method_capability(method, obj, parent_obj)
 
+    def prefetch_capabilities(self, objs, method_list):
+        capabilities = {obj.pk: {} for obj in objs}
+        if 'start' in method_list:
+            executable = self.pks_with_role(JobTemplate, 'execute_role', [obj.job_template_id for obj in objs])
+            for obj in objs:
+                capabilities[obj.pk]['start'] = obj.job_template_id is None or obj.job_template_id in executable
+        if 'delete' in method_list:
+            administered = self.pks_with_role(Organization, 'admin_role', [obj.organization_id for obj in objs])
+            for obj in objs:
+                capabilities[obj.pk]['delete'] = obj.organization_id in administered
+        return capabilities
+
     def can_cancel(self, obj):
         if not obj.can_cancel:
             return False
@@ -2200,6 +2274,19 @@ class WorkflowJobAccess(BaseAccess):
             return self.user in obj.workflow_job_template.execute_role
         return super(WorkflowJobAccess, self).get_method_capability(method, obj, parent_obj)
 
+    def prefetch_capabilities(self, objs, method_list):
+        capabilities = {obj.pk: {} for obj in objs}
+        if 'start' in method_list:
+            executable = self.pks_with_role(WorkflowJobTemplate, 'execute_role', [obj.workflow_job_template_id for obj in objs])
+            for obj in objs:
+                capabilities[obj.pk]['start'] = obj.workflow_job_template_id in executable
+        if 'delete' in method_list:
+            template_orgs = dict(WorkflowJobTemplate.objects.filter(pk__in=[obj.workflow_job_template_id for obj in objs]).values_list('pk', 'organization_id'))
+            administered = self.pks_with_role(Organization, 'workflow_admin_role', template_orgs.values())
+            for obj in objs:
+                capabilities[obj.pk]['delete'] = template_orgs.get(obj.workflow_job_template_id) in administered
+        return capabilities
+
     def can_start(self, obj, validate_license=True):
         if validate_license:
             self.check_license()
@@ -2306,6 +2393,13 @@ class AdHocCommandAccess(BaseAccess):
     def can_delete(self, obj):
         return obj.inventory is not None and self.user in obj.inventory.organization.admin_role
 
+    def prefetch_capabilities(self, objs, method_list):
+        if 'delete' not in method_list:
+            return {}
+        inventory_orgs = dict(Inventory.objects.filter(pk__in=[obj.inventory_id for obj in objs]).values_list('pk', 'organization_id'))
+        administered = self.pks_with_role(Organization, 'admin_role', inventory_orgs.values())
+        return {obj.pk: {'delete': inventory_orgs.get(obj.inventory_id) in administered} for obj in objs}
+
     def can_start(self, obj, validate_license=True):
         return self.can_add(
             {
@@ -138,6 +138,19 @@ class RelayWebsocketStats:
         )
         self._internal_messages_received_per_minute = FixedSlidingWindow()
 
+        self._messages_sent = Counter(f'awx_{self.remote_name}_messages_sent', 'Number of messages relayed to the web node', registry=self._registry)
+        self._batches_sent = Counter(
+            f'awx_{self.remote_name}_batches_sent', 'Number of frames the messages relayed to the web node were batched in', registry=self._registry
+        )
+        self._last_batch_size = Gauge(
+            f'awx_{self.remote_name}_last_batch_size', 'Number of messages in the last frame relayed to the web node', registry=self._registry
+        )
+        self._producer_queue_depth = Gauge(
+            f'awx_{self.remote_name}_producer_queue_depth',
+            'Number of messages waiting in Redis to be relayed by the producers of this node when the last frame was sent',
+            registry=self._registry,
+        )
+
     def unregister(self):
         self._registry.unregister(f'awx_{self.remote_name}_messages_received')
         self._registry.unregister(f'awx_{self.remote_name}_connection')
@@ -147,6 +160,12 @@ class RelayWebsocketStats:
         self._messages_received_current_conn.inc()
         self._messages_received_total.inc()
 
+    def record_batch_sent(self, size, queue_depth):
+        self._messages_sent.inc(size)
+        self._batches_sent.inc()
+        self._last_batch_size.set(size)
+        self._producer_queue_depth.set(queue_depth)
+
     def record_connection_established(self):
         self._connection.state('connected')
         self._connection_start.set_to_current_time()
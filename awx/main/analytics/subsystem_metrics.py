@@ -1,8 +1,14 @@
+import fcntl
 import itertools
+import mmap
+import os
 import redis
 import json
+import struct
+import threading
 import time
 import logging
+import zlib
 
 import prometheus_client
 from prometheus_client.core import GaugeMetricFamily, HistogramMetricFamily
@@ -177,6 +183,257 @@ class HistogramM(BaseM):
         return output_text
 
 
+class FloatHistogramM(HistogramM):
+    """A histogram of fractional values, such as durations in seconds"""
+
+    def __init__(self, field, help_text, buckets):
+        super(FloatHistogramM, self).__init__(field, help_text, buckets)
+        self.sum = FloatM(field + '_sum', '')
+
+
+def instance_metrics_key(namespace):
+    return root_key + '-' + namespace + '_instances'
+
+
+def store_instance_metrics(conn, namespace, instance, serialized_metrics):
+    """Keep the metrics sent by an instance for load_other_metrics"""
+    if settings.SUBSYSTEM_METRICS_BACKEND == 'local':
+        # a single hash per namespace, read with one command
+        conn.hset(instance_metrics_key(namespace), instance, serialized_metrics)
+    else:
+        conn.set(root_key + '-' + namespace + '_instance_' + instance, serialized_metrics)
+
+
+class MetricsFileLock:
+    """An exclusive lock on a file, with the acquire/release interface of a redis lock"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self, blocking=True):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+class MetricsSnapshot:
+    """Metric values read at once from a LocalMetricsStore, for the decode methods of the metric fields"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def hget(self, key, field):
+        return self.values.get(field)
+
+
+class LocalMetricsStore:
+    """
+    The metric values of the processes of this node, kept in one memory
+    mapped file per process under SUBSYSTEM_METRICS_LOCAL_DIR. Every process
+    only writes to its own file, readers add the counters of all files up and
+    take the gauges from the file that set them last. It answers the redis
+    hash commands the metric fields use, so it can stand in for the redis
+    connection and pipeline of Metrics.
+    """
+
+    HEADER = struct.Struct('<II')  # layout checksum, number of slots
+    SLOT = struct.Struct('<dd')  # value, time it was set (gauges only)
+    ARCHIVE_PID = 0  # holds the values of processes that exited
+
+    def __init__(self, namespace, metrics):
+        self.namespace = namespace
+        self.slots = {}
+        self.gauges = set()
+        for m in metrics:
+            if isinstance(m, HistogramM):
+                fields = [m.field, m.inf.field, m.sum.field] + [b.field for b in m.buckets_to_keys.values()]
+            else:
+                fields = [m.field]
+                if isinstance(m, SetIntM):
+                    self.gauges.add(m.field)
+            for field in fields:
+                self.slots.setdefault(field, len(self.slots))
+        self.header = self.HEADER.pack(zlib.crc32('\n'.join(self.slots).encode('utf-8')), len(self.slots))
+        self.size = self.HEADER.size + len(self.slots) * self.SLOT.size
+        self.lock = threading.Lock()
+        self.pid = None
+        self.buffer = None
+
+    def path(self, pid):
+        return os.path.join(settings.SUBSYSTEM_METRICS_LOCAL_DIR, f'{self.namespace}_{pid}.db')
+
+    def open(self, pid):
+        """Maps the file of pid, starting it over if it was written with another set of metrics"""
+        os.makedirs(settings.SUBSYSTEM_METRICS_LOCAL_DIR, mode=0o700, exist_ok=True)
+        fd = os.open(self.path(pid), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.pread(fd, self.HEADER.size, 0) != self.header or os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, self.header, 0)
+            return mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def own_buffer(self):
+        # a forked child must not write to the file of its parent
+        if self.pid != os.getpid():
+            self.buffer = self.open(os.getpid())
+            self.pid = os.getpid()
+        return self.buffer
+
+    def offset(self, field):
+        return self.HEADER.size + self.slots[field] * self.SLOT.size
+
+    def hincrby(self, key, field, value):
+        with self.lock:
+            buffer = self.own_buffer()
+            offset = self.offset(field)
+            current, set_time = self.SLOT.unpack_from(buffer, offset)
+            self.SLOT.pack_into(buffer, offset, current + value, set_time)
+
+    hincrbyfloat = hincrby
+
+    def hset(self, key, field, value):
+        with self.lock:
+            self.SLOT.pack_into(self.own_buffer(), self.offset(field), float(value), time.time())
+
+    def hget(self, key, field):
+        return self.values().get(field)
+
+    def execute(self):
+        pass
+
+    def files(self):
+        """Yields the pid and content of every file of this namespace written with the same set of metrics"""
+        prefix = f'{self.namespace}_'
+        try:
+            names = os.listdir(settings.SUBSYSTEM_METRICS_LOCAL_DIR)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith('.db') and name[len(prefix) : -3].isdigit()):
+                continue
+            try:
+                with open(os.path.join(settings.SUBSYSTEM_METRICS_LOCAL_DIR, name), 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                continue
+            if len(content) == self.size and content.startswith(self.header):
+                yield int(name[len(prefix) : -3]), content
+
+    def merge(self, contents):
+        values = {}
+        for content in contents:
+            for field, slot in self.slots.items():
+                value, set_time = self.SLOT.unpack_from(content, self.HEADER.size + slot * self.SLOT.size)
+                if field in self.gauges:
+                    if field not in values or set_time >= values[field][1]:
+                        values[field] = (value, set_time)
+                else:
+                    values[field] = (values.get(field, (0, 0))[0] + value, 0)
+        return values
+
+    def values(self):
+        return {field: value for field, (value, set_time) in self.merge(content for pid, content in self.files()).items()}
+
+    def snapshot(self):
+        return MetricsSnapshot(self.values())
+
+    def file_lock(self):
+        os.makedirs(settings.SUBSYSTEM_METRICS_LOCAL_DIR, mode=0o700, exist_ok=True)
+        return MetricsFileLock(os.path.join(settings.SUBSYSTEM_METRICS_LOCAL_DIR, f'{self.namespace}.lock'))
+
+    @staticmethod
+    def exited(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def compact(self):
+        """Moves the values of processes that exited into the archive file, call with file_lock held"""
+        dead = {}
+        archive = None
+        for pid, content in self.files():
+            if pid == self.ARCHIVE_PID:
+                archive = content
+            elif self.exited(pid):
+                dead[pid] = content
+        if not dead:
+            return
+        merged = self.merge(([archive] if archive else []) + list(dead.values()))
+        buffer = self.open(self.ARCHIVE_PID)
+        try:
+            for field, (value, set_time) in merged.items():
+                self.SLOT.pack_into(buffer, self.offset(field), value, set_time)
+            buffer.flush()
+        finally:
+            buffer.close()
+        for pid in dead:
+            os.unlink(self.path(pid))
+
+    def clear(self):
+        """
+        Starts the values of this process over and drops those of processes that
+        exited. The files of running processes are left alone, they keep writing
+        to their mappings and an unlinked file would be lost to the readers.
+        """
+        lock = self.file_lock()
+        lock.acquire()
+        try:
+            with self.lock:
+                for pid, content in list(self.files()):
+                    if pid == self.ARCHIVE_PID or (pid != os.getpid() and self.exited(pid)):
+                        os.unlink(self.path(pid))
+                buffer = self.own_buffer()
+                buffer[self.HEADER.size :] = bytes(self.size - self.HEADER.size)
+        finally:
+            lock.release()
+
+
+class InstanceMetricsCollector(prometheus_client.registry.Collector):
+    """Serves the metrics of a namespace for every instance in instance_data, labeled with its node"""
+
+    def __init__(self, metrics_obj, instance_data, metrics_filter=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = metrics_obj
+        self._instance_data = instance_data
+        self._metrics_filter = metrics_filter
+
+    def collect(self):
+        for field, metric in self._metrics.METRICS.items():
+            if self._metrics_filter and field not in self._metrics_filter:
+                continue
+            if isinstance(metric, HistogramM):
+                family = HistogramMetricFamily(field, metric.help_text, labels=['node'])
+                for instance, data in self._instance_data.items():
+                    entry = data.get(field)
+                    if entry:
+                        buckets = [(str(b), count) for b, count in zip(metric.buckets, itertools.accumulate(entry['counts']))]
+                        family.add_metric([instance], buckets + [('+Inf', entry['inf'])], entry['sum'])
+            else:
+                family = GaugeMetricFamily(field, metric.help_text, labels=['node'])
+                for instance, data in self._instance_data.items():
+                    if field in data:
+                        family.add_metric([instance], data[field])
+            yield family
+
+
 class Metrics(MetricsNamespace):
     # metric name, help_text
     METRICSLIST = []
@@ -189,8 +446,8 @@ class Metrics(MetricsNamespace):
     def __init__(self, namespace, auto_pipe_execute=False, instance_name=None, metrics_have_changed=True, **kwargs):
         MetricsNamespace.__init__(self, namespace)
 
-        self.pipe = redis.Redis.from_url(settings.BROKER_URL).pipeline()
-        self.conn = redis.Redis.from_url(settings.BROKER_URL)
+        self.redis = redis.Redis.from_url(settings.BROKER_URL)
+        self.local = settings.SUBSYSTEM_METRICS_BACKEND == 'local'
         self.last_pipe_execute = time.time()
         # track if metrics have been modified since last saved to redis
         # start with True so that we get an initial save to redis
@@ -216,12 +473,24 @@ class Metrics(MetricsNamespace):
         # track last time metrics were sent to other nodes
         self.previous_send_metrics = SetFloatM('send_metrics_time', 'Timestamp of previous send_metrics call')
 
+        if self.local:
+            # values are saved to memory shared by the processes of this node, and only sent to redis as a snapshot
+            self.conn = self.pipe = LocalMetricsStore(namespace, itertools.chain(self.METRICS.values(), [self.previous_send_metrics]))
+        else:
+            self.pipe = self.redis.pipeline()
+            self.conn = self.redis
+
     def reset_values(self):
         # intended to be called once on app startup to reset all metric
         # values to 0
+        if self.local:
+            self.conn.clear()
         for m in self.METRICS.values():
             m.reset_value(self.conn)
         self.metrics_have_changed = True
+        if self.local:
+            self.redis.delete(instance_metrics_key(self._namespace))
+            return
         self.conn.delete(root_key + "_lock")
         for m in self.conn.scan_iter(root_key + '-' + self._namespace + '_instance_*'):
             self.conn.delete(m)
@@ -253,13 +522,15 @@ class Metrics(MetricsNamespace):
 
     def serialize_local_metrics(self):
         data = self.load_local_metrics()
-        return json.dumps(data)
+        return json.dumps(data, separators=(',', ':'))
 
     def load_local_metrics(self):
         # generate python dictionary of key values from metrics stored in redis
+        # or, with the local backend, from all values read at once
+        conn = self.conn.snapshot() if self.local else self.conn
         data = {}
         for field in self.METRICS:
-            data[field] = self.METRICS[field].decode(self.conn)
+            data[field] = self.METRICS[field].decode(conn)
         return data
 
     def should_pipe_execute(self):
@@ -289,13 +560,18 @@ class Metrics(MetricsNamespace):
 
     def send_metrics(self):
         # more than one thread could be calling this at the same time, so should
-        # acquire redis lock before sending metrics
-        lock = self.conn.lock(root_key + '-' + self._namespace + '_lock')
+        # acquire redis lock (or a file lock with the local backend) before sending metrics
+        if self.local:
+            lock = self.conn.file_lock()
+        else:
+            lock = self.conn.lock(root_key + '-' + self._namespace + '_lock')
         if not lock.acquire(blocking=False):
             return
         try:
             current_time = time.time()
             if current_time - self.previous_send_metrics.decode(self.conn) > self.send_metrics_interval:
+                if self.local:
+                    self.conn.compact()
                 serialized_metrics = self.serialize_local_metrics()
                 payload = {
                     'instance': self.instance_name,
@@ -303,7 +579,7 @@ class Metrics(MetricsNamespace):
                     'metrics_namespace': self._namespace,
                 }
                 # store the serialized data locally as well, so that load_other_metrics will read it
-                self.conn.set(root_key + '-' + self._namespace + '_instance_' + self.instance_name, serialized_metrics)
+                store_instance_metrics(self.redis, self._namespace, self.instance_name, serialized_metrics)
                 emit_channel_notification("metrics", payload)
 
                 self.previous_send_metrics.set(current_time)
@@ -323,6 +599,13 @@ class Metrics(MetricsNamespace):
         # also filters data based on request query params
         # if additional filtering is added, update metrics_view.md
         instances_filter = request.query_params.getlist("node")
+        if self.local:
+            stored = self.redis.hgetall(instance_metrics_key(self._namespace))
+            instance_data = {}
+            for instance in sorted(name.decode('UTF-8') for name in stored):
+                if len(instances_filter) == 0 or instance in instances_filter:
+                    instance_data[instance] = json.loads(stored[instance.encode('UTF-8')].decode('UTF-8'))
+            return instance_data
         # get a sorted list of instance names
         instance_names = [self.instance_name]
         for m in self.conn.scan_iter(root_key + '-' + self._namespace + '_instance_*'):
@@ -343,6 +626,10 @@ class Metrics(MetricsNamespace):
         # if additional filtering is added, update metrics_view.md
         instance_data = self.load_other_metrics(request)
         metrics_filter = request.query_params.getlist("metric")
+        if self.local:
+            registry = CollectorRegistry(auto_describe=False)
+            registry.register(InstanceMetricsCollector(self, instance_data, metrics_filter))
+            return prometheus_client.generate_latest(registry).decode('UTF-8')
         output_text = ''
         if instance_data:
             for field in self.METRICS:
@@ -381,6 +668,19 @@ class DispatcherMetrics(Metrics):
         SetIntM('dispatcher_pool_active_task_count', 'Number of active tasks in the worker pool when last task was submitted'),
         SetIntM('dispatcher_pool_max_worker_count', 'Highest number of workers in worker pool in last collection interval, about 20s'),
         SetFloatM('dispatcher_availability', 'Fraction of time (in last collection interval) dispatcher was able to receive messages'),
+        FloatHistogramM(
+            'periodic_scheduler_launch_latency_seconds',
+            'Time from when a schedule was due until its job was started',
+            settings.SUBSYSTEM_METRICS_SCHEDULE_LAUNCH_LATENCY_BUCKETS,
+        ),
+        SetFloatM('periodic_scheduler_launch_latency_max_seconds', 'Longest time from due to started of a scheduled job in the last periodic scheduler run'),
+        SetIntM('periodic_scheduler_jobs_spawned', 'Number of scheduled jobs started by the last periodic scheduler run'),
+        IntM('role_ancestry_rebuild_calls', 'Number of rebuilds of the role ancestors table'),
+        IntM('role_ancestry_rebuild_passes', 'Number of passes over the role hierarchy made by rebuilds of the role ancestors table'),
+        IntM('role_ancestry_rebuild_rows_inserted', 'Number of rows inserted into the role ancestors table by rebuilds'),
+        IntM('role_ancestry_rebuild_rows_deleted', 'Number of rows deleted from the role ancestors table by rebuilds'),
+        FloatM('role_ancestry_rebuild_seconds', 'Total time spent rebuilding the role ancestors table'),
+        SetFloatM('role_ancestry_rebuild_pass_max_seconds', 'Longest pass of the last rebuild of the role ancestors table'),
     ]
 
     def __init__(self, *args, **kwargs):
@@ -391,6 +691,9 @@ class CallbackReceiverMetrics(Metrics):
     METRICSLIST = [
         SetIntM('callback_receiver_events_queue_size_redis', 'Current number of events in redis queue'),
         IntM('callback_receiver_events_popped_redis', 'Number of events popped from redis'),
+        HistogramM(
+            'callback_receiver_events_popped_batch_size', 'Number of events popped from redis per round trip', settings.SUBSYSTEM_METRICS_REDIS_POP_BUCKETS
+        ),
         IntM('callback_receiver_events_in_memory', 'Current number of events in memory (in transfer from redis to db)'),
         IntM('callback_receiver_batch_events_errors', 'Number of times batch insertion failed'),
         FloatM('callback_receiver_events_insert_db_seconds', 'Total time spent saving events to database'),
@@ -400,6 +703,9 @@ class CallbackReceiverMetrics(Metrics):
             'callback_receiver_batch_events_insert_db', 'Number of events batch inserted into database', settings.SUBSYSTEM_METRICS_BATCH_INSERT_BUCKETS
         ),
         SetFloatM('callback_receiver_event_processing_avg_seconds', 'Average processing time per event per callback receiver batch'),
+        SetFloatM('callback_receiver_bulk_create_rows_per_second', 'Events saved per second by the last bulk_create mode flush'),
+        SetFloatM('callback_receiver_copy_rows_per_second', 'Events saved per second by the last COPY mode flush'),
+        IntM('callback_receiver_copy_batch_splits', 'Number of times a failed COPY batch was split in half and retried'),
     ]
 
     def __init__(self, *args, **kwargs):
@@ -428,6 +734,11 @@ class CustomToPrometheusMetricsCollector(prometheus_client.registry.Collector):
         self._metrics = metrics_obj
 
     def collect(self):
+        if self._metrics.local:
+            # this node's values are read from the processes that recorded them, not from redis
+            yield from InstanceMetricsCollector(self._metrics, {self._metrics.instance_name: self._metrics.load_local_metrics()}).collect()
+            return
+
         my_hostname = settings.CLUSTER_HOST_ID
 
         instance_data = self._metrics.load_other_metrics(Request(HttpRequest()))
@@ -113,7 +113,7 @@ ANSIBLE_RUNNER_NEEDS_UPDATE_MESSAGE = (
 SUBSCRIPTION_USAGE_MODEL_UNIQUE_HOSTS = 'unique_managed_hosts'
 
 # Shared prefetch to use for creating a queryset for the purpose of writing or saving facts
-HOST_FACTS_FIELDS = ('name', 'ansible_facts', 'ansible_facts_modified', 'modified', 'inventory_id')
+HOST_FACTS_FIELDS = ('name', 'ansible_facts', 'ansible_facts_modified', 'ansible_facts_digest', 'modified', 'inventory_id')
 
 # Data for RBAC compatibility layer
 role_name_to_perm_mapping = {
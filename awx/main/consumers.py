@@ -102,13 +102,16 @@ class RelayConsumer(AsyncJsonWebsocketConsumer):
         await self.send(event['text'])
 
     async def receive_json(self, data):
-        (group, message) = unwrap_broadcast_msg(data)
-        if group == "metrics":
-            message = json.loads(message['text'])
-            conn = redis.Redis.from_url(settings.BROKER_URL)
-            conn.set(settings.SUBSYSTEM_METRICS_REDIS_KEY_PREFIX + "-" + message['metrics_namespace'] + "_instance_" + message['instance'], message['metrics'])
-        else:
-            await self.channel_layer.group_send(group, message)
+        (group, messages) = unwrap_broadcast_msg(data)
+        for message in messages:
+            if group == "metrics":
+                from awx.main.analytics.subsystem_metrics import store_instance_metrics  # circular import
+
+                message = json.loads(message['text'])
+                conn = redis.Redis.from_url(settings.BROKER_URL)
+                store_instance_metrics(conn, message['metrics_namespace'], message['instance'], message['metrics'])
+            else:
+                await self.channel_layer.group_send(group, message)
 
     async def consumer_subscribe(self, event):
         await self.send_json(event)
@@ -233,7 +236,10 @@ def _dump_payload(payload):
 
 
 def unwrap_broadcast_msg(payload: dict):
-    return (payload['group'], payload['message'])
+    """Returns the group of a relayed frame and the list of messages in it, which holds several if the relay batched them"""
+    if 'messages' in payload:
+        return (payload['group'], payload['messages'])
+    return (payload['group'], [payload['message']])
 
 
 def emit_channel_notification(group, payload):
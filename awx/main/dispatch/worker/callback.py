@@ -1,9 +1,11 @@
 import json
 import logging
 import os
+import re
 import signal
 import time
 import datetime
+import zlib
 
 from django.conf import settings
 from django.utils.functional import cached_property
@@ -16,9 +18,10 @@ import psutil
 import redis
 
 from awx.main.consumers import emit_channel_notification
-from awx.main.models import JobEvent, AdHocCommandEvent, ProjectUpdateEvent, InventoryUpdateEvent, SystemJobEvent, UnifiedJob
+from awx.main.models import JobEvent, AdHocCommandEvent, ProjectUpdateEvent, InventoryUpdateEvent, SystemJobEvent, UnifiedJob, Job
 from awx.main.constants import ACTIVE_STATES
 from awx.main.models.events import emit_event_detail
+from awx.main.queue import load_callback_message
 from awx.main.utils.profiling import AWXProfiler
 import awx.main.analytics.subsystem_metrics as s_metrics
 from .base import BaseWorker
@@ -48,6 +51,16 @@ def job_stats_wrapup(job_identifier, event=None):
         if uj.status not in ACTIVE_STATES:
             uj.send_notification_templates('succeeded' if uj.status == 'successful' else 'failed')
 
+            if settings.STDOUT_INDEX_ENABLED:
+                from awx.main.tasks.system import build_stdout_index  # circular import
+
+                build_stdout_index.apply_async([uj.id])
+
+            if settings.JOB_EVENT_TREE_SUMMARY_PRECOMPUTE and isinstance(uj, Job):
+                from awx.main.tasks.system import build_job_event_tree_summary  # circular import
+
+                build_job_event_tree_summary.apply_async([uj.id])
+
     except Exception:
         logger.exception('Worker failed to save stats or emit notifications: Job {}'.format(job_identifier))
 
@@ -76,6 +89,13 @@ class CallbackBrokerWorker(BaseWorker):
         self.queue_pop = 0
         self.queue_name = settings.CALLBACK_QUEUE
         self.prof = AWXProfiler("CallbackBrokerWorker")
+        self.ingest_mode = 'bulk_create'
+        if settings.JOB_EVENT_INGEST_MODE == 'copy':
+            if django_connection.vendor == 'postgresql':
+                self.ingest_mode = 'copy'
+            else:
+                logger.warning(f'JOB_EVENT_INGEST_MODE=copy is not supported by the {django_connection.vendor} database, using bulk_create')
+        self.id_sequences = {}
         for key in self.redis.keys('awx_callback_receiver_statistics_*'):
             self.redis.delete(key)
 
@@ -84,20 +104,49 @@ class CallbackBrokerWorker(BaseWorker):
         """This needs to be obtained after forking, or else it will give the parent process"""
         return os.getpid()
 
+    def pop_messages(self):
+        """
+        Pop up to JOB_EVENT_REDIS_BATCH_SIZE messages in a single round trip,
+        blocking for at most a second when the queue is empty
+        """
+        batch_size = settings.JOB_EVENT_REDIS_BATCH_SIZE
+        if batch_size > 1:
+            # LRANGE + LTRIM inside MULTI/EXEC behaves like LPOP key count, which requires redis >= 6.2
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.lrange(self.queue_name, 0, batch_size - 1)
+            pipe.ltrim(self.queue_name, batch_size, -1)
+            messages = pipe.execute()[0]
+            if messages:
+                return messages
+        res = self.redis.blpop(self.queue_name, timeout=1)
+        if res is None:
+            return []
+        return [res[1]]
+
     def read(self, queue):
         try:
-            res = self.redis.blpop(self.queue_name, timeout=1)
-            if res is None:
+            messages = self.pop_messages()
+            if not messages:
                 return {'event': 'FLUSH'}
-            self.total += 1
-            self.queue_pop += 1
-            self.subsystem_metrics.inc('callback_receiver_events_popped_redis', 1)
-            self.subsystem_metrics.inc('callback_receiver_events_in_memory', 1)
-            return json.loads(res[1])
+            self.total += len(messages)
+            self.queue_pop += len(messages)
+            self.subsystem_metrics.inc('callback_receiver_events_popped_redis', len(messages))
+            self.subsystem_metrics.inc('callback_receiver_events_in_memory', len(messages))
+            self.subsystem_metrics.observe('callback_receiver_events_popped_batch_size', len(messages))
+            if len(messages) == 1:
+                return load_callback_message(messages[0])
+            bodies = []
+            for message in messages:
+                try:
+                    bodies.append(load_callback_message(message))
+                except (json.JSONDecodeError, zlib.error):
+                    logger.exception("failed to decode JSON message from redis")
+                    self.subsystem_metrics.inc('callback_receiver_events_in_memory', -1)
+            return {'event': 'BATCH', 'messages': bodies}
         except redis.exceptions.RedisError:
             logger.exception("encountered an error communicating with redis")
             time.sleep(1)
-        except (json.JSONDecodeError, KeyError):
+        except (json.JSONDecodeError, zlib.error, KeyError):
             logger.exception("failed to decode JSON message from redis")
         finally:
             self.record_statistics()
@@ -144,19 +193,139 @@ class CallbackBrokerWorker(BaseWorker):
             signal.signal(signal.SIGUSR1, self.toggle_profiling)
         return super(CallbackBrokerWorker, self).work_loop(*args, **kw)
 
+    def handle_event_save_error(self, e, exc):
+        """
+        Record a failed attempt to save a single event, returns True if the
+        event should be given up on and dropped from the buffer
+        """
+        retry_count = getattr(e, '_retry_count', 0) + 1
+        e._retry_count = retry_count
+
+        # special sanitization logic for postgres treatment of NUL 0x00 char
+        # This used to check the class of the exception but on the postgres3 upgrade it could appear
+        #   as either DataError or ValueError, so now lets just try if its there.
+        if (retry_count == 1) and ("\x00" in e.stdout):
+            e.stdout = e.stdout.replace("\x00", "")
+
+        if retry_count >= self.INDIVIDUAL_EVENT_RETRIES:
+            logger.error(f'Hit max retries ({retry_count}) saving individual Event error: {str(exc)}\ndata:\n{e.__dict__}')
+            return True
+        logger.info(f'Database Error Saving individual Event uuid={e.uuid} try={retry_count}, error: {str(exc)}')
+        return False
+
+    def bulk_create_events(self, cls, events):
+        """
+        Save events with a multi-row INSERT, falling back to saving them one at a time
+        Returns (saved events, number saved in bulk, number saved singularly, number of failed batches)
+        """
+        saved_events = []
+        try:
+            cls.objects.bulk_create(events)
+            self.buff[cls] = []
+            return events, len(events), 0, 0
+        except Exception as exc:
+            # If the database is flaking, let ensure_connection throw a general exception
+            # will be caught by the outer loop, which goes into a proper sleep and retry loop
+            django_connection.ensure_connection()
+            logger.warning(f'Error in events bulk_create, will try indiviually, error: {str(exc)}')
+        # if an exception occurs, we should re-attempt to save the
+        # events one-by-one, because something in the list is
+        # broken/stale
+        for e in events.copy():
+            try:
+                e.save()
+                events.remove(e)
+                saved_events.append(e)  # Importantly, remove successfully saved events from the buffer
+            except Exception as exc_indv:
+                if self.handle_event_save_error(e, exc_indv):
+                    events.remove(e)
+        return saved_events, 0, len(saved_events), 1
+
+    def get_id_sequence(self, cls):
+        """
+        Name of the sequence backing the id column of the event table
+
+        Partitioned event tables were created with LIKE ... INCLUDING ALL, so the
+        sequence is not owned by the column and pg_get_serial_sequence cannot find it.
+        It does find the sequence of an identity column, which has no default.
+        """
+        if cls not in self.id_sequences:
+            with django_connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT column_default, pg_get_serial_sequence(%s, 'id') FROM information_schema.columns WHERE table_name = %s AND column_name = 'id'",
+                    [django_connection.ops.quote_name(cls._meta.db_table), cls._meta.db_table],
+                )
+                row = cursor.fetchone() or (None, None)
+            match = re.match(r"nextval\('([^']+)'", row[0] or '')
+            if match is None and row[1] is None:
+                raise RuntimeError(f'Could not determine the id sequence of {cls._meta.db_table}')
+            self.id_sequences[cls] = match.group(1) if match else row[1]
+        return self.id_sequences[cls]
+
+    def copy_rows(self, cls, events):
+        """
+        Stream events into the (partitioned) event table with a single COPY
+
+        COPY does not return generated keys, so ids are reserved from the
+        table's sequence up front; they are needed to broadcast event details.
+        """
+        fields = cls._meta.concrete_fields
+        with django_connection.cursor() as cursor:
+            missing_ids = [e for e in events if e.pk is None]
+            if missing_ids:
+                cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [self.get_id_sequence(cls), len(missing_ids)])
+                for e, (pk,) in zip(missing_ids, cursor.fetchall()):
+                    e.pk = pk
+            columns = ', '.join(django_connection.ops.quote_name(f.column) for f in fields)
+            with cursor.copy(f'COPY {django_connection.ops.quote_name(cls._meta.db_table)} ({columns}) FROM STDIN') as copy:
+                for e in events:
+                    copy.write_row([f.get_db_prep_save(f.pre_save(e, True), connection=django_connection) for f in fields])
+
+    def copy_events(self, cls, events):
+        """
+        Save events with COPY, isolating bad rows by splitting failed batches in
+        half, and falling back to bulk_create for single rows COPY fails on
+        Returns (saved events, events to keep in the buffer, number of batch splits)
+        """
+        try:
+            with transaction.atomic():
+                self.copy_rows(cls, events)
+            return events, [], 0
+        except Exception as exc:
+            # If the database is flaking, let ensure_connection throw a general exception
+            # will be caught by the outer loop, which goes into a proper sleep and retry loop
+            django_connection.ensure_connection()
+            if len(events) == 1:
+                logger.warning(f'Error in events COPY of a single row, will try bulk_create, error: {str(exc)}')
+                # the row is saved, or kept for another try, the way the bulk_create mode does it
+                retry = list(events)
+                saved_events = self.bulk_create_events(cls, retry)[0]
+                return saved_events, [] if saved_events else retry, 0
+            logger.warning(f'Error in events COPY of {len(events)} rows, will split batch, error: {str(exc)}')
+        middle = len(events) // 2
+        saved_events, remaining, splits = [], [], 1
+        for half in (events[:middle], events[middle:]):
+            half_saved, half_remaining, half_splits = self.copy_events(cls, half)
+            saved_events.extend(half_saved)
+            remaining.extend(half_remaining)
+            splits += half_splits
+        return saved_events, remaining, splits
+
     def flush(self, force=False):
         now = tz_now()
         if force or (time.time() - self.last_flush) > settings.JOB_EVENT_BUFFER_SECONDS or any([len(events) >= 1000 for events in self.buff.values()]):
             metrics_bulk_events_saved = 0
             metrics_singular_events_saved = 0
             metrics_events_batch_save_errors = 0
+            metrics_events_batch_splits = 0
             metrics_events_broadcast = 0
             metrics_events_missing_created = 0
             metrics_total_job_event_processing_seconds = datetime.timedelta(seconds=0)
+            metrics_total_duration_to_save = 0.0
             for cls, events in self.buff.items():
                 if not events:
                     continue
-                logger.debug(f'{cls.__name__}.objects.bulk_create({len(events)})')
+                logger.debug(f'{cls.__name__} {self.ingest_mode} ({len(events)})')
                 for e in events:
                     e.modified = now  # this can be set before created because now is set above on line 149
                     if not e.created:
@@ -165,44 +334,18 @@ class CallbackBrokerWorker(BaseWorker):
                     else:  # only calculate the seconds if the created time already has been set
                         metrics_total_job_event_processing_seconds += e.modified - e.created
                 metrics_duration_to_save = time.perf_counter()
-                saved_events = []
-                try:
-                    cls.objects.bulk_create(events)
-                    metrics_bulk_events_saved += len(events)
-                    saved_events = events
-                    self.buff[cls] = []
-                except Exception as exc:
-                    # If the database is flaking, let ensure_connection throw a general exception
-                    # will be caught by the outer loop, which goes into a proper sleep and retry loop
-                    django_connection.ensure_connection()
-                    logger.warning(f'Error in events bulk_create, will try indiviually, error: {str(exc)}')
-                    # if an exception occurs, we should re-attempt to save the
-                    # events one-by-one, because something in the list is
-                    # broken/stale
-                    metrics_events_batch_save_errors += 1
-                    for e in events.copy():
-                        try:
-                            e.save()
-                            metrics_singular_events_saved += 1
-                            events.remove(e)
-                            saved_events.append(e)  # Importantly, remove successfully saved events from the buffer
-                        except Exception as exc_indv:
-                            retry_count = getattr(e, '_retry_count', 0) + 1
-                            e._retry_count = retry_count
-
-                            # special sanitization logic for postgres treatment of NUL 0x00 char
-                            # This used to check the class of the exception but on the postgres3 upgrade it could appear
-                            #   as either DataError or ValueError, so now lets just try if its there.
-                            if (retry_count == 1) and ("\x00" in e.stdout):
-                                e.stdout = e.stdout.replace("\x00", "")
-
-                            if retry_count >= self.INDIVIDUAL_EVENT_RETRIES:
-                                logger.error(f'Hit max retries ({retry_count}) saving individual Event error: {str(exc_indv)}\ndata:\n{e.__dict__}')
-                                events.remove(e)
-                            else:
-                                logger.info(f'Database Error Saving individual Event uuid={e.uuid} try={retry_count}, error: {str(exc_indv)}')
-
+                if self.ingest_mode == 'copy':
+                    saved_events, self.buff[cls], batch_splits = self.copy_events(cls, events)
+                    metrics_bulk_events_saved += len(saved_events)
+                    metrics_events_batch_save_errors += 1 if batch_splits else 0
+                    metrics_events_batch_splits += batch_splits
+                else:
+                    saved_events, batch_saved, singular_saved, batch_errors = self.bulk_create_events(cls, events)
+                    metrics_bulk_events_saved += batch_saved
+                    metrics_singular_events_saved += singular_saved
+                    metrics_events_batch_save_errors += batch_errors
                 metrics_duration_to_save = time.perf_counter() - metrics_duration_to_save
+                metrics_total_duration_to_save += metrics_duration_to_save
                 for e in saved_events:
                     if not getattr(e, '_skip_websocket_message', False):
                         metrics_events_broadcast += 1
@@ -213,7 +356,7 @@ class CallbackBrokerWorker(BaseWorker):
             # only update metrics if we saved events
             if (metrics_bulk_events_saved + metrics_singular_events_saved) > 0:
                 self.subsystem_metrics.inc('callback_receiver_batch_events_errors', metrics_events_batch_save_errors)
-                self.subsystem_metrics.inc('callback_receiver_events_insert_db_seconds', metrics_duration_to_save)
+                self.subsystem_metrics.inc('callback_receiver_events_insert_db_seconds', metrics_total_duration_to_save)
                 self.subsystem_metrics.inc('callback_receiver_events_insert_db', metrics_bulk_events_saved + metrics_singular_events_saved)
                 self.subsystem_metrics.observe('callback_receiver_batch_events_insert_db', metrics_bulk_events_saved)
                 self.subsystem_metrics.inc('callback_receiver_events_in_memory', -(metrics_bulk_events_saved + metrics_singular_events_saved))
@@ -223,57 +366,80 @@ class CallbackBrokerWorker(BaseWorker):
                     metrics_total_job_event_processing_seconds.total_seconds()
                     / (metrics_bulk_events_saved + metrics_singular_events_saved - metrics_events_missing_created),
                 )
+                if metrics_total_duration_to_save > 0:
+                    self.subsystem_metrics.set(
+                        f'callback_receiver_{self.ingest_mode}_rows_per_second',
+                        (metrics_bulk_events_saved + metrics_singular_events_saved) / metrics_total_duration_to_save,
+                    )
+                self.subsystem_metrics.inc('callback_receiver_copy_batch_splits', metrics_events_batch_splits)
             if self.subsystem_metrics.should_pipe_execute() is True:
                 self.subsystem_metrics.pipe_execute()
 
-    def perform_work(self, body):
-        try:
-            flush = body.get('event') == 'FLUSH'
-            if flush:
-                self.last_event = ''
-            if not flush:
-                job_identifier = 'unknown job'
-                for cls in (JobEvent, AdHocCommandEvent, ProjectUpdateEvent, InventoryUpdateEvent, SystemJobEvent):
-                    if cls.JOB_REFERENCE in body:
-                        job_identifier = body[cls.JOB_REFERENCE]
-                        break
+    def buffer_event(self, body):
+        """Deserialize one event message into the buffer, EOF messages are handled immediately"""
+        job_identifier = 'unknown job'
+        for cls in (JobEvent, AdHocCommandEvent, ProjectUpdateEvent, InventoryUpdateEvent, SystemJobEvent):
+            if cls.JOB_REFERENCE in body:
+                job_identifier = body[cls.JOB_REFERENCE]
+                break
 
-                self.last_event = f'\n\t- {cls.__name__} for #{job_identifier} ({body.get("event", "")} {body.get("uuid", "")})'  # noqa
+        self.last_event = f'\n\t- {cls.__name__} for #{job_identifier} ({body.get("event", "")} {body.get("uuid", "")})'  # noqa
 
-                notification_trigger_event = bool(body.get('event') == cls.WRAPUP_EVENT)
+        notification_trigger_event = bool(body.get('event') == cls.WRAPUP_EVENT)
 
-                if body.get('event') == 'EOF':
-                    try:
-                        if 'guid' in body:
-                            set_guid(body['guid'])
-                        final_counter = body.get('final_counter', 0)
-                        logger.info('Starting EOF event processing for Job {}'.format(job_identifier))
-                        # EOF events are sent when stdout for the running task is
-                        # closed. don't actually persist them to the database; we
-                        # just use them to report `summary` websocket events as an
-                        # approximation for when a job is "done"
-                        emit_channel_notification('jobs-summary', dict(group_name='jobs', unified_job_id=job_identifier, final_counter=final_counter))
-
-                        if notification_trigger_event:
-                            job_stats_wrapup(job_identifier)
-                    except Exception:
-                        logger.exception('Worker failed to perform EOF tasks: Job {}'.format(job_identifier))
-                    finally:
-                        self.subsystem_metrics.inc('callback_receiver_events_in_memory', -1)
-                        set_guid('')
-                    return
+        if body.get('event') == 'EOF':
+            try:
+                if 'guid' in body:
+                    set_guid(body['guid'])
+                final_counter = body.get('final_counter', 0)
+                logger.info('Starting EOF event processing for Job {}'.format(job_identifier))
+                # EOF events are sent when stdout for the running task is
+                # closed. don't actually persist them to the database; we
+                # just use them to report `summary` websocket events as an
+                # approximation for when a job is "done"
+                emit_channel_notification('jobs-summary', dict(group_name='jobs', unified_job_id=job_identifier, final_counter=final_counter))
+
+                if notification_trigger_event:
+                    job_stats_wrapup(job_identifier)
+            except Exception:
+                logger.exception('Worker failed to perform EOF tasks: Job {}'.format(job_identifier))
+            finally:
+                self.subsystem_metrics.inc('callback_receiver_events_in_memory', -1)
+                set_guid('')
+            return False
 
-                skip_websocket_message = body.pop('skip_websocket_message', False)
+        skip_websocket_message = body.pop('skip_websocket_message', False)
 
-                event = cls.create_from_data(**body)
+        try:
+            event = cls.create_from_data(**body)
+        except Exception:
+            # the event never makes it into the buffer
+            self.subsystem_metrics.inc('callback_receiver_events_in_memory', -1)
+            raise
 
-                if skip_websocket_message:  # if this event sends websocket messages, fire them off on flush
-                    event._skip_websocket_message = True
+        if skip_websocket_message:  # if this event sends websocket messages, fire them off on flush
+            event._skip_websocket_message = True
 
-                if notification_trigger_event:  # if this is an Ansible stats event, ensure notifications on flush
-                    event._notification_trigger_event = True
+        if notification_trigger_event:  # if this is an Ansible stats event, ensure notifications on flush
+            event._notification_trigger_event = True
 
-                self.buff.setdefault(cls, []).append(event)
+        self.buff.setdefault(cls, []).append(event)
+        return True
+
+    def perform_work(self, body):
+        try:
+            flush = body.get('event') == 'FLUSH'
+            if flush:
+                self.last_event = ''
+            elif body.get('event') == 'BATCH':
+                # messages popped together from redis are buffered together and followed by a single flush
+                for message in body['messages']:
+                    try:
+                        self.buffer_event(message)
+                    except Exception:
+                        logger.exception(f'Callback Task Processor Raised Unexpected Exception processing event data:\n{message}')
+            elif not self.buffer_event(body):
+                return
 
             retries = 0
             while retries <= self.MAX_RETRIES:
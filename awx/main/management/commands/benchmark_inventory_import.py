@@ -0,0 +1,81 @@
+# Python
+import copy
+import random
+import time
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# AWX
+from awx.main.management.commands.inventory_import import Command as InventoryImportCommand
+from awx.main.models import Inventory, InventorySource, Organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the wall time of inventory syncs writing hosts and groups through the ORM versus the bulk mode. "
+        "A generated inventory is synced into a new inventory, then synced again with part of it changed. "
+        "Each mode runs in a transaction that is rolled back, nothing is saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', type=int, default=10000, help='Number of hosts in the inventory (defaults to 10000)')
+        parser.add_argument('--groups', type=int, default=100, help='Number of groups the hosts are spread over (defaults to 100)')
+        parser.add_argument('--changed', type=float, default=0.1, help='Fraction of the hosts changed, removed and added by the second sync (defaults to 0.1)')
+        parser.add_argument('--overwrite', action='store_true', default=False, help='Sync with overwrite, removing what the second sync does not have')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the random host variables and group memberships')
+
+    def build_data(self, options):
+        rng = random.Random(options['seed'])
+        groups = [f'group-{i}' for i in range(options['groups'])]
+        hosts = {f'host-{i}': {'instance': {'id': f'i-{i:08x}'}, 'zone': rng.choice(['a', 'b', 'c'])} for i in range(options['hosts'])}
+        data = {'_meta': {'hostvars': hosts}, 'all': {'children': groups}}
+        for name in groups:
+            data[name] = {'hosts': [], 'vars': {'group': name}}
+        for name in hosts:
+            data[rng.choice(groups)]['hosts'].append(name)
+
+        changed = copy.deepcopy(data)
+        count = int(options['hosts'] * options['changed'])
+        names = rng.sample(sorted(hosts), min(count * 2, len(hosts)))
+        for name in names[:count]:
+            changed['_meta']['hostvars'][name]['zone'] = 'd'
+        for name in names[count:]:
+            del changed['_meta']['hostvars'][name]
+            for group in groups:
+                if name in changed[group]['hosts']:
+                    changed[group]['hosts'].remove(name)
+        for i in range(options['hosts'], options['hosts'] + count):
+            changed['_meta']['hostvars'][f'host-{i}'] = {'instance': {'id': f'i-{i:08x}'}, 'zone': 'a'}
+            changed[rng.choice(groups)]['hosts'].append(f'host-{i}')
+        return data, changed
+
+    def sync(self, import_mode, syncs, overwrite):
+        seconds = []
+        with transaction.atomic():
+            organization = Organization.objects.create(name='benchmark-inventory-import')
+            inventory = Inventory.objects.create(name='benchmark', organization=organization)
+            inventory_source = InventorySource.objects.create(inventory=inventory, source='ec2', name='benchmark')
+            options = dict(overwrite=overwrite, instance_id_var='instance.id', import_mode=import_mode)
+            for data in syncs:
+                inventory_update = inventory_source.create_unified_job()
+                start = time.perf_counter()
+                InventoryImportCommand().perform_update(options.copy(), copy.deepcopy(data), inventory_update)
+                seconds.append(time.perf_counter() - start)
+            hosts = inventory.hosts.count()
+            transaction.set_rollback(True)
+        return seconds, hosts
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'The bulk mode is not supported by the {connection.vendor} database')
+        syncs = self.build_data(options)
+        results = {}
+        for import_mode in ('orm', 'bulk'):
+            results[import_mode] = (seconds, hosts) = self.sync(import_mode, syncs, options['overwrite'])
+            self.stdout.write(f'{import_mode + ":":<5} first sync {seconds[0]:.3f} s, second sync {seconds[1]:.3f} s, {hosts} hosts')
+        orm, bulk = results['orm'][0], results['bulk'][0]
+        self.stdout.write(f'bulk is {orm[0] / max(bulk[0], 1e-9):.1f}x faster on the first sync, {orm[1] / max(bulk[1], 1e-9):.1f}x on the second')
+        if results['orm'][1] != results['bulk'][1]:
+            self.stderr.write('The two modes left a different number of hosts')
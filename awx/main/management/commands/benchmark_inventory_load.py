@@ -0,0 +1,94 @@
+# Python
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import traceback
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+
+# AWX
+from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data, stream_to_mem_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the peak memory and wall time of loading a generated ansible-inventory --list output into the in-memory "
+        "inventory used by inventory updates, decoding all of it first versus parsing it as it is read. Each method runs "
+        "in its own child process, so their peak memory is measured separately. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', type=int, default=100000, help='Number of hosts in the inventory (defaults to 100000)')
+        parser.add_argument('--groups', type=int, default=200, help='Number of groups the hosts are spread over (defaults to 200)')
+        parser.add_argument('--memberships', type=int, default=3, help='Number of groups each host is in (defaults to 3)')
+        parser.add_argument('--vars', type=int, default=20, help='Number of variables of each host (defaults to 20)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the random variables and group memberships')
+
+    def write_inventory(self, f, options):
+        rng = random.Random(options['seed'])
+        groups = {f'group-{i}': [] for i in range(options['groups'])}
+        f.write('{"_meta": {"hostvars": {')
+        for i in range(options['hosts']):
+            hostvars = {f'var_{j}': rng.choice(['a', 'b', rng.random(), {'nested': j}]) for j in range(options['vars'])}
+            hostvars['instance_id'] = f'i-{i:08x}'
+            f.write(('' if i == 0 else ', ') + json.dumps(f'host-{i}') + ': ' + json.dumps(hostvars))
+            for group in rng.sample(sorted(groups), min(options['memberships'], len(groups))):
+                groups[group].append(f'host-{i}')
+        f.write('}}, "all": ' + json.dumps({'children': sorted(groups) + ['ungrouped']}))
+        for name, hosts in groups.items():
+            f.write(', ' + json.dumps(name) + ': ' + json.dumps({'hosts': hosts, 'vars': {'group': name}}))
+        f.write('}')
+
+    def load(self, path, streaming):
+        start = time.perf_counter()
+        with open(path, encoding='utf-8') as f:
+            if streaming:
+                inventory = stream_to_mem_data(f, inventory=MemInventory())
+            else:
+                inventory = dict_to_mem_data(json.load(f), inventory=MemInventory())
+        elapsed = time.perf_counter() - start
+        return {'seconds': elapsed, 'hosts': len(inventory.all_group.all_hosts), 'groups': len(inventory.all_group.all_groups)}
+
+    def run_in_child(self, path, streaming):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                result = self.load(path, streaming)
+                result['baseline_kb'] = baseline
+                result['peak_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                with os.fdopen(write_fd, 'w') as f:
+                    json.dump(result, f)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            output = f.read()
+        os.waitpid(pid, 0)
+        if not output:
+            raise CommandError('Loading the inventory failed, see the traceback above')
+        return json.loads(output)
+
+    def handle(self, *args, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8') as f:
+            self.write_inventory(f, options)
+            f.flush()
+            self.stdout.write(f"{options['hosts']} hosts in {options['groups']} groups, {os.path.getsize(f.name) / 1024 / 1024:.1f} MiB of JSON")
+            results = {}
+            for label, streaming in (('decoded', False), ('streaming', True)):
+                results[label] = result = self.run_in_child(f.name, streaming)
+                self.stdout.write(
+                    f"{label + ':':<10} {result['seconds']:.3f} s, peak RSS {result['peak_kb'] / 1024:.1f} MiB "
+                    f"({(result['peak_kb'] - result['baseline_kb']) / 1024:.1f} MiB over baseline), "
+                    f"{result['hosts']} hosts, {result['groups']} groups"
+                )
+        if (results['decoded']['hosts'], results['decoded']['groups']) != (results['streaming']['hosts'], results['streaming']['groups']):
+            self.stderr.write('The two methods loaded a different number of hosts or groups')
@@ -0,0 +1,87 @@
+# Python
+import json
+import os
+import resource
+import tempfile
+import time
+import traceback
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# AWX
+from awx.main.models import Inventory
+from awx.main.tasks.jobs import RunJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the peak memory and wall time of writing the inventory script of a job by building the whole "
+        "inventory in memory versus streaming it from the database. Each method runs in its own child process, "
+        "so their peak memory is measured separately."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inventory', type=int, required=True, help='Id of the inventory to write')
+        parser.add_argument('--slice-count', type=int, default=1, help='Write the first of this many job slices (defaults to 1, no slicing)')
+
+    def write(self, inventory, streaming):
+        task = RunJob()
+        script_params = dict(hostvars=True, towervars=True)
+        if self.slice_count > 1:
+            script_params.update(slice_number=1, slice_count=self.slice_count)
+        with tempfile.TemporaryDirectory() as private_data_dir:
+            start = time.perf_counter()
+            if streaming:
+                path = task.stream_inventory_file(inventory, private_data_dir, 'hosts', script_params)
+            else:
+                script_data = inventory.get_script_data(**script_params)
+                for hostname, hv in script_data.get('_meta', {}).get('hostvars', {}).items():
+                    task.runner_callback.host_map[hostname] = hv.get('remote_tower_id', '')
+                file_content = '#! /usr/bin/env python3\n# -*- coding: utf-8 -*-\nprint(%r)\n' % json.dumps(script_data)
+                path = task.write_private_data_file(private_data_dir, 'hosts', file_content, sub_dir='inventory', file_permissions=0o700)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+        return {'seconds': elapsed, 'size': size, 'hosts': len(task.runner_callback.host_map)}
+
+    def run_in_child(self, inventory_id, streaming):
+        # the child must not share the database connection of the parent
+        connections.close_all()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                result = self.write(Inventory.objects.get(pk=inventory_id), streaming)
+                result['baseline_kb'] = baseline
+                result['peak_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                with os.fdopen(write_fd, 'w') as f:
+                    json.dump(result, f)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            output = f.read()
+        os.waitpid(pid, 0)
+        if not output:
+            raise CommandError('Writing the inventory failed, see the traceback above')
+        return json.loads(output)
+
+    def handle(self, *args, **options):
+        self.slice_count = options['slice_count']
+        if not Inventory.objects.filter(pk=options['inventory']).exists():
+            raise CommandError(f"Inventory {options['inventory']} does not exist")
+        results = {}
+        for label, streaming in (('in memory', False), ('streaming', True)):
+            results[label] = result = self.run_in_child(options['inventory'], streaming)
+            self.stdout.write(
+                f"{label + ':':<10} {result['seconds']:.3f} s, peak RSS {result['peak_kb'] / 1024:.1f} MiB "
+                f"({(result['peak_kb'] - result['baseline_kb']) / 1024:.1f} MiB over baseline), "
+                f"{result['hosts']} hosts, {result['size']} bytes"
+            )
+        if results['in memory']['hosts'] != results['streaming']['hosts']:
+            self.stderr.write('The two methods wrote a different number of hosts')
@@ -0,0 +1,70 @@
+# Python
+import random
+import time
+from types import SimpleNamespace
+
+# Django
+from django.core.management.base import BaseCommand
+
+# AWX
+from awx.main.scheduler.task_manager_models import TaskManagerModels
+
+
+class Command(BaseCommand):
+    help = (
+        "Time how long the task manager takes to place pending tasks on the instances of an instance group, "
+        "scanning every instance for each task versus using the capacity heaps. Runs in memory, nothing is saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instances', type=int, default=300, help='Number of instances in the instance group (defaults to 300)')
+        parser.add_argument('--tasks', type=int, default=5000, help='Number of pending tasks to place (defaults to 5000)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the random capacities and task impacts')
+
+    def build_models(self, options, capacity_index):
+        rng = random.Random(options['seed'])
+        instances = [
+            SimpleNamespace(hostname=f'instance-{i}', node_type=rng.choice(['execution', 'hybrid']), capacity=rng.choice([100, 200, 400, 800]))
+            for i in range(options['instances'])
+        ]
+        group = SimpleNamespace(
+            pk=1,
+            id=1,
+            name='benchmark',
+            is_container_group=False,
+            max_concurrent_jobs=0,
+            max_forks=0,
+            instances=SimpleNamespace(all=lambda: instances),
+        )
+        return TaskManagerModels(instances=instances, instance_groups=[group], capacity_index=capacity_index)
+
+    def place(self, options, capacity_index):
+        tm_models = self.build_models(options, capacity_index)
+        rng = random.Random(options['seed'])
+        placements = []
+        start = time.perf_counter()
+        for i in range(options['tasks']):
+            task = SimpleNamespace(
+                task_impact=rng.choice([1, 5, 10, 50]),
+                capacity_type='execution',
+                controller_node='',
+                execution_node='',
+                instance_group_id=None,
+                log_format=f'job {i} (benchmark)',
+            )
+            instance = tm_models.instance_groups.fit_task_to_most_remaining_capacity_instance(task, 'benchmark', add_hybrid_control_cost=True)
+            if instance is not None:
+                task.execution_node = instance.hostname
+                tm_models.consume_capacity(task)
+            placements.append(task.execution_node)
+        return time.perf_counter() - start, placements
+
+    def handle(self, *args, **options):
+        scan_seconds, scan_placements = self.place(options, capacity_index=False)
+        heap_seconds, heap_placements = self.place(options, capacity_index=True)
+        placed = sum(1 for hostname in heap_placements if hostname)
+        self.stdout.write(f"{options['tasks']} tasks on {options['instances']} instances, {placed} placed")
+        self.stdout.write(f'scan:  {scan_seconds:.3f} s')
+        self.stdout.write(f'heaps: {heap_seconds:.3f} s ({scan_seconds / max(heap_seconds, 1e-9):.1f}x)')
+        if scan_placements != heap_placements:
+            self.stderr.write('Placements differ between the two methods')
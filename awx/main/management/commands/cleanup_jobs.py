@@ -6,18 +6,23 @@ import datetime
 import logging
 import pytz
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Django
 from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction, connection
+from django.db import models, transaction, connection
 from django.db.models import Min, Max
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.db.models.functions import TruncHour
 from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.utils.timezone import now
 
 # AWX
-from awx.main.models import Job, AdHocCommand, ProjectUpdate, InventoryUpdate, SystemJob, WorkflowJob, Notification
+from awx.main.models import Job, AdHocCommand, ProjectUpdate, InventoryUpdate, SystemJob, WorkflowJob, Notification, Project, InventorySource
 from awx.main.utils import unified_job_class_to_event_table_name
 
 
@@ -141,6 +146,149 @@ class DeleteMeta:
         return (self.jobs_no_delete_count, self.jobs_to_delete_count)
 
 
+class PurgeNotSupported(Exception):
+    pass
+
+
+class JobPurgePlan:
+    """
+    The SQL statements that delete a chunk of jobs of one class along with
+    everything that cascades from them. They are derived from the relations of
+    the models the way the Django collector follows them, but run without
+    loading any object. Every statement takes the ids of the chunk as its
+    parameters.
+    """
+
+    MAX_DEPTH = 3
+
+    def __init__(self, job_class, unpartitioned_events=False):
+        self.job_class = job_class
+        self.statements = []
+        self.add_relations(job_class, self.in_ids, 0)
+        qn = connection.ops.quote_name
+        if unpartitioned_events:
+            tblname = unified_job_class_to_event_table_name(job_class)
+            self.statements.append(f'DELETE FROM {qn("_unpartitioned_" + tblname)} WHERE {self.in_ids(qn(job_class().event_parent_key))}')
+        # the table of the job class first, then those of the classes it inherits from
+        for model in [job_class] + job_class._meta.get_parent_list():
+            self.statements.append(f'DELETE FROM {qn(model._meta.db_table)} WHERE {self.in_ids(qn(model._meta.pk.column))}')
+
+    @staticmethod
+    def in_ids(column):
+        return f'{column} IN ({{ids}})'
+
+    def add_relations(self, model, selector, depth):
+        """Add the statements for the rows related to those of model matched by selector, deepest first"""
+        qn = connection.ops.quote_name
+        if any(getattr(field, 'bulk_related_objects', None) for field in model._meta.private_fields):
+            raise PurgeNotSupported(f'{model.__name__} has generic relations')
+        seen = set()
+        for rel in get_candidate_relations_to_delete(model._meta):
+            field = rel.field
+            related_model = rel.related_model
+            table, column = qn(related_model._meta.db_table), qn(field.column)
+            if (table, column) in seen:
+                continue
+            seen.add((table, column))
+            on_delete = field.remote_field.on_delete
+            if field.remote_field.parent_link:
+                raise PurgeNotSupported(f'{model.__name__} is inherited by {related_model.__name__}')
+            elif on_delete is models.DO_NOTHING:
+                continue
+            elif on_delete is models.SET_NULL:
+                self.statements.append(f'UPDATE {table} SET {column} = NULL WHERE {selector(column)}')
+            elif on_delete is models.CASCADE:
+                if related_model._meta.parents or depth >= self.MAX_DEPTH:
+                    raise PurgeNotSupported(f'cannot cascade from {model.__name__} to {related_model.__name__}')
+                pk = qn(related_model._meta.pk.column)
+
+                def related_selector(col, table=table, column=column, pk=pk, selector=selector):
+                    return f'{col} IN (SELECT {pk} FROM {table} WHERE {selector(column)})'
+
+                self.add_relations(related_model, related_selector, depth + 1)
+                self.statements.append(f'DELETE FROM {table} WHERE {selector(column)}')
+            else:
+                raise PurgeNotSupported(f'{related_model.__name__}.{field.name} has an unsupported on_delete')
+
+    def execute(self, ids):
+        """Runs the statements for ids and returns the number of rows they changed"""
+        placeholders = ', '.join(['%s'] * len(ids))
+        rows = 0
+        with connection.cursor() as cursor:
+            for statement in self.statements:
+                cursor.execute(statement.replace('{ids}', placeholders), ids)
+                rows += max(cursor.rowcount, 0)
+        return rows
+
+
+class ChunkedDeleteMeta(DeleteMeta):
+    """
+    Deletes the jobs matched by jobs_qs in ranges of chunk_size primary keys,
+    each in its own transaction, with a JobPurgePlan instead of the Django
+    collector. The ranges are spread over workers threads. Event partitions
+    are dropped when no job that is kept was created in their hour.
+    """
+
+    def __init__(self, logger, job_class, cutoff, dry_run, jobs_qs, chunk_size=1000, workers=1, unpartitioned_events=False):
+        super().__init__(logger, job_class, cutoff, dry_run)
+        self.jobs_qs = jobs_qs
+        self.chunk_size = chunk_size
+        self.workers = workers
+        # built before anything is deleted, so an unsupported relation fails early
+        self.plan = JobPurgePlan(job_class, unpartitioned_events=unpartitioned_events)
+        self.lock = threading.Lock()
+        self.chunks_done = 0
+        self.jobs_deleted = 0
+        self.rows_deleted = 0
+
+    def find_jobs_to_delete(self):
+        self.jobs_to_delete_count = self.jobs_qs.count()
+        self.jobs_no_delete_count = self.job_class.objects.count() - self.jobs_to_delete_count
+
+    def identify_excluded_partitions(self):
+        kept = self.job_class.objects.filter(created__lt=self.cutoff).exclude(pk__in=self.jobs_qs.values('pk'))
+        hours = kept.annotate(hour=TruncHour('created', tzinfo=pytz.UTC)).order_by().values_list('hour', flat=True).distinct()
+        self.parts_no_drop = {partition_table_name(self.job_class, hour) for hour in hours}
+
+    def delete_chunk(self, bounds):
+        start, end = bounds
+        try:
+            with transaction.atomic():
+                ids = list(self.jobs_qs.filter(pk__gte=start, pk__lt=end).values_list('pk', flat=True))
+                rows = self.plan.execute(ids) if ids else 0
+        finally:
+            if self.workers > 1:
+                # every worker thread has its own connection
+                connection.close()
+        with self.lock:
+            self.chunks_done += 1
+            self.jobs_deleted += len(ids)
+            self.rows_deleted += rows
+            elapsed = time.monotonic() - self.start_time
+            self.logger.info(
+                f'{self.job_class.__name__}: {self.chunks_done}/{self.chunk_count} chunks, {self.jobs_deleted} jobs and {self.rows_deleted} rows deleted, '
+                f'{self.rows_deleted / max(elapsed, 1e-6):.0f} rows/s'
+            )
+
+    def delete_jobs(self):
+        if self.dry_run:
+            return
+        info = self.jobs_qs.aggregate(min=Min('pk'), max=Max('pk'))
+        if info['min'] is None:
+            return
+        chunks = [(start, start + self.chunk_size) for start in range(info['min'], info['max'] + 1, self.chunk_size)]
+        self.chunk_count = len(chunks)
+        self.start_time = time.monotonic()
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(self.delete_chunk, chunks))
+        else:
+            for chunk in chunks:
+                self.delete_chunk(chunk)
+        elapsed = time.monotonic() - self.start_time
+        self.logger.debug(f'{self.job_class.__name__}: deleted {self.jobs_deleted} jobs and {self.rows_deleted} rows in {elapsed:.1f} s')
+
+
 class Command(BaseCommand):
     """
     Management command to cleanup old jobs and project updates.
@@ -148,12 +296,39 @@ class Command(BaseCommand):
 
     help = 'Remove old jobs, project and inventory updates from the database.'
 
+    CHUNKED_JOB_CLASSES = {
+        'jobs': Job,
+        'ad_hoc_commands': AdHocCommand,
+        'project_updates': ProjectUpdate,
+        'inventory_updates': InventoryUpdate,
+        'management_jobs': SystemJob,
+        'workflow_jobs': WorkflowJob,
+    }
+
     def add_arguments(self, parser):
         parser.add_argument('--days', dest='days', type=int, default=90, metavar='N', help='Remove jobs/updates executed more than N days ago. Defaults to 90.')
         parser.add_argument('--dry-run', dest='dry_run', action='store_true', default=False, help='Dry run mode (show items that would be removed)')
         parser.add_argument(
             '--batch-size', dest='batch_size', type=int, default=100000, metavar='X', help='Remove jobs in batch of X jobs. Defaults to 100000.'
         )
+        parser.add_argument(
+            '--chunked',
+            dest='chunked',
+            action='store_true',
+            default=False,
+            help='Delete jobs in ranges of primary keys committed one at a time, with SQL instead of loading them (ignores --batch-size)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=1000,
+            metavar='X',
+            help='Number of primary keys in each range with --chunked. Defaults to 1000.',
+        )
+        parser.add_argument(
+            '--workers', dest='workers', type=int, default=1, metavar='N', help='Number of ranges of a job type deleted at once with --chunked. Defaults to 1.'
+        )
         parser.add_argument('--jobs', dest='only_jobs', action='store_true', default=False, help='Remove jobs')
         parser.add_argument('--ad-hoc-commands', dest='only_ad_hoc_commands', action='store_true', default=False, help='Remove ad hoc commands')
         parser.add_argument('--project-updates', dest='only_project_updates', action='store_true', default=False, help='Remove project updates')
@@ -199,6 +374,38 @@ class Command(BaseCommand):
         delete_meta.delete_jobs()
         return (delete_meta.jobs_no_delete_count, delete_meta.jobs_to_delete_count)
 
+    def purge_candidates(self, job_class):
+        """The jobs of job_class the chunked cleanup deletes, skipping the same jobs as the cleanup_* methods"""
+        qs = job_class.objects.filter(created__lt=self.cutoff).exclude(status__in=['pending', 'waiting', 'running'])
+        if job_class is ProjectUpdate:
+            templates = Project.objects.exclude(scm_type='')
+        elif job_class is InventoryUpdate:
+            templates = InventorySource.objects.exclude(source='')
+        else:
+            return qs
+        for field_name in ('current_job', 'last_job'):
+            qs = qs.exclude(pk__in=templates.filter(**{f'{field_name}__isnull': False}).values(field_name))
+        return qs
+
+    def cleanup_chunked(self, job_class):
+        has_events = job_class is not WorkflowJob
+        delete_meta = ChunkedDeleteMeta(
+            self.logger,
+            job_class,
+            self.cutoff,
+            self.dry_run,
+            self.purge_candidates(job_class),
+            chunk_size=self.chunk_size,
+            workers=self.workers,
+            unpartitioned_events=has_events and self.has_unpartitioned_table(job_class),
+        )
+        if has_events:
+            delete_meta.delete()
+        else:
+            delete_meta.find_jobs_to_delete()
+            delete_meta.delete_jobs()
+        return (delete_meta.jobs_no_delete_count, delete_meta.jobs_to_delete_count)
+
     def has_unpartitioned_table(self, model):
         tblname = unified_job_class_to_event_table_name(model)
         with connection.cursor() as cursor:
@@ -420,12 +627,21 @@ class Command(BaseCommand):
         skipped += Notification.objects.filter(created__gte=self.cutoff).count()
         return skipped, deleted
 
+    def log_result(self, m, skipped, deleted):
+        if self.dry_run:
+            self.logger.log(99, '%s: %d would be deleted, %d would be skipped.', m.replace('_', ' '), deleted, skipped)
+        else:
+            self.logger.log(99, '%s: %d deleted, %d skipped.', m.replace('_', ' '), deleted, skipped)
+
     def handle(self, *args, **options):
         self.verbosity = int(options.get('verbosity', 1))
         self.init_logging()
         self.days = int(options.get('days', 90))
         self.dry_run = bool(options.get('dry_run', False))
         self.batch_size = int(options.get('batch_size', 100000))
+        self.chunked = bool(options.get('chunked', False))
+        self.chunk_size = max(int(options.get('chunk_size', 1000)), 1)
+        self.workers = max(int(options.get('workers', 1)), 1)
         try:
             self.cutoff = now() - datetime.timedelta(days=self.days)
         except OverflowError:
@@ -447,8 +663,20 @@ class Command(BaseCommand):
                 del s.receivers[:]
                 s.sender_receivers_cache.clear()
 
+        # each range of jobs is committed on its own, outside of the transaction below
+        chunked = set()
+        if self.chunked:
+            for m in [m for m in model_names if m in models_to_cleanup and m in self.CHUNKED_JOB_CLASSES]:
+                try:
+                    skipped, deleted = self.cleanup_chunked(self.CHUNKED_JOB_CLASSES[m])
+                except PurgeNotSupported as e:
+                    self.logger.warning(f'Cannot delete {m.replace("_", " ")} in chunks ({e}), deleting them at once instead')
+                    continue
+                chunked.add(m)
+                self.log_result(m, skipped, deleted)
+
         with transaction.atomic():
-            for m in models_to_cleanup:
+            for m in models_to_cleanup - chunked:
                 skipped, deleted = getattr(self, 'cleanup_%s' % m)()
 
                 func = getattr(self, 'cleanup_%s_partition' % m, None)
@@ -457,10 +685,7 @@ class Command(BaseCommand):
                     skipped += skipped_partition
                     deleted += deleted_partition
 
-                if self.dry_run:
-                    self.logger.log(99, '%s: %d would be deleted, %d would be skipped.', m.replace('_', ' '), deleted, skipped)
-                else:
-                    self.logger.log(99, '%s: %d deleted, %d skipped.', m.replace('_', ' '), deleted, skipped)
+                self.log_result(m, skipped, deleted)
 
         # Deleting unpartitioned tables cannot be done in same transaction as updates to related tables
         if not self.dry_run:
@@ -2,12 +2,14 @@
 # All Rights Reserved.
 
 # Python
+import io
 import json
 import logging
 import os
 import re
 import subprocess
 import sys
+import tempfile
 import time
 import traceback
 from collections import OrderedDict
@@ -17,19 +19,21 @@ from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection, transaction
 from django.utils.encoding import smart_str
+from django.utils.timezone import now
 
 # DRF error class to distinguish license exceptions
 from rest_framework.exceptions import PermissionDenied
 
 # AWX inventory imports
-from awx.main.models.inventory import Inventory, InventorySource, InventoryUpdate, Host
-from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data
+from awx.main.models.inventory import Inventory, InventorySource, InventoryUpdate, Group, Host
+from awx.main.utils.mem_inventory import MemInventory, dict_to_mem_data, stream_to_mem_data
 from awx.main.utils.safe_yaml import sanitize_jinja
 
 # other AWX imports
 from awx.main.models.rbac import batch_role_ancestor_rebuilding
 from awx.main.utils import ignore_inventory_computed_fields, get_licenser
 from awx.main.utils.execution_environments import get_default_execution_environment
+from awx.main.utils.inventory_cache import bump_inventory_revision
 from awx.main.signals import disable_activity_stream
 from awx.main.constants import STANDARD_INVENTORY_UPDATE_ENV
 from awx.main.utils.pglock import advisory_lock
@@ -126,9 +130,30 @@ class AnsibleInventoryLoader(object):
             raise
         return data
 
+    def command_to_file(self, cmd):
+        """
+        Like command_to_json, but returns the output as a text file object to
+        be parsed with stream_to_mem_data, instead of keeping it in memory.
+        """
+        stdout = tempfile.TemporaryFile()
+        proc = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.PIPE)
+        _, stderr = proc.communicate()
+        stderr = smart_str(stderr)
+        stdout.seek(0)
+        stdout = io.TextIOWrapper(stdout, encoding='utf-8')
+
+        if proc.returncode != 0:
+            raise RuntimeError('%s failed (rc=%d) with stdout:\n%s\nstderr:\n%s' % ('ansible-inventory', proc.returncode, stdout.read(), stderr))
+
+        for line in stderr.splitlines():
+            logger.error(line)
+        return stdout
+
     def load(self):
         base_args = self.get_base_args()
         logger.info('Reading Ansible inventory source: %s', self.source)
+        if settings.INVENTORY_IMPORT_STREAM_JSON:
+            return self.command_to_file(base_args)
         return self.command_to_json(base_args)
 
 
@@ -194,6 +219,14 @@ class Command(BaseCommand):
             metavar='v',
             help='host variable that specifies the unique, immutable instance ID, may be specified as "foo.bar" to traverse nested dicts.',
         )
+        parser.add_argument(
+            '--import-mode',
+            dest='import_mode',
+            type=str,
+            default=None,
+            choices=['orm', 'bulk'],
+            help='how to write the hosts and groups to the database, defaults to the INVENTORY_IMPORT_MODE setting.',
+        )
 
     def set_logging_level(self, verbosity):
         log_levels = dict(enumerate([logging.WARNING, logging.INFO, logging.DEBUG, 0]))
@@ -334,6 +367,8 @@ class Command(BaseCommand):
         all_del_pks = sorted(list(del_host_pks))
         for offset in range(0, len(all_del_pks), self._batch_size):
             del_pks = all_del_pks[offset : (offset + self._batch_size)]
+            self._computed_field_deltas['hosts'] -= len(del_pks)
+            self._computed_field_deltas['failed_hosts'] -= hosts_qs.filter(pk__in=del_pks, last_job_host_summary__failed=True).count()
             for host in hosts_qs.filter(pk__in=del_pks):
                 host_name = host.name
                 host.delete()
@@ -360,15 +395,20 @@ class Command(BaseCommand):
                 del_group_pks.discard(group_pk)
         # Now delete all remaining groups in batches.
         all_del_pks = sorted(list(del_group_pks))
+        self._delete_group_pks(all_del_pks)
+        if settings.SQL_DEBUG:
+            logger.warning('group deletions took %d queries for %d groups', len(connection.queries) - queries_before, len(all_del_pks))
+
+    def _delete_group_pks(self, all_del_pks):
+        groups_qs = self.inventory_source.groups.all()
         for offset in range(0, len(all_del_pks), self._batch_size):
             del_pks = all_del_pks[offset : (offset + self._batch_size)]
             for group in groups_qs.filter(pk__in=del_pks):
                 group_name = group.name
                 with ignore_inventory_computed_fields():
                     group.delete()
+                self._computed_field_deltas['groups'] -= 1
                 logger.debug('Group "%s" deleted', group_name)
-        if settings.SQL_DEBUG:
-            logger.warning('group deletions took %d queries for %d groups', len(connection.queries) - queries_before, len(all_del_pks))
 
     def _delete_group_children_and_hosts(self):
         """
@@ -475,6 +515,26 @@ class Command(BaseCommand):
         else:
             logger.debug('Inventory variables unmodified')
 
+    def _apply_mem_group(self, group, mem_group):
+        """
+        Sets the variables of group to the imported variables of mem_group,
+        without saving it. Returns whether they changed.
+        """
+        db_variables = group.variables_dict
+        if self.overwrite_vars:
+            db_variables = mem_group.variables
+        else:
+            db_variables.update(mem_group.variables)
+        if db_variables == group.variables_dict:
+            logger.debug('Group "%s" variables unmodified', group.name)
+            return False
+        group.variables = json.dumps(db_variables)
+        if self.overwrite_vars:
+            logger.debug('Group "%s" variables replaced', group.name)
+        else:
+            logger.debug('Group "%s" variables updated', group.name)
+        return True
+
     def _create_update_groups(self):
         """
         For each group in the local list, create it if it doesn't exist in the
@@ -495,21 +555,8 @@ class Command(BaseCommand):
         for offset in range(0, len(all_group_names), self._batch_size):
             group_names = all_group_names[offset : (offset + self._batch_size)]
             for group in self.inventory.groups.filter(name__in=group_names):
-                mem_group = self.all_group.all_groups[group.name]
-                db_variables = group.variables_dict
-                if self.overwrite_vars:
-                    db_variables = mem_group.variables
-                else:
-                    db_variables.update(mem_group.variables)
-                if db_variables != group.variables_dict:
-                    group.variables = json.dumps(db_variables)
+                if self._apply_mem_group(group, self.all_group.all_groups[group.name]):
                     group.save(update_fields=['variables'])
-                    if self.overwrite_vars:
-                        logger.debug('Group "%s" variables replaced', group.name)
-                    else:
-                        logger.debug('Group "%s" variables updated', group.name)
-                else:
-                    logger.debug('Group "%s" variables unmodified', group.name)
                 existing_group_names.add(group.name)
                 self._batch_add_m2m(self.inventory_source.groups, group)
         for group_name in all_group_names:
@@ -517,9 +564,11 @@ class Command(BaseCommand):
                 continue
             mem_group = self.all_group.all_groups[group_name]
             group_desc = mem_group.variables.pop('_awx_description', 'imported')
-            group = self.inventory.groups.update_or_create(name=group_name, defaults={'variables': json.dumps(mem_group.variables), 'description': group_desc})[
-                0
-            ]
+            group, created = self.inventory.groups.update_or_create(
+                name=group_name, defaults={'variables': json.dumps(mem_group.variables), 'description': group_desc}
+            )
+            if created:
+                self._computed_field_deltas['groups'] += 1
             logger.debug('Group "%s" added', group.name)
             self._batch_add_m2m(self.inventory_source.groups, group)
         self._batch_add_m2m(self.inventory_source.groups, flush=True)
@@ -527,6 +576,16 @@ class Command(BaseCommand):
             logger.warning('group updates took %d queries for %d groups', len(connection.queries) - queries_before, len(self.all_group.all_groups))
 
     def _update_db_host_from_mem_host(self, db_host, mem_host):
+        update_fields = self._apply_mem_host(db_host, mem_host)
+        if update_fields:
+            db_host.save(update_fields=update_fields)
+        self._batch_add_m2m(self.inventory_source.hosts, db_host)
+
+    def _apply_mem_host(self, db_host, mem_host):
+        """
+        Sets the fields of db_host to the imported values of mem_host, without
+        saving it. Returns the names of the fields that changed.
+        """
         # Update host variables.
         db_variables = db_host.variables_dict
         mem_variables = mem_host.variables
@@ -563,9 +622,7 @@ class Command(BaseCommand):
             old_name = db_host.name
             db_host.name = mem_host.name
             update_fields.append('name')
-        # Update host and display message(s) on what changed.
-        if update_fields:
-            db_host.save(update_fields=update_fields)
+        # Display message(s) on what changed.
         if 'name' in update_fields:
             logger.debug('Host renamed from "%s" to "%s"', old_name, mem_host.name)
         if 'instance_id' in update_fields:
@@ -585,7 +642,7 @@ class Command(BaseCommand):
                 logger.debug('Host "%s" is now enabled', mem_host.name)
             else:
                 logger.debug('Host "%s" is now disabled', mem_host.name)
-        self._batch_add_m2m(self.inventory_source.hosts, db_host)
+        return update_fields
 
     def _build_pk_mem_host_map(self):
         """
@@ -643,6 +700,31 @@ class Command(BaseCommand):
 
         return pk_mem_host_map  # keys are DB host pk, keys are matching mem host name
 
+    def _new_host_attrs(self, mem_host):
+        """
+        Returns the fields, other than the name, of a new host created for mem_host.
+        """
+        import_vars = mem_host.variables
+        host_desc = import_vars.pop('_awx_description', 'imported')
+        host_attrs = dict(description=host_desc)
+        enabled = self._get_enabled(mem_host.variables)
+        if enabled is not None:
+            host_attrs['enabled'] = enabled
+        if self.instance_id_var:
+            instance_id = self._get_instance_id(mem_host.variables)
+            host_attrs['instance_id'] = instance_id
+        if self.inventory.kind == 'constructed':
+            # remote towervars so the constructed hosts do not have extra variables
+            for prefix in ('host', 'tower'):
+                for var in ('remote_{}_enabled', 'remote_{}_id'):
+                    import_vars.pop(var.format(prefix), None)
+        host_attrs['variables'] = json.dumps(import_vars)
+        try:
+            sanitize_jinja(mem_host.name)
+        except ValueError as e:
+            raise ValueError(str(e) + ': {}'.format(mem_host.name))
+        return host_attrs
+
     def _create_update_hosts(self, pk_mem_host_map):
         """
         For each host in the local list, create it if it doesn't exist in the
@@ -668,28 +750,11 @@ class Command(BaseCommand):
 
         # Create any new hosts.
         for mem_host_name in sorted(mem_host_names_to_create):
-            mem_host = self.all_group.all_hosts[mem_host_name]
-            import_vars = mem_host.variables
-            host_desc = import_vars.pop('_awx_description', 'imported')
-            host_attrs = dict(description=host_desc)
-            enabled = self._get_enabled(mem_host.variables)
-            if enabled is not None:
-                host_attrs['enabled'] = enabled
-            if self.instance_id_var:
-                instance_id = self._get_instance_id(mem_host.variables)
-                host_attrs['instance_id'] = instance_id
-            if self.inventory.kind == 'constructed':
-                # remote towervars so the constructed hosts do not have extra variables
-                for prefix in ('host', 'tower'):
-                    for var in ('remote_{}_enabled', 'remote_{}_id'):
-                        import_vars.pop(var.format(prefix), None)
-            host_attrs['variables'] = json.dumps(import_vars)
-            try:
-                sanitize_jinja(mem_host_name)
-            except ValueError as e:
-                raise ValueError(str(e) + ': {}'.format(mem_host_name))
-            db_host = self.inventory.hosts.update_or_create(name=mem_host_name, defaults=host_attrs)[0]
-            if enabled is False:
+            host_attrs = self._new_host_attrs(self.all_group.all_hosts[mem_host_name])
+            db_host, created = self.inventory.hosts.update_or_create(name=mem_host_name, defaults=host_attrs)
+            if created:
+                self._computed_field_deltas['hosts'] += 1
+            if host_attrs.get('enabled') is False:
                 logger.debug('Host "%s" added (disabled)', mem_host_name)
             else:
                 logger.debug('Host "%s" added', mem_host_name)
@@ -762,6 +827,369 @@ class Command(BaseCommand):
         if settings.SQL_DEBUG:
             logger.warning('Group-host updates took %d queries for %d group-host relationships', len(connection.queries) - queries_before, group_host_count)
 
+    def _bulk_m2m(self, field):
+        """
+        Returns the quoted table of the through model of a many to many field,
+        and its columns for the model the field is defined on and the related model.
+        """
+        qn = connection.ops.quote_name
+        return qn(field.remote_field.through._meta.db_table), qn(field.m2m_column_name()), qn(field.m2m_reverse_name())
+
+    def _bulk_stage(self, cursor, table, columns, rows):
+        """
+        Creates a temporary table, dropped at the end of the transaction, with
+        the given (name, type) columns and streams rows into it with COPY.
+        """
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(f'CREATE TEMPORARY TABLE {table} ({", ".join(f"{name} {type_}" for name, type_ in columns)}) ON COMMIT DROP')
+        with cursor.copy(f'COPY {table} ({", ".join(name for name, type_ in columns)}) FROM STDIN') as copy:
+            for row in rows:
+                copy.write_row(row)
+        # temporary tables are never analyzed by autovacuum
+        cursor.execute(f'ANALYZE {table}')
+
+    def _bulk_insert(self, cursor, model, objs, update_fields):
+        """
+        Stages new rows of a model that is unique by name and inventory with COPY
+        and inserts them, updating update_fields of the existing row of the
+        same name instead. Returns the number of rows created.
+        """
+        if not objs:
+            return 0
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        columns = ', '.join(qn(f.column) for f in fields)
+        cursor.execute('DROP TABLE IF EXISTS awx_import_new')
+        cursor.execute(f'CREATE TEMPORARY TABLE awx_import_new ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA')
+        with cursor.copy(f'COPY awx_import_new ({columns}) FROM STDIN') as copy:
+            for obj in objs:
+                copy.write_row([f.get_db_prep_save(f.pre_save(obj, True), connection=connection) for f in fields])
+        updates = ', '.join(f'{qn(name)} = EXCLUDED.{qn(name)}' for name in update_fields)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM awx_import_new ON CONFLICT ("name", "inventory_id") DO UPDATE SET {updates} RETURNING xmax = 0'
+        )
+        return sum(1 for (created,) in cursor.fetchall() if created)
+
+    def _bulk_stage_inventory(self, cursor):
+        """
+        Stages the imported hosts, groups, group children and group hosts in
+        temporary tables, along with what each host can be matched by.
+        """
+        # like _build_pk_mem_host_map, the last host with an instance ID wins
+        match_pk_names = {}
+        match_instance_id_names = {}
+        for name, mem_host in self.all_group.all_hosts.items():
+            instance_id = self._get_instance_id(mem_host.variables)
+            if instance_id in self.db_instance_id_map:
+                match_pk_names[self.db_instance_id_map[instance_id]] = name
+            elif instance_id:
+                match_instance_id_names[instance_id] = name
+        match_pks = {name: pk for pk, name in match_pk_names.items()}
+        match_instance_ids = {name: instance_id for instance_id, name in match_instance_id_names.items()}
+        self._bulk_stage(
+            cursor,
+            'awx_import_host',
+            [
+                ('name', 'text'),
+                ('instance_id', 'text'),
+                ('match_instance_id', 'text'),
+                ('match_pk', 'integer'),
+                ('instance_pk', 'integer'),
+                ('host_id', 'integer'),
+            ],
+            (
+                (
+                    name,
+                    mem_host.instance_id or '',
+                    match_instance_ids.get(name),
+                    match_pks.get(name),
+                    self.db_instance_id_map.get(mem_host.instance_id) if mem_host.instance_id else None,
+                    None,
+                )
+                for name, mem_host in self.all_group.all_hosts.items()
+            ),
+        )
+        cursor.execute('CREATE UNIQUE INDEX ON awx_import_host (name)')
+        all_groups = self.all_group.all_groups
+        self._bulk_stage(cursor, 'awx_import_group', [('name', 'text')], ((name,) for name in all_groups))
+        self._bulk_stage(
+            cursor,
+            'awx_import_group_child',
+            [('parent', 'text'), ('child', 'text')],
+            ((mem_group.name, child.name) for mem_group in all_groups.values() for child in mem_group.children),
+        )
+        self._bulk_stage(
+            cursor,
+            'awx_import_group_host',
+            [('group_name', 'text'), ('host_name', 'text')],
+            ((mem_group.name, mem_host.name) for mem_group in all_groups.values() for mem_host in mem_group.hosts),
+        )
+
+    def _bulk_match_hosts(self, cursor):
+        """
+        Sets awx_import_host.host_id to the existing host each imported host
+        updates, matched the same way as _build_pk_mem_host_map: by the instance
+        ID found in the variables of hosts without one, by instance ID, and
+        finally by name.
+        """
+        host_table = connection.ops.quote_name(Host._meta.db_table)
+        params = {'inventory': self.inventory.id}
+        cursor.execute(
+            f'''UPDATE awx_import_host t SET host_id = t.match_pk FROM {host_table} h
+                WHERE h.id = t.match_pk AND h.inventory_id = %(inventory)s''',
+            params,
+        )
+        cursor.execute(
+            f'''UPDATE awx_import_host t SET host_id = m.id FROM (
+                    SELECT DISTINCT ON (h.instance_id) h.instance_id, h.id FROM {host_table} h
+                    WHERE h.inventory_id = %(inventory)s AND h.instance_id <> ''
+                    AND NOT EXISTS (SELECT 1 FROM awx_import_host u WHERE u.host_id = h.id)
+                    ORDER BY h.instance_id, h.id
+                ) m
+                WHERE t.host_id IS NULL AND t.match_instance_id = m.instance_id''',
+            params,
+        )
+        cursor.execute(
+            f'''UPDATE awx_import_host t SET host_id = h.id FROM {host_table} h
+                WHERE h.inventory_id = %(inventory)s AND h.name = t.name
+                AND NOT EXISTS (SELECT 1 FROM awx_import_host u WHERE u.host_id = h.id)''',
+            params,
+        )
+
+    def _bulk_group_hosts_sql(self, by_instance_pk=False):
+        """
+        Returns a query for the (group_id, host_id) pairs the imported group
+        memberships resolve to, the same way _create_update_group_hosts does:
+        by name for hosts without an instance ID, by instance ID for the others.
+        With by_instance_pk, hosts with an instance ID also resolve to the
+        existing host that has it in its variables.
+        """
+        qn = connection.ops.quote_name
+        group_table = qn(Group._meta.db_table)
+        host_table = qn(Host._meta.db_table)
+        select = f'''SELECT g.id AS group_id, h.id AS host_id FROM awx_import_group_host e
+            JOIN awx_import_host t ON t.name = e.host_name
+            JOIN {group_table} g ON g.inventory_id = %(inventory)s AND g.name = e.group_name'''
+        queries = [
+            f"{select} JOIN {host_table} h ON h.inventory_id = %(inventory)s AND h.name = t.name WHERE t.instance_id = ''",
+            f"{select} JOIN {host_table} h ON h.inventory_id = %(inventory)s AND h.instance_id = t.instance_id WHERE t.instance_id <> ''",
+        ]
+        if by_instance_pk:
+            queries.append(f'{select} JOIN {host_table} h ON h.inventory_id = %(inventory)s AND h.id = t.instance_pk')
+        return ' UNION '.join(queries)
+
+    def _bulk_delete_hosts(self, cursor):
+        """
+        Deletes the hosts of the inventory source that were not matched by an
+        imported host, in batches through the ORM so that related objects are
+        handled and signal handlers run.
+        """
+        source_hosts, host_column, source_column = self._bulk_m2m(Host.inventory_sources.field)
+        cursor.execute(
+            f'''SELECT s.{host_column} FROM {source_hosts} s WHERE s.{source_column} = %s
+                AND NOT EXISTS (SELECT 1 FROM awx_import_host t WHERE t.host_id = s.{host_column}) ORDER BY 1''',
+            [self.inventory_source.id],
+        )
+        all_del_pks = [pk for (pk,) in cursor.fetchall()]
+        for offset in range(0, len(all_del_pks), self._batch_size):
+            del_pks = all_del_pks[offset : (offset + self._batch_size)]
+            self._computed_field_deltas['hosts'] -= len(del_pks)
+            self._computed_field_deltas['failed_hosts'] -= Host.objects.filter(pk__in=del_pks, last_job_host_summary__failed=True).count()
+            Host.objects.filter(pk__in=del_pks).delete()
+        logger.debug('Deleted %d hosts', len(all_del_pks))
+
+    def _bulk_delete_groups(self, cursor):
+        qn = connection.ops.quote_name
+        source_groups, group_column, source_column = self._bulk_m2m(Group.inventory_sources.field)
+        cursor.execute(
+            f'''SELECT s.{group_column} FROM {source_groups} s JOIN {qn(Group._meta.db_table)} g ON g.id = s.{group_column}
+                WHERE s.{source_column} = %s AND NOT EXISTS (SELECT 1 FROM awx_import_group t WHERE t.name = g.name) ORDER BY 1''',
+            [self.inventory_source.id],
+        )
+        self._delete_group_pks([pk for (pk,) in cursor.fetchall()])
+
+    def _bulk_delete_group_children_and_hosts(self, cursor):
+        """
+        Removes the child groups and hosts of the groups of the inventory source
+        that the imported data does not have, limited to those managed by the
+        inventory source like _delete_group_children_and_hosts.
+        """
+        group_table = connection.ops.quote_name(Group._meta.db_table)
+        parents_table, child_column, parent_column = self._bulk_m2m(Group.parents.field)
+        source_groups, sg_group_column, sg_source_column = self._bulk_m2m(Group.inventory_sources.field)
+        group_hosts, gh_group_column, gh_host_column = self._bulk_m2m(Group.hosts.field)
+        source_hosts, sh_host_column, sh_source_column = self._bulk_m2m(Host.inventory_sources.field)
+        params = {'inventory': self.inventory.id, 'source': self.inventory_source.id}
+        cursor.execute(
+            f'''DELETE FROM {parents_table} r USING {group_table} p, {group_table} c, {source_groups} s
+                WHERE r.{parent_column} = p.id AND r.{child_column} = c.id
+                AND s.{sg_group_column} = p.id AND s.{sg_source_column} = %(source)s
+                AND c.name IN (SELECT name FROM awx_import_group)
+                AND NOT EXISTS (SELECT 1 FROM awx_import_group_child e WHERE e.parent = p.name AND e.child = c.name)''',
+            params,
+        )
+        group_group_count = cursor.rowcount
+        cursor.execute('DROP TABLE IF EXISTS awx_import_group_host_keep')
+        cursor.execute(f'CREATE TEMPORARY TABLE awx_import_group_host_keep ON COMMIT DROP AS {self._bulk_group_hosts_sql(by_instance_pk=True)}', params)
+        cursor.execute('CREATE INDEX ON awx_import_group_host_keep (group_id, host_id)')
+        cursor.execute('ANALYZE awx_import_group_host_keep')
+        cursor.execute(
+            f'''DELETE FROM {group_hosts} r USING {source_groups} s, {source_hosts} sh
+                WHERE s.{sg_group_column} = r.{gh_group_column} AND s.{sg_source_column} = %(source)s
+                AND sh.{sh_host_column} = r.{gh_host_column} AND sh.{sh_source_column} = %(source)s
+                AND NOT EXISTS (
+                    SELECT 1 FROM awx_import_group_host_keep k WHERE k.group_id = r.{gh_group_column} AND k.host_id = r.{gh_host_column}
+                )''',
+            params,
+        )
+        logger.debug('Removed %d group-group and %d group-host relationships', group_group_count, cursor.rowcount)
+
+    def _bulk_create_update_groups(self, cursor):
+        qn = connection.ops.quote_name
+        group_table = qn(Group._meta.db_table)
+        params = {'inventory': self.inventory.id, 'source': self.inventory_source.id}
+        cursor.execute(
+            f'SELECT g.id, g.name, g.variables FROM {group_table} g JOIN awx_import_group t ON t.name = g.name WHERE g.inventory_id = %(inventory)s', params
+        )
+        existing_group_names = set()
+        updates = []
+        for pk, name, variables in cursor.fetchall():
+            group = Group(id=pk, name=name, variables=variables, inventory_id=self.inventory.id)
+            if self._apply_mem_group(group, self.all_group.all_groups[name]):
+                updates.append((pk, group.variables))
+            existing_group_names.add(name)
+        if updates:
+            self._bulk_stage(cursor, 'awx_import_group_update', [('id', 'integer'), ('variables', 'text')], updates)
+            cursor.execute(f'UPDATE {group_table} g SET variables = u.variables, modified = %s FROM awx_import_group_update u WHERE g.id = u.id', [now()])
+        timestamp = now()
+        new_groups = []
+        for group_name in sorted(set(self.all_group.all_groups) - existing_group_names):
+            mem_group = self.all_group.all_groups[group_name]
+            group_desc = mem_group.variables.pop('_awx_description', 'imported')
+            new_groups.append(
+                Group(
+                    name=group_name,
+                    inventory_id=self.inventory.id,
+                    variables=json.dumps(mem_group.variables),
+                    description=group_desc,
+                    created=timestamp,
+                    modified=timestamp,
+                )
+            )
+            logger.debug('Group "%s" added', group_name)
+        self._computed_field_deltas['groups'] += self._bulk_insert(cursor, Group, new_groups, ['description', 'variables', 'modified'])
+        source_groups, group_column, source_column = self._bulk_m2m(Group.inventory_sources.field)
+        cursor.execute(
+            f'''INSERT INTO {source_groups} ({group_column}, {source_column})
+                SELECT g.id, %(source)s FROM awx_import_group t JOIN {group_table} g ON g.inventory_id = %(inventory)s AND g.name = t.name
+                ON CONFLICT DO NOTHING''',
+            params,
+        )
+        logger.debug('Updated %d and created %d groups', len(updates), len(new_groups))
+
+    def _bulk_create_update_hosts(self, cursor):
+        qn = connection.ops.quote_name
+        host_table = qn(Host._meta.db_table)
+        params = {'inventory': self.inventory.id, 'source': self.inventory_source.id}
+        updates = []
+        with connection.chunked_cursor() as matched:
+            matched.execute(
+                f'SELECT t.name, h.id, h.name, h.instance_id, h.enabled, h.variables FROM awx_import_host t JOIN {host_table} h ON h.id = t.host_id'
+            )
+            while rows := matched.fetchmany(self._batch_size):
+                for mem_host_name, pk, name, instance_id, enabled, variables in rows:
+                    db_host = Host(id=pk, name=name, instance_id=instance_id, enabled=enabled, variables=variables, inventory_id=self.inventory.id)
+                    if self._apply_mem_host(db_host, self.all_group.all_hosts[mem_host_name]):
+                        updates.append((pk, db_host.name, db_host.instance_id, db_host.enabled, db_host.variables))
+        if updates:
+            self._bulk_stage(
+                cursor,
+                'awx_import_host_update',
+                [('id', 'integer'), ('name', 'text'), ('instance_id', 'text'), ('enabled', 'boolean'), ('variables', 'text')],
+                updates,
+            )
+            cursor.execute(
+                f'''UPDATE {host_table} h SET name = u.name, instance_id = u.instance_id, enabled = u.enabled, variables = u.variables, modified = %s
+                    FROM awx_import_host_update u WHERE h.id = u.id''',
+                [now()],
+            )
+        cursor.execute('SELECT name FROM awx_import_host WHERE host_id IS NULL ORDER BY name')
+        timestamp = now()
+        new_hosts = []
+        for (mem_host_name,) in cursor.fetchall():
+            host_attrs = self._new_host_attrs(self.all_group.all_hosts[mem_host_name])
+            new_hosts.append(Host(name=mem_host_name, inventory_id=self.inventory.id, created=timestamp, modified=timestamp, **host_attrs))
+            if host_attrs.get('enabled') is False:
+                logger.debug('Host "%s" added (disabled)', mem_host_name)
+            else:
+                logger.debug('Host "%s" added', mem_host_name)
+        self._computed_field_deltas['hosts'] += self._bulk_insert(cursor, Host, new_hosts, ['description', 'enabled', 'instance_id', 'variables', 'modified'])
+        # every imported host now has a host of its name, matched hosts were renamed
+        source_hosts, host_column, source_column = self._bulk_m2m(Host.inventory_sources.field)
+        cursor.execute(
+            f'''INSERT INTO {source_hosts} ({host_column}, {source_column})
+                SELECT h.id, %(source)s FROM awx_import_host t JOIN {host_table} h ON h.inventory_id = %(inventory)s AND h.name = t.name
+                ON CONFLICT DO NOTHING''',
+            params,
+        )
+        logger.debug('Updated %d and created %d hosts', len(updates), len(new_hosts))
+        if (updates or new_hosts) and settings.AWX_REBUILD_SMART_MEMBERSHIP:
+            # like Host.save(), which is not called here
+            from awx.main.tasks.system import update_host_smart_inventory_memberships  # circular import
+
+            connection.on_commit(lambda: update_host_smart_inventory_memberships.delay())
+
+    def _bulk_create_update_group_children(self, cursor):
+        group_table = connection.ops.quote_name(Group._meta.db_table)
+        parents_table, child_column, parent_column = self._bulk_m2m(Group.parents.field)
+        cursor.execute(
+            f'''INSERT INTO {parents_table} ({child_column}, {parent_column})
+                SELECT c.id, p.id FROM awx_import_group_child e
+                JOIN {group_table} p ON p.inventory_id = %(inventory)s AND p.name = e.parent
+                JOIN {group_table} c ON c.inventory_id = %(inventory)s AND c.name = e.child
+                ON CONFLICT DO NOTHING''',
+            {'inventory': self.inventory.id},
+        )
+        logger.debug('Added %d group-group relationships', cursor.rowcount)
+
+    def _bulk_create_update_group_hosts(self, cursor):
+        group_hosts, group_column, host_column = self._bulk_m2m(Group.hosts.field)
+        cursor.execute(
+            f'INSERT INTO {group_hosts} ({group_column}, {host_column}) SELECT group_id, host_id FROM ({self._bulk_group_hosts_sql()}) m ON CONFLICT DO NOTHING',
+            {'inventory': self.inventory.id},
+        )
+        logger.debug('Added %d group-host relationships', cursor.rowcount)
+
+    def _bulk_load_into_database(self):
+        """
+        Set based counterpart of the ORM path of load_into_database for
+        PostgreSQL. The imported data is staged in temporary tables with COPY,
+        and hosts, groups and their relationships are created, updated and
+        removed with a few statements each, instead of a few per object.
+        """
+        if settings.SQL_DEBUG:
+            queries_before = len(connection.queries)
+        with connection.cursor() as cursor:
+            self._bulk_stage_inventory(cursor)
+            self._bulk_match_hosts(cursor)
+            if self.overwrite:
+                self._bulk_delete_hosts(cursor)
+                self._bulk_delete_groups(cursor)
+                self._bulk_delete_group_children_and_hosts(cursor)
+            self._update_inventory()
+            self._bulk_create_update_groups(cursor)
+            self._bulk_create_update_hosts(cursor)
+            self._bulk_create_update_group_children(cursor)
+            self._bulk_create_update_group_hosts(cursor)
+        if settings.SQL_DEBUG:
+            logger.warning(
+                'bulk import took %d queries for %d hosts and %d groups',
+                len(connection.queries) - queries_before,
+                len(self.all_group.all_hosts),
+                len(self.all_group.all_groups),
+            )
+
     def load_into_database(self):
         """
         Load inventory from in-memory groups to the database, overwriting or
@@ -770,18 +1198,25 @@ class Command(BaseCommand):
         # FIXME: Attribute changes to superuser?
         # Perform __in queries in batches (mainly for unit tests using SQLite).
         self._batch_size = 500
+        # changes to the host and group counts of the inventory, for INVENTORY_COMPUTED_FIELDS_INCREMENTAL
+        self._computed_field_deltas = {'hosts': 0, 'failed_hosts': 0, 'groups': 0}
         self._build_db_instance_id_map()
         self._build_mem_instance_id_map()
-        pk_mem_host_map = self._build_pk_mem_host_map()
-        if self.overwrite:
-            self._delete_hosts(pk_mem_host_map)
-            self._delete_groups()
-            self._delete_group_children_and_hosts()
-        self._update_inventory()
-        self._create_update_groups()
-        self._create_update_hosts(pk_mem_host_map)
-        self._create_update_group_children()
-        self._create_update_group_hosts()
+        if getattr(self, 'import_mode', 'orm') == 'bulk':
+            self._bulk_load_into_database()
+        else:
+            pk_mem_host_map = self._build_pk_mem_host_map()
+            if self.overwrite:
+                self._delete_hosts(pk_mem_host_map)
+                self._delete_groups()
+                self._delete_group_children_and_hosts()
+            self._update_inventory()
+            self._create_update_groups()
+            self._create_update_hosts(pk_mem_host_map)
+            self._create_update_group_children()
+            self._create_update_group_hosts()
+        # hosts and groups are partly written with queryset and bulk updates, which send no signals
+        bump_inventory_revision(self.inventory.id)
 
     def remote_tower_license_compare(self, local_license_type):
         # this requires https://github.com/ansible/ansible/pull/52747
@@ -934,6 +1369,9 @@ class Command(BaseCommand):
 
         This saves the inventory data to the database, calling load_into_database
         but also wraps that method in a host of options processing
+
+        data is the output of ansible-inventory, either decoded or as a text
+        file object to parse it from as it is read
         """
         # outside of normal options, these are needed as part of programatic interface
         self.inventory = inventory_update.inventory
@@ -949,6 +1387,10 @@ class Command(BaseCommand):
         self.host_filter = options.get('host_filter', None) or r'^.+$'
         self.exclude_empty_groups = bool(options.get('exclude_empty_groups', False))
         self.instance_id_var = options.get('instance_id_var', None)
+        self.import_mode = options.get('import_mode', None) or settings.INVENTORY_IMPORT_MODE
+        if self.import_mode == 'bulk' and connection.vendor != 'postgresql':
+            logger.warning(f'INVENTORY_IMPORT_MODE=bulk is not supported by the {connection.vendor} database, using orm')
+            self.import_mode = 'orm'
 
         try:
             self.group_filter_re = re.compile(self.group_filter)
@@ -993,7 +1435,10 @@ class Command(BaseCommand):
 
             logger.info('Processing JSON output...')
             inventory = MemInventory(group_filter_re=self.group_filter_re, host_filter_re=self.host_filter_re)
-            inventory = dict_to_mem_data(data, inventory=inventory)
+            if isinstance(data, dict):
+                inventory = dict_to_mem_data(data, inventory=inventory)
+            else:
+                inventory = stream_to_mem_data(data, inventory=inventory)
 
             logger.info('Loaded %d groups, %d hosts', len(inventory.all_group.all_groups), len(inventory.all_group.all_hosts))
 
@@ -1032,7 +1477,10 @@ class Command(BaseCommand):
                                     self.load_into_database()
                             if settings.SQL_DEBUG:
                                 queries_before2 = len(connection.queries)
-                            self.inventory.update_computed_fields()
+                            if settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL and not self.inventory.computed_fields_recount_due():
+                                self.inventory.adjust_computed_fields(**self._computed_field_deltas)
+                            else:
+                                self.inventory.update_computed_fields()
                         if settings.SQL_DEBUG:
                             logger.warning('update computed fields took %d queries', len(connection.queries) - queries_before2)
 
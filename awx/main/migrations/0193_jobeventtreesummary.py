@@ -0,0 +1,31 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('main', '0192_custom_roles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobEventTreeSummary',
+            fields=[
+                (
+                    'job',
+                    models.OneToOneField(
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='event_tree_summary',
+                        serialize=False,
+                        to='main.job',
+                    ),
+                ),
+                ('is_tree', models.BooleanField(default=True, editable=False)),
+                ('data', models.BinaryField(editable=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('main', '0193_jobeventtreesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='host',
+            name='ansible_facts_digest',
+            field=models.CharField(
+                blank=True,
+                default='',
+                editable=False,
+                help_text='SHA-256 digest of the fact cache file ansible_facts was last loaded from.',
+                max_length=64,
+            ),
+        ),
+    ]
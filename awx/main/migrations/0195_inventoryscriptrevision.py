@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('main', '0194_host_ansible_facts_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryScriptRevision',
+            fields=[
+                ('inventory_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('revision', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('main', '0195_inventoryscriptrevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RbacRevision',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.UUIDField(default=uuid.uuid4)),
+            ],
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db.models import Subquery, OuterRef, F
 
 from awx.main.fields import update_role_parentage_for_instance
 from awx.main.models.rbac import Role, batch_role_ancestor_rebuilding
+from awx.main.utils.rbac_cache import ignore_rbac_revision_bumps
 
 logger = logging.getLogger('rbac_migrations')
 
@@ -249,7 +250,8 @@ def rebuild_role_hierarchy(apps, schema_editor):
     stop = time()
     logger.info('Found %d roots in %f seconds, rebuilding ancestry map' % (len(roots), stop - start))
     start = time()
-    Role.rebuild_role_ancestor_list(roots, [])
+    with ignore_rbac_revision_bumps():
+        Role.rebuild_role_ancestor_list(roots, [])
     stop = time()
     logger.info('Rebuild ancestors completed in %f seconds' % (stop - start))
     logger.info('Done.')
@@ -319,4 +321,5 @@ def rebuild_role_parentage(apps, schema_editor, models=None):
 
     # this is ran because the ordinary signals for
     # Role.parents.add and Role.parents.remove not called in migration
-    Role.rebuild_role_ancestor_list(list(additions), list(removals))
+    with ignore_rbac_revision_bumps():
+        Role.rebuild_role_ancestor_list(list(additions), list(removals))
@@ -30,6 +30,7 @@ from awx.main.models.inventory import (  # noqa
     HostMetricSummaryMonthly,
     Inventory,
     InventoryConstructedInventoryMembership,
+    InventoryScriptRevision,
     InventorySource,
     InventoryUpdate,
     SmartInventoryMembership,
@@ -46,6 +47,7 @@ from awx.main.models.events import (  # noqa
     AdHocCommandEvent,
     InventoryUpdateEvent,
     JobEvent,
+    JobEventTreeSummary,
     ProjectUpdateEvent,
     SystemJobEvent,
     UnpartitionedAdHocCommandEvent,
@@ -66,6 +68,7 @@ from awx.main.models.ha import (  # noqa
 )
 from awx.main.models.rbac import (  # noqa
     Role,
+    RbacRevision,
     batch_role_ancestor_rebuilding,
     role_summary_fields_generator,
     ROLE_SINGLETON_SYSTEM_ADMINISTRATOR,
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import json
 from datetime import timezone
 import logging
 from collections import defaultdict
 import time
+import zlib
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models, DatabaseError
+from django.db import models, transaction, DatabaseError
 from django.db.models.functions import Cast
 from django.utils.dateparse import parse_datetime
 from django.utils.text import Truncator
@@ -28,7 +30,7 @@ analytics_logger = logging.getLogger('awx.analytics.job_events')
 
 logger = logging.getLogger('awx.main.models.events')
 
-__all__ = ['JobEvent', 'ProjectUpdateEvent', 'AdHocCommandEvent', 'InventoryUpdateEvent', 'SystemJobEvent']
+__all__ = ['JobEvent', 'JobEventTreeSummary', 'ProjectUpdateEvent', 'AdHocCommandEvent', 'InventoryUpdateEvent', 'SystemJobEvent']
 
 
 def sanitize_event_keys(kwargs, valid_keys):
@@ -357,10 +359,13 @@ class BasePlaybookEvent(CreatedModifiedModel):
                     job = None
                 if job:
                     hostnames = self._hostnames()
-                    self._update_host_summary_from_stats(set(hostnames))
+                    failed_hosts_delta = self._update_host_summary_from_stats(set(hostnames))
                     if job.inventory:
                         try:
-                            job.inventory.update_computed_fields()
+                            if settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL and failed_hosts_delta is not None:
+                                job.inventory.adjust_computed_fields(failed_hosts=failed_hosts_delta)
+                            else:
+                                job.inventory.update_computed_fields()
                         except DatabaseError:
                             logger.exception('Computed fields database error saving event {}'.format(self.pk))
 
@@ -536,7 +541,11 @@ class JobEvent(BasePlaybookEvent):
         return hostnames
 
     def _update_host_summary_from_stats(self, hostnames):
-        with ignore_inventory_computed_fields():
+        """
+        Returns the change in the number of failed hosts of the inventory of the
+        job, or None if it is not known
+        """
+        with ignore_inventory_computed_fields(), transaction.atomic():
             try:
                 if not self.job or not self.job.inventory:
                     logger.info('Event {} missing job or inventory, host summaries not updated'.format(self.pk))
@@ -545,6 +554,7 @@ class JobEvent(BasePlaybookEvent):
                 logger.info('Event {} missing job or inventory, host summaries not updated'.format(self.pk))
                 return
             job = self.job
+            count_failed_hosts = settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL and job.inventory.kind == ''
 
             from awx.main.models import Host, JobHostSummary  # circular import
 
@@ -555,7 +565,15 @@ class JobEvent(BasePlaybookEvent):
                 constructed_host_map = self.host_map
                 host_map = {host.name: host.id for host in all_hosts}
             else:
-                all_hosts = Host.objects.filter(pk__in=self.host_map.values()).only('id', 'name')
+                all_hosts = (
+                    Host.objects.filter(pk__in=self.host_map.values())
+                    .only('id', 'name', 'inventory_id')
+                    .annotate(previously_failed=models.F('last_job_host_summary__failed'))
+                )
+                if count_failed_hosts:
+                    # the failed hosts delta is taken from the summaries the hosts point to, lock the hosts
+                    # before reading them so that a concurrent job waits and then reads the summaries this one leaves
+                    list(Host.objects.filter(pk__in=self.host_map.values()).select_for_update().order_by('pk').values_list('pk', flat=True))
                 constructed_host_map = {}
                 host_map = self.host_map
 
@@ -598,8 +616,19 @@ class JobEvent(BasePlaybookEvent):
 
             Host.objects.bulk_update(list(updated_hosts), ['last_job_id', 'last_job_host_summary_id'], batch_size=100)
 
+            failed_hosts_delta = None
+            if count_failed_hosts:
+                # only the hosts of the inventory itself count toward its failed hosts
+                failed_by_host = {summary.host_id: summary.failed for summary in summaries.values() if summary.host_id}
+                failed_hosts_delta = sum(
+                    int(failed_by_host.get(h.id, False)) - int(bool(h.previously_failed))
+                    for h in all_hosts
+                    if h.inventory_id == self.job.inventory_id and h.id in host_mapping
+                )
+
             # Create/update Host Metrics
             self._update_host_metrics(updated_hosts_list)
+            return failed_hosts_delta
 
     @staticmethod
     def _update_host_metrics(updated_hosts_list):
@@ -632,6 +661,164 @@ class UnpartitionedJobEvent(JobEvent):
 UnpartitionedJobEvent._meta.db_table = '_unpartitioned_' + JobEvent._meta.db_table  # noqa
 
 
+class JobEventTreeSummary(models.Model):
+    """
+    The collapsible tree summary of the events of a finished job, as served by
+    the job_events_children_summary endpoint.
+
+    It is computed once, after event processing for the job has finished, and
+    stored as zlib compressed parallel arrays instead of being rebuilt from
+    every event of the job on each request.
+    """
+
+    class Meta:
+        app_label = 'main'
+
+    META_EVENTS = ('debug', 'verbose', 'warning', 'error', 'system_warning', 'deprecated')
+
+    job = models.OneToOneField(
+        'Job',
+        related_name='event_tree_summary',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        editable=False,
+    )
+    is_tree = models.BooleanField(default=True, editable=False)
+    data = models.BinaryField(editable=False)
+
+    @classmethod
+    def summarize(cls, events):
+        """
+        Compute the tree summary of a list of (counter, uuid, parent_uuid, event)
+        tuples ordered by counter.
+
+        Returns (is_tree, children, meta) where children holds the
+        [counter, row number, number of children] of every event with at least
+        one child, and meta holds the [counter, assigned parent uuid] of every
+        meta event (i.e. verbose) that could be nested.
+        """
+        if not events:
+            return True, [], []
+
+        level_for_event = JobEvent.LEVEL_FOR_EVENT
+        meta_events = cls.META_EVENTS
+
+        # key is uuid, value is the index of the event
+        map_uuid_index = {}
+        for i, (counter, uuid, parent_uuid, event) in enumerate(events):
+            if uuid:
+                map_uuid_index[uuid] = i
+        # number of total children of each event (including children of children, etc.)
+        num_children = [0] * len(events)
+        meta = []
+
+        # index of the next non meta event at or after each position, found in
+        # one backwards pass instead of scanning ahead from every meta event
+        next_non_meta = [len(events) - 1] * len(events)
+        upcoming = len(events) - 1
+        for i in range(len(events) - 1, -1, -1):
+            if events[i][3] not in meta_events:
+                upcoming = i
+            next_non_meta[i] = upcoming
+
+        # collapsible tree view in the UI only makes sense for tree-like
+        # hierarchy. If ansible is ran with a strategy like free or host_pinned, then
+        # events can be out of sequential order, and no longer follow a tree structure
+        # E1
+        #  E2
+        # E3
+        #  E4  <- parent is E3
+        #  E5  <- parent is E1
+        # in the above, there is no clear way to collapse E1, because E5 comes after
+        # E3, which occurs after E1. Thus the tree view should be disabled.
+
+        # mark the last seen uuid at a given level (0-3)
+        # if a parent uuid is not in this list, then we know the events are not tree-like
+        level_current_uuid = [None, None, None, None]
+
+        prev_non_meta_event = events[0]
+        for i, e in enumerate(events):
+            counter, uuid, puuid, event = e
+            is_meta = event in meta_events
+            if not is_meta:
+                prev_non_meta_event = e
+            if not uuid:
+                continue
+
+            if not is_meta:
+                level = level_for_event[event]
+                level_current_uuid[level] = uuid
+                # if setting level 1, for example, set levels 2 and 3 back to None
+                for u in range(level + 1, len(level_current_uuid)):
+                    level_current_uuid[u] = None
+
+            if puuid and puuid not in level_current_uuid:
+                # improper tree detected
+                return False, [], []
+
+            # if event is verbose (or debug, etc), we need to "assign" it a
+            # parent. This code looks at the event level of the previous
+            # non-verbose event, and the level of the next non-verbose event.
+            # The verbose event is assigned the same parent uuid of the higher
+            # level event.
+            # e.g.
+            # E1
+            #  E2
+            # verbose
+            # verbose <- we are on this event currently
+            #    E4
+            # We'll compare E2 and E4, and the verbose event
+            # will be assigned the parent uuid of E4 (higher event level)
+            if is_meta:
+                event_level_before = level_for_event[prev_non_meta_event[3]]
+                next_non_meta_event = events[next_non_meta[i]]
+                event_level_after = level_for_event[next_non_meta_event[3]]
+                if event_level_after and event_level_after > event_level_before:
+                    puuid = next_non_meta_event[2]
+                else:
+                    puuid = prev_non_meta_event[2]
+                if puuid:
+                    meta.append([counter, puuid])
+            # now traverse up the parent, grandparent, etc. events and tally those
+            while puuid:
+                parent = map_uuid_index.get(puuid)
+                if parent is None:
+                    break
+                num_children[parent] += 1
+                puuid = events[parent][2]
+
+        children = [[e[0], i, n] for i, (e, n) in enumerate(zip(events, num_children)) if n]
+        return True, children, meta
+
+    @classmethod
+    def build(cls, job):
+        """Compute and store the tree summary of a job whose events have all been saved"""
+        events = list(job.get_event_queryset().order_by('counter').values_list('counter', 'uuid', 'parent_uuid', 'event'))
+        is_tree, children, meta = cls.summarize(events)
+        data = {
+            'children': [[c[0] for c in children], [c[1] for c in children], [c[2] for c in children]],
+            'meta': [[m[0] for m in meta], [m[1] for m in meta]],
+        }
+        summary, _ = cls.objects.update_or_create(job=job, defaults={'is_tree': is_tree, 'data': zlib.compress(json.dumps(data).encode('utf-8'))})
+        return summary
+
+    @property
+    def children_summary(self):
+        counters, rows, num_children = self._data['children']
+        return {c: {"rowNumber": r, "numChildren": n} for c, r, n in zip(counters, rows, num_children)}
+
+    @property
+    def meta_event_nested_uuid(self):
+        counters, uuids = self._data['meta']
+        return dict(zip(counters, uuids))
+
+    @property
+    def _data(self):
+        if not hasattr(self, '_decoded_data'):
+            self._decoded_data = json.loads(zlib.decompress(bytes(self.data)))
+        return self._decoded_data
+
+
 class ProjectUpdateEvent(BasePlaybookEvent):
     VALID_KEYS = BasePlaybookEvent.VALID_KEYS + ['project_update_id', 'workflow_job_id', 'job_created']
     JOB_REFERENCE = 'project_update_id'
@@ -3,6 +3,9 @@
 
 # Python
 import datetime
+import itertools
+import json
+import operator
 import time
 import logging
 import re
@@ -16,13 +19,15 @@ import stat
 
 # Django
 from django.conf import settings
-from django.db import models, connection
+from django.core.cache import cache
+from django.db import models, connection, IntegrityError
 from django.utils.translation import gettext_lazy as _
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.urls import resolve
 from django.utils.timezone import now
-from django.db.models import Q
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Greatest, Least, Mod, RowNumber
 
 # REST Framework
 from rest_framework.exceptions import ParseError
@@ -54,16 +59,32 @@ from awx.main.models.notifications import (
 )
 from awx.main.models.credential.injectors import _openstack_data
 from awx.main.utils import _inventory_updates
+from awx.main.utils.inventory_cache import InventoryScriptCache
 from awx.main.utils.safe_yaml import sanitize_jinja
 from awx.main.utils.execution_environments import to_container_path, get_control_plane_execution_environment
 from awx.main.utils.licensing import server_product_name
 
 
-__all__ = ['Inventory', 'Host', 'Group', 'InventorySource', 'InventoryUpdate', 'SmartInventoryMembership', 'HostMetric', 'HostMetricSummaryMonthly']
+__all__ = [
+    'Inventory',
+    'Host',
+    'Group',
+    'InventorySource',
+    'InventoryUpdate',
+    'InventoryScriptRevision',
+    'SmartInventoryMembership',
+    'HostMetric',
+    'HostMetricSummaryMonthly',
+]
 
 logger = logging.getLogger('awx.main.models.inventory')
 
 
+def count_subquery(queryset):
+    """Returns the number of rows in queryset as a scalar subquery, to be selected along with other values"""
+    return Subquery(queryset.order_by().values(count=models.Func(F('pk'), function='COUNT', output_field=models.IntegerField())))
+
+
 class InventoryConstructedInventoryMembership(models.Model):
     constructed_inventory = models.ForeignKey('Inventory', on_delete=models.CASCADE, related_name='constructed_inventory_memberships')
     input_inventory = models.ForeignKey('Inventory', on_delete=models.CASCADE)
@@ -80,6 +101,8 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
     """
 
     FIELDS_TO_PRESERVE_AT_COPY = ['hosts', 'groups', 'instance_groups', 'prevent_instance_group_fallback']
+    # rows fetched per round trip when streaming script data
+    SCRIPT_DATA_CHUNK_SIZE = 1000
     KIND_CHOICES = [
         ('', _('Hosts have a direct link to this inventory.')),
         ('smart', _('Hosts for inventory generated using the host_filter property.')),
@@ -289,18 +312,24 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
         Returns a slice of Hosts given a slice number and total slice count, or
         the original queryset if slicing is not requested.
 
-        NOTE: If slicing is performed, this will return a List[Host] with the
-        resulting slice. If slicing is not performed it will return the
-        original queryset (not evaluating it or forcing it to a list). This
-        puts the burden on the caller to check the resulting type. This is
-        non-ideal because it's easy to get wrong, but I think the only way
-        around it is to force the queryset which has memory implications for
-        large inventories.
+        Hosts are numbered in the order of host_queryset by the database, and
+        every slice_count-th host from the (slice_number - 1)-th on is in the
+        slice, the same hosts a stepped slice of the queryset would give. The
+        result is a lazy queryset either way, and filtering it further does not
+        change which hosts are in the slice.
         """
 
         if slice_count > 1 and slice_number > 0:
-            offset = slice_number - 1
-            host_queryset = host_queryset[offset::slice_count]
+            # the primary key breaks ties, so the numbering is the same for every slice
+            ordering = list(host_queryset.query.order_by or host_queryset.model._meta.ordering) + ['pk']
+            slice_ids = (
+                host_queryset.order_by()
+                .annotate(slice_row=Window(expression=RowNumber(), order_by=ordering))
+                .annotate(slice_bucket=Mod(F('slice_row') - 1, slice_count))
+                .filter(slice_bucket=slice_number - 1)
+                .values('pk')
+            )
+            host_queryset = host_queryset.filter(pk__in=slice_ids)
         return host_queryset
 
     def get_script_data(self, hostvars=False, towervars=False, show_all=False, slice_number=1, slice_count=1):
@@ -385,55 +414,242 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
 
         return data
 
+    def stream_script_data(self, hostvars=False, towervars=False, show_all=False, slice_number=1, slice_count=1, host_map=None):
+        """
+        Yields the JSON text of the same inventory as get_script_data, piece
+        by piece, without holding it in memory. Hosts and groups are read with
+        server side cursors, and group memberships in group order, so memory
+        use does not grow with the size of the inventory. If host_map is given,
+        it is filled with the id of every host by name.
+        """
+        hosts_kw = dict()
+        if not show_all:
+            hosts_kw['enabled'] = True
+        host_queryset = self.get_sliced_hosts(self.hosts.filter(**hosts_kw).order_by('name'), slice_number, slice_count)
+        dumps = json.dumps
+
+        def json_list(values):
+            first = True
+            for value in values:
+                yield dumps(value) if first else ', ' + dumps(value)
+                first = False
+
+        yield '{"all": {'
+        all_separator = ''
+        if self.variables_dict:
+            yield '"vars": ' + dumps(self.variables_dict)
+            all_separator = ', '
+
+        if self.kind == 'smart':
+            yield all_separator + '"hosts": ['
+            yield from json_list(host_queryset.values_list('name', flat=True).iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE))
+            yield ']}'
+        else:
+            group_hosts_qs = Group.hosts.through.objects.filter(group__inventory_id=self.id, host__in=host_queryset.order_by())
+            groups_qs = self.groups.order_by('name', 'id')
+
+            yield all_separator + '"hosts": ['
+            ungrouped_qs = host_queryset.exclude(pk__in=group_hosts_qs.values('host_id'))
+            yield from json_list(ungrouped_qs.values_list('name', flat=True).iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE))
+            yield ']'
+            group_names = groups_qs.values_list('name', flat=True).iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE)
+            first_name = next(group_names, None)
+            if first_name is not None:
+                yield ', "children": ['
+                yield from json_list(itertools.chain([first_name], group_names))
+                yield ']'
+            yield '}'
+
+            # the groups and their memberships are read in the same order and merged as they go
+            group_hosts = itertools.groupby(
+                group_hosts_qs.order_by('group__name', 'group_id', 'id').values_list('group_id', 'host__name').iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE),
+                key=operator.itemgetter(0),
+            )
+            group_children = itertools.groupby(
+                Group.parents.through.objects.filter(from_group__inventory_id=self.id, to_group__inventory_id=self.id)
+                .order_by('to_group__name', 'to_group_id', 'id')
+                .values_list('to_group_id', 'from_group__name')
+                .iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE),
+                key=operator.itemgetter(0),
+            )
+            next_hosts = next(group_hosts, None)
+            next_children = next(group_children, None)
+            for group in groups_qs.only('name', 'id', 'variables', 'inventory_id').iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE):
+                group_info = []
+                if next_hosts is not None and next_hosts[0] == group.id:
+                    group_info.append(itertools.chain(['"hosts": ['], json_list(row[1] for row in next_hosts[1]), [']']))
+                if next_children is not None and next_children[0] == group.id:
+                    group_info.append(itertools.chain(['"children": ['], json_list(row[1] for row in next_children[1]), [']']))
+                group_vars = group.variables_dict
+                if group_vars:
+                    group_info.append(['"vars": ' + dumps(group_vars)])
+                if group_info:
+                    yield ', ' + dumps(group.name) + ': {'
+                    for i, pieces in enumerate(group_info):
+                        if i:
+                            yield ', '
+                        yield from pieces
+                    yield '}'
+                # the memberships of this group are consumed above, or there were none
+                if next_hosts is not None and next_hosts[0] == group.id:
+                    next_hosts = next(group_hosts, None)
+                if next_children is not None and next_children[0] == group.id:
+                    next_children = next(group_children, None)
+
+        if hostvars:
+            yield ', "_meta": {"hostvars": {'
+            fetch_fields = ['name', 'id', 'variables', 'inventory_id']
+            if towervars:
+                fetch_fields.append('enabled')
+            separator = ''
+            for host in host_queryset.only(*fetch_fields).iterator(chunk_size=self.SCRIPT_DATA_CHUNK_SIZE):
+                host_vars = host.variables_dict
+                if towervars:
+                    for prefix in ('host', 'tower'):
+                        host_vars[f'remote_{prefix}_enabled'] = str(host.enabled).lower()
+                        host_vars[f'remote_{prefix}_id'] = host.id
+                if host_map is not None:
+                    host_map[host.name] = host.id if towervars else ''
+                yield separator + dumps(host.name) + ': ' + dumps(host_vars)
+                separator = ', '
+            yield '}}'
+        yield '}'
+
+    def get_cached_script_data(self, **script_params):
+        """
+        Same as get_script_data, but reuses the copy kept by InventoryScriptCache
+        if nothing in the inventory changed since it was built. Changes are seen
+        through InventoryScriptRevision, which changes to hosts, groups and their
+        memberships bump once they are committed, and through a fingerprint of
+        the host and group tables as a guard for queryset updates that do not
+        send signals.
+        """
+        if self.kind or not settings.INVENTORY_SCRIPT_CACHE_ENABLED:
+            # smart and constructed inventories get their hosts from other inventories
+            return self.get_script_data(**script_params)
+        # the revision is read first, a change made while the data is built leaves the copy stale
+        key = [InventoryScriptRevision.get(self.pk), self.modified.isoformat() if self.modified else None]
+        for queryset in (self.hosts, self.groups):
+            fingerprint = queryset.aggregate(count=models.Count('id'), modified=models.Max('modified'))
+            key.extend([fingerprint['count'], fingerprint['modified'].isoformat() if fingerprint['modified'] else None])
+        script_cache = InventoryScriptCache(self.pk, script_params)
+        data = script_cache.load(key)
+        if data is None:
+            data = self.get_script_data(**script_params)
+            try:
+                script_cache.save(key, data)
+            except OSError:
+                logger.exception(f'Failed to cache the script data of inventory {self.pk}')
+        return data
+
+    # computed fields that hold a count, and the flag that is set from each
+    COMPUTED_COUNT_FIELDS = ('total_hosts', 'hosts_with_active_failures', 'total_groups', 'total_inventory_sources', 'inventory_sources_with_failures')
+    COMPUTED_FLAG_FIELDS = {'has_active_failures': 'hosts_with_active_failures', 'has_inventory_sources': 'total_inventory_sources'}
+
     def update_computed_fields(self):
         """
         Update model fields that are computed from database relationships.
         """
         logger.debug("Going to update inventory computed fields, pk={0}".format(self.pk))
         start_time = time.time()
-        active_hosts = self.hosts
-        failed_hosts = active_hosts.filter(last_job_host_summary__failed=True)
-        active_groups = self.groups
+        counts = {}
         if self.kind == 'smart':
-            active_groups = active_groups.none()
-        if self.kind == 'smart':
-            active_inventory_sources = self.inventory_sources.none()
+            # the hosts of smart inventories are distinct on name, which cannot be aggregated directly
+            active_hosts = Host.objects.filter(pk__in=self.hosts.values('pk'))
+            for field in ('total_groups', 'total_inventory_sources', 'inventory_sources_with_failures'):
+                counts[field] = models.Value(0)
         else:
-            active_inventory_sources = self.inventory_sources.filter(source__in=CLOUD_INVENTORY_SOURCES)
-        failed_inventory_sources = active_inventory_sources.filter(last_job_failed=True)
-        total_hosts = active_hosts.count()
+            active_hosts = Host.objects.filter(inventory_id=self.pk)
+            active_inventory_sources = InventorySource.objects.filter(inventory_id=self.pk, source__in=CLOUD_INVENTORY_SOURCES)
+            counts['total_groups'] = count_subquery(Group.objects.filter(inventory_id=self.pk))
+            counts['total_inventory_sources'] = count_subquery(active_inventory_sources)
+            counts['inventory_sources_with_failures'] = count_subquery(active_inventory_sources.filter(last_job_failed=True))
+        counts['total_hosts'] = count_subquery(active_hosts)
+        counts['hosts_with_active_failures'] = count_subquery(active_hosts.filter(last_job_host_summary__failed=True))
+
+        # the saved values and the new counts come from a single query
+        stored_fields = self.COMPUTED_COUNT_FIELDS + tuple(self.COMPUTED_FLAG_FIELDS)
+        row = Inventory.objects.filter(id=self.id).values(*stored_fields, **{f'counted_{field}': count for field, count in counts.items()}).get()
+        computed_fields = {field: row[f'counted_{field}'] for field in self.COMPUTED_COUNT_FIELDS}
+        for flag, field in self.COMPUTED_FLAG_FIELDS.items():
+            computed_fields[flag] = bool(computed_fields[field])
         # if total_hosts has changed, set update_task_impact to True
-        update_task_impact = total_hosts != self.total_hosts
-        computed_fields = {
-            'has_active_failures': bool(failed_hosts.count()),
-            'total_hosts': total_hosts,
-            'hosts_with_active_failures': failed_hosts.count(),
-            'total_groups': active_groups.count(),
-            'has_inventory_sources': bool(active_inventory_sources.count()),
-            'total_inventory_sources': active_inventory_sources.count(),
-            'inventory_sources_with_failures': failed_inventory_sources.count(),
-        }
-        # CentOS python seems to have issues clobbering the inventory on poor timing during certain operations
-        iobj = Inventory.objects.get(id=self.id)
+        update_task_impact = computed_fields['total_hosts'] != row['total_hosts']
         for field, value in list(computed_fields.items()):
-            if getattr(iobj, field) != value:
-                setattr(iobj, field, value)
+            if row[field] != value:
                 # update in-memory object
                 setattr(self, field, value)
             else:
                 computed_fields.pop(field)
         if computed_fields:
+            # CentOS python seems to have issues clobbering the inventory on poor timing during certain operations
+            iobj = Inventory.objects.get(id=self.id)
+            for field, value in computed_fields.items():
+                setattr(iobj, field, value)
             iobj.save(update_fields=computed_fields.keys())
         if update_task_impact:
-            # if total hosts count has changed, re-calculate task_impact for any
-            # job that is still in pending for this inventory, since task_impact
-            # is cached on task creation and used in task management system
-            tasks = self.jobs.filter(status="pending")
-            for t in tasks:
-                t.task_impact = t._get_task_impact()
-            UnifiedJob.objects.bulk_update(tasks, ['task_impact'])
+            self.update_pending_task_impact(row['counted_total_hosts'])
         logger.debug("Finished updating inventory computed fields, pk={0}, in {1:.3f} seconds".format(self.pk, time.time() - start_time))
 
+    def adjust_computed_fields(self, hosts=0, failed_hosts=0, groups=0):
+        """
+        Apply changes to the host and group counts that the caller already
+        knows of, such as hosts added by an import or hosts that started or
+        stopped failing in a job, instead of counting everything again.
+        """
+        if self.kind == 'smart':
+            # the hosts of smart inventories come from filters, there are no known changes
+            return self.update_computed_fields()
+        deltas = {'total_hosts': hosts, 'hosts_with_active_failures': failed_hosts, 'total_groups': groups}
+        updates = {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items() if delta}
+        if not updates:
+            return
+        if failed_hosts:
+            # every assignment reads the value from before the update
+            updates['has_active_failures'] = models.Case(
+                models.When(hosts_with_active_failures__gt=-failed_hosts, then=models.Value(True)), default=models.Value(False)
+            )
+        Inventory.objects.filter(id=self.id).update(**updates)
+        row = Inventory.objects.filter(id=self.id).values(*updates).first()
+        if row is None:
+            return
+        for field, value in row.items():
+            setattr(self, field, value)
+        if hosts:
+            self.update_pending_task_impact(row['total_hosts'])
+
+    def computed_fields_recount_due(self):
+        """
+        Counts the incremental changes to the computed fields of this inventory
+        and tells whether it is time to count everything again instead, which
+        corrects any drift, e.g. from hosts deleted while a job ran on them.
+        """
+        key = f'inventory-{self.id}-computed-fields-adjustments'
+        try:
+            adjustments = cache.incr(key)
+        except ValueError:
+            adjustments = 1
+            cache.set(key, adjustments, timeout=None)
+        return adjustments % settings.INVENTORY_COMPUTED_FIELDS_RECOUNT_INTERVAL == 0
+
+    def update_pending_task_impact(self, total_hosts):
+        """
+        The task_impact of a job is cached on creation and used by the task
+        manager, so it is recalculated, in a single UPDATE, for the pending
+        jobs of this inventory when the number of hosts changes. This is the
+        same calculation as Job._get_task_impact.
+        """
+        Job = self.jobs.model
+        forks = models.Case(models.When(forks=0, then=models.Value(5)), default=F('forks'), output_field=models.IntegerField())
+        count_hosts = models.Case(
+            models.When(launch_type='callback', then=models.Value(2)),
+            models.When(job_slice_count__gt=1, then=(models.Value(total_hosts) + F('job_slice_count') - F('job_slice_number')) / F('job_slice_count')),
+            default=models.Value(total_hosts),
+            output_field=models.IntegerField(),
+        )
+        task_impact = Job.objects.filter(pk=OuterRef('pk')).annotate(computed_task_impact=Least(count_hosts, forks) + 1).values('computed_task_impact')
+        UnifiedJob.objects.filter(pk__in=self.jobs.filter(status='pending').values('pk')).update(task_impact=Subquery(task_impact))
+
     def websocket_emit_status(self, status):
         connection.on_commit(
             lambda: emit_channel_notification('inventories-status_changed', {'group_name': 'inventories', 'inventory_id': self.id, 'status': status})
@@ -464,7 +680,9 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
             def on_commit():
                 from awx.main.tasks.system import update_host_smart_inventory_memberships
 
-                update_host_smart_inventory_memberships.delay()
+                # the memberships of a deleted inventory are deleted with it
+                if self.pk is not None:
+                    update_host_smart_inventory_memberships.delay(inventory_ids=[self.pk])
 
             connection.on_commit(on_commit)
 
@@ -499,6 +717,38 @@ class Inventory(CommonModelNameNotUnique, ResourceMixin, RelatedJobsMixin):
         return UnifiedJob.objects.non_polymorphic().filter(Q(job__inventory=self) | Q(inventoryupdate__inventory=self) | Q(adhoccommand__inventory=self))
 
 
+class InventoryScriptRevision(models.Model):
+    """
+    The revision of the script data of an inventory, that the copies kept by
+    InventoryScriptCache on every node are keyed on. It is kept in its own
+    table, so that saving an Inventory loaded before a bump does not set it
+    back, and without a foreign key, so that it can be bumped while the
+    inventory is being deleted.
+    """
+
+    class Meta:
+        app_label = 'main'
+
+    inventory_id = models.PositiveIntegerField(primary_key=True)
+    revision = models.BigIntegerField(default=0)
+
+    @classmethod
+    def get(cls, inventory_id):
+        return cls.objects.filter(inventory_id=inventory_id).values_list('revision', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, inventory_id):
+        """Called by bump_inventory_revision once the change is committed"""
+        if cls.objects.filter(inventory_id=inventory_id).update(revision=F('revision') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(inventory_id=inventory_id, revision=1)
+        except IntegrityError:
+            # created by a concurrent change
+            cls.objects.filter(inventory_id=inventory_id).update(revision=F('revision') + 1)
+
+
 class SmartInventoryMembership(BaseModel):
     """
     A lookup table for Host membership in Smart Inventory
@@ -585,6 +835,13 @@ class Host(CommonModelNameNotUnique, RelatedJobsMixin):
         null=True,
         help_text=_('The date and time ansible_facts was last modified.'),
     )
+    ansible_facts_digest = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        help_text=_('SHA-256 digest of the fact cache file ansible_facts was last loaded from.'),
+    )
 
     objects = HostManager()
 
@@ -630,11 +887,15 @@ class Host(CommonModelNameNotUnique, RelatedJobsMixin):
 
     def _update_host_smart_inventory_memeberships(self):
         if settings.AWX_REBUILD_SMART_MEMBERSHIP:
+            # a renamed or deleted host may give way to another host of its old name
+            host_names = {self.name}
+            if self.pk is not None:
+                host_names.update(Host.objects.filter(pk=self.pk).values_list('name', flat=True))
 
             def on_commit():
                 from awx.main.tasks.system import update_host_smart_inventory_memberships
 
-                update_host_smart_inventory_memberships.delay()
+                update_host_smart_inventory_memberships.delay(host_names=sorted(host_names))
 
             connection.on_commit(on_commit)
 
@@ -25,6 +25,7 @@ from awx.main.utils import parse_yaml_or_json, get_custom_venv_choices, get_lice
 from awx.main.utils.execution_environments import get_default_execution_environment
 from awx.main.utils.encryption import decrypt_value, get_encryption_key, is_encrypted
 from awx.main.utils.polymorphic import build_polymorphic_ctypes_map
+from awx.main.utils.rbac_cache import cached_accessible_pks
 from awx.main.fields import AskForField
 from awx.main.constants import ACTIVE_STATES, org_role_to_permission
 
@@ -65,6 +66,12 @@ class ResourceMixin(models.Model):
 
     @staticmethod
     def _accessible_pk_qs(cls, accessor, role_field, content_types=None):
+        return cached_accessible_pks(
+            cls, accessor, role_field, lambda: ResourceMixin._role_pk_qs(cls, accessor, role_field, content_types=content_types), content_types=content_types
+        )
+
+    @staticmethod
+    def _role_pk_qs(cls, accessor, role_field, content_types=None):
         if settings.ANSIBLE_BASE_ROLE_SYSTEM_ACTIVATED:
             if cls._meta.model_name == 'organization' and role_field in org_role_to_permission:
                 # Organization roles can not use the DAB RBAC shortcuts
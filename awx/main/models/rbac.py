@@ -6,6 +6,8 @@ import logging
 import threading
 import contextlib
 import re
+import time
+import uuid
 
 # django-rest-framework
 from rest_framework.serializers import ValidationError
@@ -14,7 +16,7 @@ from rest_framework.serializers import ValidationError
 from crum import impersonate
 
 # Django
-from django.db import models, transaction, connection
+from django.db import models, transaction, connection, IntegrityError
 from django.db.models.signals import m2m_changed
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
@@ -31,9 +33,11 @@ from ansible_base.lib.utils.models import get_type_for_model
 from awx.api.versioning import reverse
 from awx.main.migrations._dab_rbac import build_role_map, get_permissions_for_role
 from awx.main.constants import role_name_to_perm_mapping, org_role_to_permission
+from awx.main.utils.rbac_cache import bump_rbac_revision
 
 __all__ = [
     'Role',
+    'RbacRevision',
     'batch_role_ancestor_rebuilding',
     'ROLE_SINGLETON_SYSTEM_ADMINISTRATOR',
     'ROLE_SINGLETON_SYSTEM_AUDITOR',
@@ -144,11 +148,56 @@ def batch_role_ancestor_rebuilding(allow_nesting=False):
             additions = getattr(tls, 'additions')
             removals = getattr(tls, 'removals')
             with transaction.atomic():
-                Role.rebuild_role_ancestor_list(list(additions), list(removals))
+                Role.rebuild_role_ancestor_list(list(additions), list(removals), record_stats=True)
             delattr(tls, 'additions')
             delattr(tls, 'removals')
 
 
+class RoleAncestryRebuildStats:
+    """
+    Counts the passes, rows touched and time spent by a rebuild of the role
+    ancestors table, and reports them through the dispatcher subsystem metrics.
+    Reporting takes a round trip to Redis, so only batched rebuilds and
+    rebuilds in the 'closure' ROLE_ANCESTRY_REBUILD_MODE are reported, not
+    the rebuild that follows every single role change.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pass_started = self.started
+        self.passes = 0
+        self.inserted = 0
+        self.deleted = 0
+        self.pass_max_seconds = 0.0
+
+    def start_pass(self):
+        self.pass_started = time.perf_counter()
+
+    def end_pass(self, inserted, deleted):
+        seconds = time.perf_counter() - self.pass_started
+        self.passes += 1
+        self.inserted += inserted
+        self.deleted += deleted
+        self.pass_max_seconds = max(self.pass_max_seconds, seconds)
+        logger.debug(f'Role ancestry rebuild pass {self.passes}: {inserted} rows inserted, {deleted} rows deleted in {seconds:.3f} s')
+
+    def record(self):
+        from awx.main.analytics.subsystem_metrics import DispatcherMetrics
+
+        try:
+            subsystem_metrics = DispatcherMetrics(auto_pipe_execute=False)
+            subsystem_metrics.inc('role_ancestry_rebuild_calls', 1)
+            subsystem_metrics.inc('role_ancestry_rebuild_passes', self.passes)
+            subsystem_metrics.inc('role_ancestry_rebuild_rows_inserted', self.inserted)
+            subsystem_metrics.inc('role_ancestry_rebuild_rows_deleted', self.deleted)
+            subsystem_metrics.inc('role_ancestry_rebuild_seconds', time.perf_counter() - self.started)
+            subsystem_metrics.set('role_ancestry_rebuild_pass_max_seconds', self.pass_max_seconds)
+            subsystem_metrics.pipe_execute()
+        except Exception:
+            # the rebuild itself is done, losing its metrics is not worth failing the request
+            logger.warning('Failed to record the role ancestry rebuild metrics', exc_info=True)
+
+
 class Role(models.Model):
     """
     Role model
@@ -238,12 +287,17 @@ class Role(models.Model):
         return value
 
     @staticmethod
-    def rebuild_role_ancestor_list(additions, removals):
+    def rebuild_role_ancestor_list(additions, removals, record_stats=False):
         """
         Updates our `ancestors` map to accurately reflect all of the ancestors for a role
 
         You should never need to call this. Signal handlers should be calling
         this method when the role hierachy changes automatically.
+
+        record_stats reports the RoleAncestryRebuildStats of a sweep.
+
+        ROLE_ANCESTRY_REBUILD_MODE = 'closure' replaces the sweep described
+        below with _rebuild_role_ancestor_closure.
         """
         # The ancestry table
         # =================================================
@@ -331,6 +385,14 @@ class Role(models.Model):
             getattr(tls, 'removals').update(set(removals))
             return
 
+        stats = RoleAncestryRebuildStats()
+        if settings.ROLE_ANCESTRY_REBUILD_MODE == 'closure':
+            with transaction.atomic():
+                Role._rebuild_role_ancestor_closure(additions, removals, stats)
+                bump_rbac_revision()
+            stats.record()
+            return
+
         cursor = connection.cursor()
         loop_ct = 0
 
@@ -355,6 +417,7 @@ class Role(models.Model):
                 if loop_ct > 100:
                     raise Exception('Role ancestry rebuilding error: infinite loop detected')
                 loop_ct += 1
+                stats.start_pass()
 
                 delete_ct = 0
                 if len(removals) > 0:
@@ -419,6 +482,7 @@ class Role(models.Model):
                         )
                         insert_ct += cursor.rowcount
 
+                stats.end_pass(insert_ct, delete_ct)
                 if insert_ct == 0 and delete_ct == 0:
                     break
 
@@ -438,6 +502,155 @@ class Role(models.Model):
                     new_removals.update([row[0] for row in cursor.fetchall()])
                 removals = list(new_removals)
 
+        bump_rbac_revision()
+        if record_stats:
+            stats.record()
+
+    @staticmethod
+    def _rebuild_role_ancestor_closure(additions, removals, stats):
+        """
+        The 'closure' ROLE_ANCESTRY_REBUILD_MODE of rebuild_role_ancestor_list.
+
+        Instead of sweeping down the hierarchy a layer at a time, the changed
+        roles are staged in a temporary table and one recursive query collects
+        them together with all of their descendents, the only roles whose
+        ancestors can change. A second recursive query walks up from each of
+        those through the parents table, stopping at roles outside of that set,
+        whose stored ancestors are still correct, and stages the complete
+        ancestor list every affected role should have. The rows that differ
+        from it are then deleted and inserted in chunks of
+        ROLE_ANCESTRY_REBUILD_CHUNK_SIZE affected roles, each chunk is a pass.
+        Loops in the hierarchy need no special handling, the UNION of the
+        recursive queries stops at rows it has already produced.
+        """
+        cursor = connection.cursor()
+        sql_params = {
+            'ancestors_table': Role.ancestors.through._meta.db_table,
+            'parents_table': Role.parents.through._meta.db_table,
+            'roles_table': Role._meta.db_table,
+            'seeds_table': 'awx_role_ancestry_seeds',
+            'affected_table': 'awx_role_ancestry_affected',
+            'desired_table': 'awx_role_ancestry_desired',
+        }
+        temporary_tables = ('seeds_table', 'affected_table', 'desired_table')
+        chunk_size = settings.ROLE_ANCESTRY_REBUILD_CHUNK_SIZE
+
+        for table in temporary_tables:
+            cursor.execute('DROP TABLE IF EXISTS %s' % sql_params[table])
+        cursor.execute('CREATE TEMPORARY TABLE %(seeds_table)s (id integer NOT NULL)' % sql_params)
+        cursor.execute('CREATE TEMPORARY TABLE %(affected_table)s (id integer PRIMARY KEY)' % sql_params)
+        cursor.execute(
+            'CREATE TEMPORARY TABLE %(desired_table)s (descendent_id integer NOT NULL, ancestor_id integer NOT NULL, PRIMARY KEY (descendent_id, ancestor_id))'
+            % sql_params
+        )
+
+        seeds = sorted(set(additions) | set(removals))
+        for i in range(0, len(seeds), chunk_size):
+            sql_params['ids'] = ','.join(str(x) for x in seeds[i : i + chunk_size])
+            # roles that were deleted since have no ancestors left to rebuild
+            cursor.execute('INSERT INTO %(seeds_table)s (id) SELECT id FROM %(roles_table)s WHERE id IN (%(ids)s)' % sql_params)
+
+        cursor.execute(
+            '''
+            INSERT INTO %(affected_table)s (id)
+            WITH RECURSIVE descendents(id) AS (
+                SELECT id FROM %(seeds_table)s
+
+                UNION
+
+                SELECT parents.from_role_id
+                  FROM %(parents_table)s as parents
+                       INNER JOIN descendents
+                               ON (parents.to_role_id = descendents.id)
+            )
+            SELECT id FROM descendents
+        '''
+            % sql_params
+        )
+
+        cursor.execute(
+            '''
+            INSERT INTO %(desired_table)s (descendent_id, ancestor_id)
+            WITH RECURSIVE reached(descendent_id, role_id) AS (
+                SELECT id, id FROM %(affected_table)s
+
+                UNION
+
+                SELECT reached.descendent_id, parents.to_role_id
+                  FROM reached
+                       INNER JOIN %(affected_table)s as affected
+                               ON (affected.id = reached.role_id)
+                       INNER JOIN %(parents_table)s as parents
+                               ON (parents.from_role_id = reached.role_id)
+            )
+            SELECT reached.descendent_id, reached.role_id
+              FROM reached
+             WHERE reached.role_id IN (SELECT id FROM %(affected_table)s)
+
+             UNION
+
+            SELECT reached.descendent_id, ancestors.ancestor_id
+              FROM reached
+                   INNER JOIN %(ancestors_table)s as ancestors
+                           ON (ancestors.descendent_id = reached.role_id)
+             WHERE reached.role_id NOT IN (SELECT id FROM %(affected_table)s)
+        '''
+            % sql_params
+        )
+
+        if connection.vendor == 'postgresql':
+            # temporary tables are never analyzed by autovacuum
+            for table in temporary_tables:
+                cursor.execute('ANALYZE %s' % sql_params[table])
+
+        cursor.execute('SELECT id FROM %(affected_table)s ORDER BY id' % sql_params)
+        affected = [row[0] for row in cursor.fetchall()]
+        for i in range(0, len(affected), chunk_size):
+            stats.start_pass()
+            chunk = affected[i : i + chunk_size]
+            sql_params['first_id'], sql_params['last_id'] = chunk[0], chunk[-1]
+
+            cursor.execute(
+                '''
+                DELETE FROM %(ancestors_table)s
+                WHERE descendent_id BETWEEN %(first_id)s AND %(last_id)s
+                      AND descendent_id IN (SELECT id FROM %(affected_table)s)
+                      AND NOT EXISTS (
+                          SELECT 1
+                            FROM %(desired_table)s as desired
+                           WHERE desired.descendent_id = %(ancestors_table)s.descendent_id
+                                 AND desired.ancestor_id = %(ancestors_table)s.ancestor_id
+                      )
+            '''
+                % sql_params
+            )
+            delete_ct = cursor.rowcount
+
+            cursor.execute(
+                '''
+                INSERT INTO %(ancestors_table)s (descendent_id, ancestor_id, role_field, content_type_id, object_id)
+                SELECT desired.descendent_id,
+                       desired.ancestor_id,
+                       roles.role_field,
+                       COALESCE(roles.content_type_id, 0) content_type_id,
+                       COALESCE(roles.object_id, 0) object_id
+                  FROM %(desired_table)s as desired
+                       INNER JOIN %(roles_table)s as roles
+                               ON (roles.id = desired.descendent_id)
+                 WHERE desired.descendent_id BETWEEN %(first_id)s AND %(last_id)s
+                       AND NOT EXISTS (
+                           SELECT 1 FROM %(ancestors_table)s
+                            WHERE %(ancestors_table)s.descendent_id = desired.descendent_id
+                                  AND %(ancestors_table)s.ancestor_id = desired.ancestor_id
+                       )
+            '''
+                % sql_params
+            )
+            stats.end_pass(cursor.rowcount, delete_ct)
+
+        for table in temporary_tables:
+            cursor.execute('DROP TABLE %s' % sql_params[table])
+
     @staticmethod
     def visible_roles(user):
         return Role.filter_visible_roles(user, Role.objects.all())
@@ -507,6 +720,35 @@ class RoleAncestorEntry(models.Model):
     objects = AncestorManager()
 
 
+class RbacRevision(models.Model):
+    """
+    The revision of the roles, role assignments and object organizations, that
+    the accessible pks cached for users on every node are keyed on. It is a
+    single row, changed once after every transaction that made such a change
+    commits, so every node sees the new revision right after the change.
+    """
+
+    class Meta:
+        app_label = 'main'
+
+    revision = models.UUIDField(default=uuid.uuid4)
+
+    @classmethod
+    def get(cls):
+        return cls.objects.filter(pk=1).values_list('revision', flat=True).first()
+
+    @classmethod
+    def bump(cls):
+        if cls.objects.filter(pk=1).update(revision=uuid.uuid4()):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(pk=1)
+        except IntegrityError:
+            # created by a concurrent change
+            cls.objects.filter(pk=1).update(revision=uuid.uuid4())
+
+
 def role_summary_fields_generator(content_object, role_field):
     global role_descriptions
     global role_names
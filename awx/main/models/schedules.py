@@ -1,9 +1,12 @@
 # Copyright (c) 2015 Ansible, Inc.
 # All Rights Reserved.
 
+import bisect
 import datetime
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 import dateutil.rrule
 import dateutil.parser
@@ -11,6 +14,7 @@ from dateutil.tz import datetime_exists, tzutc
 from dateutil.zoneinfo import get_zonefile_instance
 
 # Django
+from django.conf import settings
 from django.db import models
 from django.db.models.query import QuerySet
 from django.utils.timezone import now, make_aware
@@ -34,6 +38,90 @@ __all__ = ['Schedule']
 
 UTC_TIMEZONES = {x: tzutc() for x in dateutil.parser.parserinfo().UTCZONE}
 
+_UNSET = object()
+
+
+class RRuleOccurrences(object):
+    """
+    A parsed rruleset along with what schedules need from it: its first
+    occurrence, its end date and the occurrences following a point in time.
+    The first two are computed once. The others are answered from a window of
+    the next window_size occurrences, which is only expanded again when asked
+    about a time it does not cover, so a window_size of 0 always asks the
+    rruleset. The rruleset may be shared and must not be modified.
+    """
+
+    def __init__(self, ruleset, window_size=0):
+        self.ruleset = ruleset
+        self.window_size = window_size
+        # (start, occurrences after start), replaced as a whole so threads never see half of it
+        self.window = (None, [])
+        self._first = _UNSET
+        self._end_date = _UNSET
+
+    def first(self):
+        if self._first is _UNSET:
+            try:
+                self._first = self.ruleset[0]
+            except IndexError:
+                self._first = None
+        return self._first
+
+    def end_date(self):
+        if self._end_date is _UNSET:
+            self._end_date = Schedule.get_end_date(self.ruleset)
+        return self._end_date
+
+    def xafter(self, dt, count):
+        """Returns up to count occurrences following dt, like rruleset.xafter"""
+        if count > self.window_size:
+            return list(self.ruleset.xafter(dt, count=count))
+        start, occurrences = self.window
+        index = bisect.bisect_right(occurrences, dt) if start is not None and start <= dt else None
+        # a window shorter than window_size holds every remaining occurrence
+        if index is None or (index + count > len(occurrences) and len(occurrences) == self.window_size):
+            occurrences = list(self.ruleset.xafter(dt, count=self.window_size))
+            self.window = (dt, occurrences)
+            index = 0
+        return occurrences[index : index + count]
+
+    def after(self, dt):
+        """Returns the first occurrence following dt, or None, like rruleset.after"""
+        occurrences = self.xafter(dt, 1)
+        return occurrences[0] if occurrences else None
+
+
+class RRuleCache(object):
+    """
+    The RRuleOccurrences of the most recently used rrules of this process,
+    keyed by the rrule text, which carries the timezone of its DTSTART
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, rrule):
+        with self.lock:
+            entry = self.entries.get(rrule)
+            if entry is not None:
+                self.entries.move_to_end(rrule)
+            return entry
+
+    def add(self, rrule, entry, size):
+        with self.lock:
+            self.entries[rrule] = entry
+            self.entries.move_to_end(rrule)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+rrule_cache = RRuleCache()
+
 
 class ScheduleFilterMethods(object):
     def enabled(self, enabled=True):
@@ -194,7 +282,7 @@ class Schedule(PrimordialModel, LaunchTimeConfig):
         return " ".join(rules)
 
     @classmethod
-    def rrulestr(cls, rrule, fast_forward=True, **kwargs):
+    def parse_rrule(cls, rrule, **kwargs):
         """
         Apply our own custom rrule parsing requirements
         """
@@ -205,30 +293,50 @@ class Schedule(PrimordialModel, LaunchTimeConfig):
         for r in x._rrule:
             if r._dtstart and r._dtstart.tzinfo is None:
                 raise ValueError('A valid TZID must be provided (e.g., America/New_York)')
+        return x
+
+    @classmethod
+    def occurrences(cls, rrule, fast_forward=True, **kwargs):
+        """
+        Returns the RRuleOccurrences of an rrule, kept in a process-level cache
+        if SCHEDULE_RRULE_CACHE_SIZE is set and no parsing options are given
+        """
+        size = settings.SCHEDULE_RRULE_CACHE_SIZE if not kwargs else 0
+        entry = rrule_cache.get(rrule) if size > 0 else None
+        if entry is None:
+            entry = RRuleOccurrences(Schedule.parse_rrule(rrule, **kwargs), window_size=settings.SCHEDULE_RRULE_CACHE_OCCURRENCES if size > 0 else 0)
+            if size > 0:
+                rrule_cache.add(rrule, entry, size)
 
         # Fast forward is a way for us to limit the number of events in the rruleset
         # If we are fastforwading and we don't have a count limited rule that is minutely or hourley
         # We will modify the start date of the rule to last week to prevent a large number of entries
         if fast_forward:
-            try:
-                # All rules in a ruleset will have the same dtstart value
-                #   so lets compare the first event to now to see if its > 7 days old
-                first_event = x[0]
-                if (now() - first_event).days > 7:
-                    for rule in x._rrule:
-                        # If any rule has a minutely or hourly rule without a count...
-                        if rule._freq in [dateutil.rrule.MINUTELY, dateutil.rrule.HOURLY] and not rule._count:
-                            # hourly/minutely rrules with far-past DTSTART values
-                            # are *really* slow to precompute
-                            # start *from* one week ago to speed things up drastically
-                            new_start = (now() - datetime.timedelta(days=7)).strftime('%Y%m%d')
-                            # Now we want to repalce the DTSTART:<value>T with the new date (which includes the T)
-                            new_rrule = re.sub('(DTSTART[^:]*):[^T]+T', r'\1:{0}T'.format(new_start), rrule)
-                            return Schedule.rrulestr(new_rrule, fast_forward=False)
-            except IndexError:
-                pass
+            # All rules in a ruleset will have the same dtstart value
+            #   so lets compare the first event to now to see if its > 7 days old
+            first_event = entry.first()
+            if first_event is not None and (now() - first_event).days > 7:
+                for rule in entry.ruleset._rrule:
+                    # If any rule has a minutely or hourly rule without a count...
+                    if rule._freq in [dateutil.rrule.MINUTELY, dateutil.rrule.HOURLY] and not rule._count:
+                        # hourly/minutely rrules with far-past DTSTART values
+                        # are *really* slow to precompute
+                        # start *from* one week ago to speed things up drastically
+                        new_start = (now() - datetime.timedelta(days=7)).strftime('%Y%m%d')
+                        # Now we want to repalce the DTSTART:<value>T with the new date (which includes the T)
+                        new_rrule = re.sub('(DTSTART[^:]*):[^T]+T', r'\1:{0}T'.format(new_start), Schedule.coerce_naive_until(rrule))
+                        return Schedule.occurrences(new_rrule, fast_forward=False)
+
+        return entry
 
-        return x
+    @classmethod
+    def rrulestr(cls, rrule, fast_forward=True, **kwargs):
+        """
+        Returns the rruleset of an rrule, fast forwarded to last week if it
+        would otherwise be slow to expand. The rruleset may be shared through
+        the rrule cache and must not be modified.
+        """
+        return Schedule.occurrences(rrule, fast_forward=fast_forward, **kwargs).ruleset
 
     def __str__(self):
         return u'%s_t%s_%s_%s' % (self.name, self.unified_job_template.id, self.id, self.next_run)
@@ -266,7 +374,7 @@ class Schedule(PrimordialModel, LaunchTimeConfig):
         for field_name in affects_fields:
             starting_values[field_name] = getattr(self, field_name)
 
-        future_rs = Schedule.rrulestr(self.rrule)
+        future_rs = Schedule.occurrences(self.rrule)
 
         if self.enabled:
             next_run_actual = future_rs.after(now())
@@ -279,11 +387,9 @@ class Schedule(PrimordialModel, LaunchTimeConfig):
             next_run_actual = None
 
         self.next_run = next_run_actual
-        try:
-            self.dtstart = future_rs[0].astimezone(pytz.utc)
-        except IndexError:
-            self.dtstart = None
-        self.dtend = Schedule.get_end_date(future_rs)
+        first_event = future_rs.first()
+        self.dtstart = first_event.astimezone(pytz.utc) if first_event is not None else None
+        self.dtend = future_rs.end_date()
 
         changed = any(getattr(self, field_name) != starting_values[field_name] for field_name in affects_fields)
         return changed
@@ -5,14 +5,10 @@
 from io import StringIO
 import datetime
 import decimal
-import codecs
 import json
 import logging
-import os
 import re
 import socket
-import subprocess
-import tempfile
 from collections import OrderedDict
 
 # Django
@@ -54,6 +50,8 @@ from awx.main.utils.common import (
 )
 from awx.main.utils.encryption import encrypt_dict, decrypt_field
 from awx.main.utils import polymorphic
+from awx.main.utils.stdout import StdoutIndex
+from awx.main.utils.rbac_cache import cached_accessible_pks
 from awx.main.constants import ACTIVE_STATES, CAN_CANCEL, JOB_VARIABLE_PREFIXES
 from awx.main.redact import UriCleaner, REPLACE_STR
 from awx.main.consumers import emit_channel_notification
@@ -215,10 +213,15 @@ class UnifiedJobTemplate(PolymorphicModel, CommonModelNameNotUnique, ExecutionEn
 
         action = to_permissions[role_field]
 
-        return (
-            RoleEvaluation.objects.filter(role__in=accessor.has_roles.all(), codename__startswith=action, content_type_id__in=cls._submodels_with_roles())
-            .values_list('object_id')
-            .distinct()
+        return cached_accessible_pks(
+            cls,
+            accessor,
+            role_field,
+            lambda: (
+                RoleEvaluation.objects.filter(role__in=accessor.has_roles.all(), codename__startswith=action, content_type_id__in=cls._submodels_with_roles())
+                .values_list('object_id')
+                .distinct()
+            ),
         )
 
     def _perform_unique_checks(self, unique_checks):
@@ -1085,96 +1088,111 @@ class UnifiedJob(
             return True  # Model without events, such as WFJT
         return self.emitted_events == event_qs.count()
 
-    def result_stdout_raw_handle(self, enforce_max_bytes=True):
+    def _stdout_copy_sql(self):
+        tbl = self._meta.db_table + 'event'
+        created_by_cond = ''
+        if self.has_unpartitioned_events:
+            tbl = f'_unpartitioned_{tbl}'
+        else:
+            created_by_cond = f"job_created='{self.created.isoformat()}' AND "
+
+        sql = (
+            f"copy (select stdout from {tbl} where {created_by_cond}{self.event_parent_key}={self.id} and stdout != '' order by start_line) to stdout"  # nosql
+        )
+        return sql
+
+    def _iter_stdout_events(self):
+        # Note: this _intentionally_ does not use the Django ORM because of the
+        # potential size (many MB+) of `main_jobevent.stdout`; we *do not* want
+        # to generate queries here that construct model objects by fetching large
+        # gobs of data (and potentially ballooning memory usage); instead, we
+        # just stream the values of a certain column (`stdout`) with COPY
+        with connection.cursor() as cursor:
+            with cursor.copy(self._stdout_copy_sql()) as copy:
+                # psycopg3's copy returns bytes, one whole row per read, so
+                # escaped line sequences never span two reads
+                while data := copy.read():
+                    yield smart_str(bytes(data)).replace('\\r\\n', '\n')
+
+    def _iter_stdout(self):
+        """
+        Yield the stdout for the UnifiedJob as text pieces, one per event,
+        streamed straight from the database
+        """
+        # Before the addition of event-based stdout, older versions of
+        # awx stored stdout as raw text blobs in a certain database column
+        # (`main_unifiedjob.result_stdout_text`)
+        # For older installs, this data still exists in the database; check for
+        # it and use if it exists
+        legacy_stdout_text = self.result_stdout_text
+        if legacy_stdout_text:
+            yield legacy_stdout_text
+        else:
+            yield from self._iter_stdout_events()
+
+    def get_stdout_index(self):
+        """
+        Returns the StdoutIndex for a finished UnifiedJob whose events have all
+        been saved, building it if it does not exist yet on this node.
+        Returns None if the stdout cannot be indexed (yet).
+        """
+        if not settings.STDOUT_INDEX_ENABLED or self.status in ACTIVE_STATES:
+            return None
+        index = StdoutIndex(self)
+        if index.load():
+            return index
+        if not self.event_processing_finished:
+            return None
+        try:
+            index.build(self._iter_stdout())
+        except OSError:
+            logger.exception(f'Failed to write indexed stdout for {self.log_format}')
+            return None
+        from awx.main.tasks.system import purge_old_stdout_files  # circular import
+
+        purge_old_stdout_files.apply_async()
+        return index
+
+    def iter_result_stdout_raw(self):
+        """
+        Yield all stdout for the UnifiedJob as text pieces, without holding
+        more than one event (or one chunk of indexed stdout) in memory.
+        """
+        index = self.get_stdout_index()
+        if index is not None:
+            return index.iter_text()
+        return self._iter_stdout()
+
+    def result_stdout_raw_handle(self):
         """
         This method returns a file-like object ready to be read which contains
         all stdout for the UnifiedJob.
 
-        If the size of the file is greater than
+        If the size of the stdout is greater than
         `settings.STDOUT_MAX_BYTES_DISPLAY`, a StdoutMaxBytesExceeded exception
-        will be raised.
+        will be raised; use iter_result_stdout_raw() to stream stdout of any size.
         """
         max_supported = settings.STDOUT_MAX_BYTES_DISPLAY
 
-        if enforce_max_bytes:
-            # If enforce_max_bytes is True, we're not grabbing the whole file,
-            # just the first <settings.STDOUT_MAX_BYTES_DISPLAY> bytes;
-            # in this scenario, it's probably safe to use a StringIO.
-            fd = StringIO()
-        else:
-            # If enforce_max_bytes = False, that means they're downloading
-            # the entire file.  To avoid ballooning memory, let's write the
-            # stdout content to a temporary disk location
-            if not os.path.exists(settings.JOBOUTPUT_ROOT):
-                os.makedirs(settings.JOBOUTPUT_ROOT)
-            fd = tempfile.NamedTemporaryFile(
-                mode='w', prefix='{}-{}-'.format(self.model_to_str(), self.pk), suffix='.out', dir=settings.JOBOUTPUT_ROOT, encoding='utf-8'
-            )
-            from awx.main.tasks.system import purge_old_stdout_files  # circular import
-
-            purge_old_stdout_files.apply_async()
+        index = self.get_stdout_index()
+        if index is not None:
+            if index.chars > max_supported:
+                raise StdoutMaxBytesExceeded(index.chars, max_supported)
+            return StringIO(''.join(index.iter_text()))
 
-        # Before the addition of event-based stdout, older versions of
-        # awx stored stdout as raw text blobs in a certain database column
-        # (`main_unifiedjob.result_stdout_text`)
-        # For older installs, this data still exists in the database; check for
-        # it and use if it exists
         legacy_stdout_text = self.result_stdout_text
         if legacy_stdout_text:
-            if enforce_max_bytes and len(legacy_stdout_text) > max_supported:
+            if len(legacy_stdout_text) > max_supported:
                 raise StdoutMaxBytesExceeded(len(legacy_stdout_text), max_supported)
-            fd.write(legacy_stdout_text)
-            if hasattr(fd, 'name'):
-                fd.flush()
-                return codecs.open(fd.name, 'r', encoding='utf-8')
-            else:
-                # we just wrote to this StringIO, so rewind it
-                fd.seek(0)
-                return fd
-        else:
-            # Note: the code in this block _intentionally_ does not use the
-            # Django ORM because of the potential size (many MB+) of
-            # `main_jobevent.stdout`; we *do not* want to generate queries
-            # here that construct model objects by fetching large gobs of
-            # data (and potentially ballooning memory usage); instead, we
-            # just want to write concatenated values of a certain column
-            # (`stdout`) directly to a file
-
-            with connection.cursor() as cursor:
-                if enforce_max_bytes:
-                    # detect the length of all stdout for this UnifiedJob, and
-                    # if it exceeds settings.STDOUT_MAX_BYTES_DISPLAY bytes,
-                    # don't bother actually fetching the data
-                    total = self.get_event_queryset().aggregate(total=models.Sum(models.Func(models.F('stdout'), function='LENGTH')))['total'] or 0
-                    if total > max_supported:
-                        raise StdoutMaxBytesExceeded(total, max_supported)
-
-                tbl = self._meta.db_table + 'event'
-                created_by_cond = ''
-                if self.has_unpartitioned_events:
-                    tbl = f'_unpartitioned_{tbl}'
-                else:
-                    created_by_cond = f"job_created='{self.created.isoformat()}' AND "
-
-                sql = f"copy (select stdout from {tbl} where {created_by_cond}{self.event_parent_key}={self.id} and stdout != '' order by start_line) to stdout"  # nosql
-                # psycopg3's copy writes bytes, but callers of this
-                # function assume a str-based fd will be returned; decode
-                # .write() calls on the fly to maintain this interface
-                with cursor.copy(sql) as copy:
-                    while data := copy.read():
-                        fd.write(smart_str(bytes(data)))
-
-                if hasattr(fd, 'name'):
-                    # If we're dealing with a physical file, use `sed` to clean
-                    # up escaped line sequences
-                    fd.flush()
-                    subprocess.Popen("sed -i 's/\\\\r\\\\n/\\n/g' {}".format(fd.name), shell=True).wait()
-                    return codecs.open(fd.name, 'r', encoding='utf-8')
-                else:
-                    # If we're dealing with an in-memory string buffer, use
-                    # string.replace()
-                    fd = StringIO(fd.getvalue().replace('\\r\\n', '\n'))
-                    return fd
+            return StringIO(legacy_stdout_text)
+
+        # detect the length of all stdout for this UnifiedJob, and
+        # if it exceeds settings.STDOUT_MAX_BYTES_DISPLAY bytes,
+        # don't bother actually fetching the data
+        total = self.get_event_queryset().aggregate(total=models.Sum(models.Func(models.F('stdout'), function='LENGTH')))['total'] or 0
+        if total > max_supported:
+            raise StdoutMaxBytesExceeded(total, max_supported)
+        return StringIO(''.join(self._iter_stdout_events()))
 
     def _escape_ascii(self, content):
         # Remove ANSI escape sequences used to embed event data.
@@ -1203,19 +1221,32 @@ class UnifiedJob(
         return_buffer = StringIO()
         if end_line is not None:
             end_line = int(end_line)
-        stdout_lines = self.result_stdout_raw_handle().readlines()
-        absolute_end = len(stdout_lines)
-        for line in stdout_lines[int(start_line) : end_line]:
+        index = self.get_stdout_index()
+        if index is not None:
+            # only the requested lines are read, so only check the whole size when all of it is asked for
+            max_supported = settings.STDOUT_MAX_BYTES_DISPLAY
+            if end_line is None and int(start_line) >= 0 and index.chars > max_supported:
+                raise StdoutMaxBytesExceeded(index.chars, max_supported)
+            absolute_end = index.lines
+            selected_lines = index.read_lines(*slice(int(start_line), end_line).indices(absolute_end)[:2])
+            selected_chars = sum(len(line) for line in selected_lines)
+            if selected_chars > max_supported:
+                raise StdoutMaxBytesExceeded(selected_chars, max_supported)
+        else:
+            stdout_lines = self.result_stdout_raw_handle().readlines()
+            absolute_end = len(stdout_lines)
+            selected_lines = stdout_lines[int(start_line) : end_line]
+        for line in selected_lines:
             return_buffer.write(line)
         if int(start_line) < 0:
-            start_actual = len(stdout_lines) + int(start_line)
-            end_actual = len(stdout_lines)
+            start_actual = absolute_end + int(start_line)
+            end_actual = absolute_end
         else:
             start_actual = int(start_line)
             if end_line is not None:
-                end_actual = min(int(end_line), len(stdout_lines))
+                end_actual = min(int(end_line), absolute_end)
             else:
-                end_actual = len(stdout_lines)
+                end_actual = absolute_end
 
         return_buffer = return_buffer.getvalue()
         if redact_sensitive:
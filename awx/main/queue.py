@@ -4,12 +4,33 @@
 # Python
 import json
 import logging
+import threading
+import zlib
+
 import redis
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 # Django
 from django.conf import settings
 
-__all__ = ['CallbackQueueDispatcher']
+__all__ = ['CallbackQueueDispatcher', 'BufferedCallbackQueueDispatcher', 'load_callback_message']
+
+logger = logging.getLogger('awx.main.queue')
+
+# Compressed messages are framed with a prefix that can never start a JSON object
+COMPRESSION_PREFIXES = {
+    'zlib': b'zlib:',
+    'lz4': b'lz4:',
+}
 
 
 # use a custom JSON serializer so we can properly handle !unsafe and !vault
@@ -22,11 +43,105 @@ class AnsibleJSONEncoder(json.JSONEncoder):
         return super(AnsibleJSONEncoder, self).default(o)
 
 
+def _orjson_default(o):
+    if getattr(o, 'yaml_tag', None) == '!vault':
+        return o.data
+    raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
+
+
+def _compress(data, compression):
+    if compression == 'lz4':
+        return COMPRESSION_PREFIXES['lz4'] + lz4.frame.compress(data)
+    return COMPRESSION_PREFIXES['zlib'] + zlib.compress(data, 1)
+
+
+def load_callback_message(message):
+    """
+    Deserialize a message popped from the callback queue, unpacking it
+    first if the producer compressed it
+    """
+    if isinstance(message, bytes) and not message.startswith(b'{'):
+        if message.startswith(COMPRESSION_PREFIXES['zlib']):
+            message = zlib.decompress(message[len(COMPRESSION_PREFIXES['zlib']) :])
+        elif message.startswith(COMPRESSION_PREFIXES['lz4']):
+            if lz4 is None:
+                raise json.JSONDecodeError('lz4 compressed message received but the lz4 module is not installed', '', 0)
+            message = lz4.frame.decompress(message[len(COMPRESSION_PREFIXES['lz4']) :])
+    return json.loads(message)
+
+
 class CallbackQueueDispatcher(object):
     def __init__(self):
         self.queue = getattr(settings, 'CALLBACK_QUEUE', '')
         self.logger = logging.getLogger('awx.main.queue.CallbackQueueDispatcher')
         self.connection = redis.Redis.from_url(settings.BROKER_URL)
+        self.use_orjson = settings.JOB_EVENT_DISPATCH_SERIALIZER == 'orjson' and orjson is not None
+        self.compression = settings.JOB_EVENT_DISPATCH_COMPRESSION
+        if self.compression == 'lz4' and lz4 is None:
+            self.compression = 'zlib'
+        self.compress_threshold = settings.JOB_EVENT_DISPATCH_COMPRESS_THRESHOLD
+
+    def serialize(self, obj):
+        data = None
+        if self.use_orjson:
+            try:
+                data = orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # orjson is stricter than json (e.g. integers over 64 bits), let json have a go
+                pass
+        if data is None:
+            data = json.dumps(obj, cls=AnsibleJSONEncoder).encode('utf-8')
+        if self.compress_threshold and len(data) >= self.compress_threshold:
+            data = _compress(data, self.compression)
+        return data
+
+    def dispatch(self, obj):
+        self.connection.rpush(self.queue, self.serialize(obj))
+
+    def flush(self):
+        pass
+
+
+class BufferedCallbackQueueDispatcher(CallbackQueueDispatcher):
+    """
+    Groups serialized events and sends them with a single RPUSH of many items,
+    once JOB_EVENT_DISPATCH_BUFFER_SIZE events are buffered or the oldest
+    buffered event has waited JOB_EVENT_DISPATCH_BUFFER_SECONDS. A timer sends
+    what is buffered when no further event arrives in that time, so a quiet
+    playbook does not hold back its output. Callers must call flush() when
+    they are done dispatching.
+    """
+
+    def __init__(self):
+        super(BufferedCallbackQueueDispatcher, self).__init__()
+        self.buffer = []
+        self.buffer_size = settings.JOB_EVENT_DISPATCH_BUFFER_SIZE
+        self.buffer_seconds = settings.JOB_EVENT_DISPATCH_BUFFER_SECONDS
+        # the timer flushes from its own thread
+        self.lock = threading.Lock()
+        self.timer = None
 
     def dispatch(self, obj):
-        self.connection.rpush(self.queue, json.dumps(obj, cls=AnsibleJSONEncoder))
+        data = self.serialize(obj)
+        with self.lock:
+            self.buffer.append(data)
+            # EOF is the last message of a run, do not hold it back
+            if len(self.buffer) >= self.buffer_size or obj.get('event') == 'EOF':
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.buffer_seconds, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.buffer:
+            return
+        messages, self.buffer = self.buffer, []
+        self.connection.rpush(self.queue, *messages)
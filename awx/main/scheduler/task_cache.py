@@ -0,0 +1,121 @@
+# Copyright (c) 2024 Ansible by Red Hat
+# All Rights Reserved.
+import collections
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+
+from awx.main.models import UnifiedJob
+
+logger = logging.getLogger('awx.main.scheduler')
+
+
+class ActiveTaskCache:
+    """
+    The pending, waiting and running tasks the task manager works on, kept in
+    memory between task manager runs in the same process.
+
+    Every run takes a snapshot of a few cheap columns of all active tasks and
+    only loads the full objects of tasks that are new or whose snapshot
+    changed since they were loaded. Tasks that left the active states are
+    dropped. The templates, inventories and instance groups of a task can
+    change without its row changing, so the related objects the last run
+    used on the tasks that are kept are fetched again every run, in bulk.
+    Everything is reloaded every TASK_MANAGER_INCREMENTAL_REBUILD_INTERVAL
+    seconds, and after any run whose transaction did not commit.
+    """
+
+    # any save() bumps modified, the other columns catch queryset updates
+    SNAPSHOT_FIELDS = ('id', 'status', 'modified', 'task_impact', 'controller_node', 'execution_node', 'instance_group_id', 'cancel_flag')
+    LOAD_BATCH_SIZE = 1000
+    # how deep the related objects of related objects are fetched again
+    RELATED_DEPTH = 2
+
+    def __init__(self):
+        self.tasks = {}
+        self.snapshots = {}
+        self.last_rebuild = None
+        self.consistent = False
+
+    def invalidate(self):
+        self.consistent = False
+
+    def mark_consistent(self):
+        self.consistent = True
+
+    def needs_rebuild(self):
+        if not self.consistent or self.last_rebuild is None:
+            return True
+        return time.monotonic() - self.last_rebuild >= settings.TASK_MANAGER_INCREMENTAL_REBUILD_INTERVAL
+
+    def load(self, queryset, ids):
+        for start in range(0, len(ids), self.LOAD_BATCH_SIZE):
+            for task in queryset.filter(pk__in=ids[start : start + self.LOAD_BATCH_SIZE]).prefetch_related('dependent_jobs'):
+                self.tasks[task.pk] = task
+
+    def related_lookups(self, obj, depth=0):
+        """The lookups of the related objects cached on obj, and of those cached on them"""
+        cached = dict(obj._state.fields_cache)
+        for name, objs in getattr(obj, '_prefetched_objects_cache', {}).items():
+            cached[name] = objs[0] if objs else None
+        lookups = set()
+        for name, related in cached.items():
+            lookups.add(name)
+            if related is not None and depth < self.RELATED_DEPTH:
+                lookups.update(f'{name}__{lookup}' for lookup in self.related_lookups(related, depth + 1))
+        return lookups
+
+    def refetch_related_objects(self, tasks):
+        """
+        Drops the related objects cached on tasks and fetches the ones the last
+        run used again, with one query per relation and type of task
+        """
+        lookups = collections.defaultdict(set)
+        by_model = collections.defaultdict(list)
+        for task in tasks:
+            by_model[type(task)].append(task)
+            lookups[type(task)].update(self.related_lookups(task))
+            task._state.fields_cache = {}
+            # the dependencies are kept, refresh_dependency_status updates them
+            prefetched = getattr(task, '_prefetched_objects_cache', {})
+            task._prefetched_objects_cache = {name: objs for name, objs in prefetched.items() if name == 'dependent_jobs'}
+        for model, model_tasks in by_model.items():
+            prefetch_related_objects(model_tasks, *sorted(lookup for lookup in lookups[model] if not lookup.startswith('dependent_jobs')))
+
+    def refresh_dependency_status(self):
+        """The dependencies of tasks that were not reloaded may have finished since"""
+        dependencies = [dep for task in self.tasks.values() for dep in task.dependent_jobs.all()]
+        if not dependencies:
+            return
+        status = dict(UnifiedJob.objects.filter(pk__in={dep.pk for dep in dependencies}).values_list('pk', 'status'))
+        for dep in dependencies:
+            dep.status = status.get(dep.pk, dep.status)
+
+    def refresh(self, queryset):
+        """
+        Bring the cache up to date with the tasks matched by queryset and
+        return them ordered by creation
+        """
+        snapshots = {row[0]: row[1:] for row in queryset.values_list(*self.SNAPSHOT_FIELDS)}
+        if self.needs_rebuild():
+            self.tasks = {}
+            self.last_rebuild = time.monotonic()
+            stale = list(snapshots)
+        else:
+            for pk in list(self.tasks):
+                if pk not in snapshots:
+                    del self.tasks[pk]
+            stale = [pk for pk, snapshot in snapshots.items() if self.snapshots.get(pk) != snapshot]
+            for pk in stale:
+                self.tasks.pop(pk, None)
+            self.refetch_related_objects(self.tasks.values())
+            self.refresh_dependency_status()
+        self.load(queryset, stale)
+        # a task that left the active states before it could be loaded must not count as cached
+        self.snapshots = {pk: snapshot for pk, snapshot in snapshots.items() if pk in self.tasks}
+        # until this run commits, what is in memory may not match the database
+        self.consistent = False
+        logger.debug(f'Task manager cache loaded {len(stale)} of {len(snapshots)} active tasks')
+        return sorted(self.tasks.values(), key=lambda task: (task.created, task.pk))
@@ -43,6 +43,7 @@ from awx.main.utils.common import task_manager_bulk_reschedule, is_testing
 from awx.main.signals import disable_activity_stream
 from awx.main.constants import ACTIVE_STATES
 from awx.main.scheduler.dependency_graph import DependencyGraph
+from awx.main.scheduler.task_cache import ActiveTaskCache
 from awx.main.scheduler.task_manager_models import TaskManagerModels
 import awx.main.analytics.subsystem_metrics as s_metrics
 from awx.main.utils import decrypt_field
@@ -50,6 +51,9 @@ from awx.main.utils import decrypt_field
 
 logger = logging.getLogger('awx.main.scheduler')
 
+# tasks of the task manager kept in memory between runs, see TASK_MANAGER_INCREMENTAL
+active_task_cache = ActiveTaskCache()
+
 
 def timeit(func):
     def inner(*args, **kwargs):
@@ -63,6 +67,9 @@ def timeit(func):
 
 
 class TaskBase:
+    # an ActiveTaskCache, for managers that keep their tasks in memory between runs
+    task_cache = None
+
     def __init__(self, prefix=""):
         self.prefix = prefix
         # initialize each metric to 0 and force metric_has_changed to true. This
@@ -88,17 +95,19 @@ class TaskBase:
             return True
         return False
 
+    def get_tasks_queryset(self, filter_args):
+        wf_approval_ctype_id = ContentType.objects.get_for_model(WorkflowApproval).id
+        return UnifiedJob.objects.filter(**filter_args).exclude(launch_type='sync').exclude(polymorphic_ctype_id=wf_approval_ctype_id)
+
     @timeit
     def get_tasks(self, filter_args):
-        wf_approval_ctype_id = ContentType.objects.get_for_model(WorkflowApproval).id
-        qs = (
-            UnifiedJob.objects.filter(**filter_args)
-            .exclude(launch_type='sync')
-            .exclude(polymorphic_ctype_id=wf_approval_ctype_id)
-            .order_by('created')
-            .prefetch_related('dependent_jobs')
-        )
-        self.all_tasks = [t for t in qs]
+        qs = self.get_tasks_queryset(filter_args)
+        if self.task_cache is not None:
+            self.all_tasks = self.task_cache.refresh(qs)
+            # the cache is only trusted by the next run if this one commits
+            transaction.on_commit(self.task_cache.mark_consistent)
+            return
+        self.all_tasks = [t for t in qs.order_by('created').prefetch_related('dependent_jobs')]
 
     def record_aggregate_metrics(self, *args):
         if not is_testing():
@@ -425,6 +434,8 @@ class TaskManager(TaskBase):
         # will no longer be started and will be started on the next task manager cycle.
         self.time_delta_job_explanation = timedelta(seconds=30)
         super().__init__(prefix="task_manager")
+        if settings.TASK_MANAGER_INCREMENTAL:
+            self.task_cache = active_task_cache
 
     def after_lock_init(self):
         """
@@ -1,5 +1,6 @@
 # Copyright (c) 2022 Ansible by Red Hat
 # All Rights Reserved.
+import heapq
 import logging
 
 from django.conf import settings
@@ -52,6 +53,8 @@ class TaskManagerInstanceGroup:
         self.max_concurrent_jobs = obj.max_concurrent_jobs
         self.max_forks = obj.max_forks
         self.control_task_impact = kwargs.get('control_task_impact', settings.AWX_CONTROL_NODE_TASK_IMPACT)
+        # node type -> heap of (-remaining capacity, position in self.instances, instance), built on first use
+        self.capacity_heaps = None
 
     def consume_capacity(self, task):
         """We only consume capacity on an instance group level if it is a container group. Otherwise we consume capacity on an instance level."""
@@ -61,6 +64,44 @@ class TaskManagerInstanceGroup:
         else:
             raise RuntimeError("We only track capacity for container groups at the instance group level. Otherwise, consume capacity on instances.")
 
+    def build_capacity_heaps(self):
+        self.capacity_heaps = {}
+        for position, instance in enumerate(self.instances):
+            self.capacity_heaps.setdefault(instance.node_type, []).append((-instance.remaining_capacity, position, instance))
+        for heap in self.capacity_heaps.values():
+            heapq.heapify(heap)
+
+    def most_remaining_capacity_instance(self, node_type):
+        """
+        Returns the instance of node_type with the most remaining capacity (the
+        first one in the group on a tie) and its position in the group.
+
+        Entries are refreshed lazily when they reach the top of the heap. This
+        relies on capacity only ever being consumed while the task manager runs,
+        so an out of date entry can only overstate what an instance has left.
+        """
+        if self.capacity_heaps is None:
+            self.build_capacity_heaps()
+        heap = self.capacity_heaps.get(node_type)
+        while heap:
+            neg_remaining, position, instance = heap[0]
+            if -neg_remaining == instance.remaining_capacity:
+                return instance, position
+            heapq.heapreplace(heap, (-instance.remaining_capacity, position, instance))
+        return None, None
+
+    def fit_task_to_most_remaining_capacity_instance(self, impact, capacity_type, hybrid_control_cost=0):
+        """The same choice as the scan in TaskManagerInstanceGroups, from the top of one heap per node type"""
+        best = None
+        for node_type, cost in {capacity_type: 0, 'hybrid': hybrid_control_cost}.items():
+            instance, position = self.most_remaining_capacity_instance(node_type)
+            if instance is None:
+                continue
+            would_be_remaining = instance.remaining_capacity - impact - cost
+            if would_be_remaining >= 0 and (best is None or (would_be_remaining, -position) > (best[0], -best[1])):
+                best = (would_be_remaining, position, instance)
+        return best[2] if best else None
+
     def get_remaining_instance_capacity(self):
         return sum(inst.remaining_capacity for inst in self.instances)
 
@@ -170,6 +211,8 @@ class TaskManagerInstanceGroups:
         self.pk_ig_map = dict()
         self.control_task_impact = kwargs.get('control_task_impact', settings.AWX_CONTROL_NODE_TASK_IMPACT)
         self.controlplane_ig_name = kwargs.get('controlplane_ig_name', settings.DEFAULT_CONTROL_PLANE_QUEUE_NAME)
+        # place tasks using the per group capacity heaps instead of scanning every instance of the group
+        self.capacity_index = kwargs.get('capacity_index', True)
 
         if instance_groups is not None:  # for testing
             self.instance_groups = {ig.name: TaskManagerInstanceGroup(ig, self.task_manager_instances, **kwargs) for ig in instance_groups}
@@ -209,6 +252,10 @@ class TaskManagerInstanceGroups:
     def fit_task_to_most_remaining_capacity_instance(self, task, instance_group_name, impact=None, capacity_type=None, add_hybrid_control_cost=False):
         impact = impact if impact else task.task_impact
         capacity_type = capacity_type if capacity_type else task.capacity_type
+        if self.capacity_index:
+            return self.instance_groups[instance_group_name].fit_task_to_most_remaining_capacity_instance(
+                impact, capacity_type, hybrid_control_cost=self.control_task_impact if add_hybrid_control_cost else 0
+            )
         instance_most_capacity = None
         most_remaining_capacity = -1
         instances = self.instance_groups[instance_group_name].instances
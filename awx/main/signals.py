@@ -27,28 +27,36 @@ from django.utils import timezone
 from crum import get_current_request, get_current_user
 from crum.signals import current_user_getter
 
+# django-ansible-base
+from ansible_base.rbac import permission_registry
+from ansible_base.rbac.models import RoleDefinition, RoleTeamAssignment, RoleUserAssignment
 
 # AWX
 from awx.main.models import (
     ActivityStream,
+    Credential,
     ExecutionEnvironment,
     Group,
     Host,
     Inventory,
+    InventoryScriptRevision,
     InventorySource,
     Job,
     JobHostSummary,
     JobTemplate,
+    NotificationTemplate,
     OAuth2AccessToken,
     Organization,
     Project,
     Role,
     SystemJob,
     SystemJobTemplate,
+    Team,
     UnifiedJob,
     UnifiedJobTemplate,
     User,
     UserSessionMembership,
+    WorkflowJobTemplate,
     WorkflowJobTemplateNode,
     WorkflowApproval,
     WorkflowApprovalTemplate,
@@ -57,6 +65,8 @@ from awx.main.models import (
 from awx.main.constants import CENSOR_VALUE
 from awx.main.utils import model_instance_diff, model_to_dict, camelcase_to_underscore, get_current_apps
 from awx.main.utils import ignore_inventory_computed_fields, ignore_inventory_group_removal, _inventory_updates
+from awx.main.utils.inventory_cache import bump_inventory_revision
+from awx.main.utils.rbac_cache import bump_rbac_revision
 from awx.main.tasks.system import update_inventory_computed_fields, handle_removed_image
 from awx.main.fields import (
     is_implicit_parent,
@@ -109,6 +119,38 @@ def emit_update_inventory_on_created_or_deleted(sender, **kwargs):
             connection.on_commit(lambda: update_inventory_computed_fields.delay(inventory.id))
 
 
+def bump_inventory_script_revision(sender, instance, **kwargs):
+    """Invalidate the cached script data of the inventory of a changed host, group or inventory"""
+    if not settings.INVENTORY_SCRIPT_CACHE_ENABLED or kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    if isinstance(instance, Inventory):
+        if kwargs['signal'] == post_delete:
+            InventoryScriptRevision.objects.filter(inventory_id=instance.pk).delete()
+            return
+        inventory_id = instance.pk
+    else:
+        inventory_id = instance.inventory_id
+    if inventory_id:
+        bump_inventory_revision(inventory_id)
+
+
+def bump_rbac_cache_revision(sender, **kwargs):
+    """Invalidate the accessible pks cached for users when role memberships or assignments change"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_rbac_revision()
+
+
+def bump_rbac_cache_revision_on_parent_change(sender, instance, created=False, **kwargs):
+    """New objects, and objects moved to another organization, get the permissions granted on their parent"""
+    parent_field_name = permission_registry.get_parent_fd_name(instance)
+    if parent_field_name is None:
+        return
+    parent_attname = instance._meta.get_field(parent_field_name).attname
+    # the values the object was loaded with are kept until its save returns
+    if created or instance._prior_values_store.get(parent_attname) != getattr(instance, parent_attname):
+        bump_rbac_revision()
+
+
 def rebuild_role_ancestor_list(reverse, model, instance, pk_set, action, **kwargs):
     'When a role parent is added or removed, update our role hierarchy list'
     if action == 'post_add':
@@ -233,7 +275,20 @@ def connect_computed_field_signals():
 connect_computed_field_signals()
 
 post_save.connect(save_related_job_templates, sender=Inventory)
+for model in (Inventory, Group, Host):
+    post_save.connect(bump_inventory_script_revision, sender=model)
+    post_delete.connect(bump_inventory_script_revision, sender=model)
+m2m_changed.connect(bump_inventory_script_revision, Group.hosts.through)
+m2m_changed.connect(bump_inventory_script_revision, Group.parents.through)
 m2m_changed.connect(rebuild_role_ancestor_list, Role.parents.through)
+m2m_changed.connect(bump_rbac_cache_revision, Role.members.through)
+m2m_changed.connect(bump_rbac_cache_revision, RoleDefinition.permissions.through)
+for model in (RoleUserAssignment, RoleTeamAssignment):
+    post_save.connect(bump_rbac_cache_revision, sender=model)
+    post_delete.connect(bump_rbac_cache_revision, sender=model)
+# the models registered with an organization parent in the permission registry, it is not filled in yet
+for model in (Project, Team, WorkflowJobTemplate, JobTemplate, Inventory, Organization, Credential, NotificationTemplate, ExecutionEnvironment):
+    post_save.connect(bump_rbac_cache_revision_on_parent_change, sender=model)
 m2m_changed.connect(rbac_activity_stream, Role.members.through)
 m2m_changed.connect(rbac_activity_stream, Role.parents.through)
 post_save.connect(sync_superuser_status_to_rbac, sender=User)
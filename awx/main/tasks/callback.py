@@ -13,7 +13,7 @@ from django.db import connections
 from awx.main.redact import UriCleaner
 from awx.main.constants import MINIMAL_EVENTS, ANSIBLE_RUNNER_NEEDS_UPDATE_MESSAGE
 from awx.main.utils.update_model import update_model
-from awx.main.queue import CallbackQueueDispatcher
+from awx.main.queue import CallbackQueueDispatcher, BufferedCallbackQueueDispatcher
 
 logger = logging.getLogger('awx.main.tasks.callback')
 
@@ -25,7 +25,10 @@ class RunnerCallback:
         self.guid = get_guid()
         self.job_created = None
         self.recent_event_timings = deque(maxlen=settings.MAX_WEBSOCKET_EVENT_RATE)
-        self.dispatcher = CallbackQueueDispatcher()
+        if settings.JOB_EVENT_DISPATCH_BUFFER_SIZE > 1:
+            self.dispatcher = BufferedCallbackQueueDispatcher()
+        else:
+            self.dispatcher = CallbackQueueDispatcher()
         self.safe_env = {}
         self.event_ct = 0
         self.model = model
@@ -1,8 +1,12 @@
-import codecs
+import contextlib
 import datetime
+import hashlib
+import itertools
 import os
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Django
 from django.conf import settings
@@ -19,11 +23,117 @@ from awx.main.models.inventory import Host
 logger = logging.getLogger('awx.main.tasks.facts')
 system_tracking_logger = logging.getLogger('awx.analytics.system_tracking')
 
+# hosts are fetched, their files written or read, and their facts saved in batches of this size
+FACT_CACHE_BATCH_SIZE = 100
 
-@log_excess_runtime(logger, debug_cutoff=0.01, msg='Inventory {inventory_id} host facts prepared for {written_ct} hosts, took {delta:.3f} s', add_log_data=True)
+# digest recorded for hosts whose facts were cleared, the same as for a fact cache file holding {}
+CLEARED_FACTS_DIGEST = hashlib.sha256(b'{}').hexdigest()
+
+
+@contextlib.contextmanager
+def fact_cache_io_map():
+    """
+    Yields a map function for per-host file operations, which runs them on a
+    thread pool if ANSIBLE_FACT_CACHE_IO_THREADS is more than 1
+    """
+    threads = settings.ANSIBLE_FACT_CACHE_IO_THREADS
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            yield executor.map
+    else:
+        yield map
+
+
+def fact_cache_path(destination, host_name):
+    """Returns the fact cache file of a host, or None if the host name would point outside of destination"""
+    host_name = str(host_name)
+    if not host_name or host_name in (os.curdir, os.pardir) or os.sep in host_name:
+        return None
+    return os.path.join(destination, host_name)
+
+
+def iter_batches(hosts, log_data):
+    """Yields lists of hosts, adding the time spent fetching them to log_data['db_time']"""
+    hosts = iter(hosts)
+    while True:
+        start = time.time()
+        batch = list(itertools.islice(hosts, FACT_CACHE_BATCH_SIZE))
+        log_data['db_time'] += time.time() - start
+        if not batch:
+            return
+        yield batch
+
+
+def write_host_facts(item):
+    host, filepath = item
+    try:
+        # never follow a link placed where the file should be
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            os.fchmod(fd, 0o600)
+            json.dump(host.ansible_facts, f)
+            f.flush()
+            return os.fstat(fd).st_mtime
+    except OSError:
+        system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
+        return None
+
+
+def read_host_facts(item):
+    """
+    Returns the digest of the fact cache file of a host and the facts in it.
+    The facts are not parsed, and None is returned for them, if the digest
+    shows the file has the same content the saved facts were loaded from.
+    """
+    host, filepath = item
+    try:
+        with open(filepath, 'rb') as f:
+            content = f.read()
+    except OSError:
+        system_tracking_logger.error('facts for host {} could not be read'.format(smart_str(host.name)))
+        return None, None
+    digest = hashlib.sha256(content).hexdigest()
+    if digest == host.ansible_facts_digest:
+        return digest, None
+    try:
+        return digest, json.loads(content)
+    except ValueError:
+        return None, None
+
+
+def top_level_facts_diff(old_facts, new_facts):
+    """Returns the top level facts that were added or changed, and the names of those that were removed"""
+    changed = {key: value for key, value in new_facts.items() if key not in old_facts or old_facts[key] != value}
+    removed = sorted(key for key in old_facts if key not in new_facts)
+    return changed, removed
+
+
+def scan_fact_cache(destination):
+    """
+    Returns the modification time of every file in the fact cache from a single
+    scan of the directory. Links are reported with a time of None.
+    """
+    mtimes = {}
+    try:
+        with os.scandir(destination) as entries:
+            for entry in entries:
+                mtimes[entry.name] = None if entry.is_symlink() else entry.stat(follow_symlinks=False).st_mtime
+    except FileNotFoundError:
+        pass
+    return mtimes
+
+
+@log_excess_runtime(
+    logger,
+    debug_cutoff=0.01,
+    msg='Inventory {inventory_id} host facts prepared for {written_ct} hosts, took {delta:.3f} s (database {db_time:.3f} s, files {io_time:.3f} s)',
+    add_log_data=True,
+)
 def start_fact_cache(hosts, destination, log_data, timeout=None, inventory_id=None):
     log_data['inventory_id'] = inventory_id
     log_data['written_ct'] = 0
+    log_data['db_time'] = 0.0
+    log_data['io_time'] = 0.0
     try:
         os.makedirs(destination, mode=0o700)
     except FileExistsError:
@@ -31,59 +141,85 @@ def start_fact_cache(hosts, destination, log_data, timeout=None, inventory_id=No
 
     if timeout is None:
         timeout = settings.ANSIBLE_FACT_CACHE_TIMEOUT
+    expired_before = now() - datetime.timedelta(seconds=timeout) if timeout else None
 
     if isinstance(hosts, QuerySet):
+        # only load the facts of hosts whose facts are not expired
+        hosts = hosts.filter(ansible_facts_modified__isnull=False)
+        if expired_before:
+            hosts = hosts.filter(ansible_facts_modified__gte=expired_before)
         hosts = hosts.iterator()
 
-    last_filepath_written = None
-    for host in hosts:
-        if (not host.ansible_facts_modified) or (timeout and host.ansible_facts_modified < now() - datetime.timedelta(seconds=timeout)):
-            continue  # facts are expired - do not write them
-        filepath = os.sep.join(map(str, [destination, host.name]))
-        if not os.path.realpath(filepath).startswith(destination):
-            system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
-            continue
-        try:
-            with codecs.open(filepath, 'w', encoding='utf-8') as f:
-                os.chmod(f.name, 0o600)
-                json.dump(host.ansible_facts, f)
-                log_data['written_ct'] += 1
-                last_filepath_written = filepath
-        except IOError:
-            system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
-            continue
+    last_modified = None
+    with fact_cache_io_map() as io_map:
+        for batch in iter_batches(hosts, log_data):
+            to_write = []
+            for host in batch:
+                if (not host.ansible_facts_modified) or (expired_before and host.ansible_facts_modified < expired_before):
+                    continue  # facts are expired - do not write them
+                filepath = fact_cache_path(destination, host.name)
+                if filepath is None:
+                    system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
+                    continue
+                to_write.append((host, filepath))
+
+            start = time.time()
+            for modified in io_map(write_host_facts, to_write):
+                if modified is not None:
+                    log_data['written_ct'] += 1
+                    last_modified = modified if last_modified is None else max(last_modified, modified)
+            log_data['io_time'] += time.time() - start
     # make note of the time we wrote the last file so we can check if any file changed later
-    if last_filepath_written:
-        return os.path.getmtime(last_filepath_written)
-    return None
+    return last_modified
 
 
 def raw_update_hosts(host_list):
-    Host.objects.bulk_update(host_list, ['ansible_facts', 'ansible_facts_modified'])
+    Host.objects.bulk_update(host_list, ['ansible_facts', 'ansible_facts_modified', 'ansible_facts_digest'])
 
 
-def update_hosts(host_list, max_tries=5):
-    if not host_list:
-        return
+def raw_touch_hosts(host_list, modified):
+    Host.objects.filter(pk__in=[host.pk for host in host_list]).update(ansible_facts_modified=modified)
+
+
+def retry_on_deadlock(save, action, max_tries):
     for i in range(max_tries):
         try:
-            raw_update_hosts(host_list)
+            save()
         except OperationalError as exc:
             # Deadlocks can happen if this runs at the same time as another large query
             # inventory updates and updating last_job_host_summary are candidates for conflict
             # but these would resolve easily on a retry
             if i + 1 < max_tries:
-                logger.info(f'OperationalError (suspected deadlock) saving host facts retry {i}, message: {exc}')
+                logger.info(f'OperationalError (suspected deadlock) {action} retry {i}, message: {exc}')
                 continue
             else:
                 raise
         break
 
 
+def touch_hosts(host_list, max_tries=5):
+    """Mark the facts of hosts as fresh, for facts that were gathered again with the same result"""
+    if not host_list:
+        return
+    modified = now()
+    retry_on_deadlock(lambda: raw_touch_hosts(host_list, modified), 'marking host facts fresh', max_tries)
+    for host in host_list:
+        host.ansible_facts_modified = modified
+
+
+def update_hosts(host_list, max_tries=5):
+    if not host_list:
+        return
+    retry_on_deadlock(lambda: raw_update_hosts(host_list), 'saving host facts', max_tries)
+
+
 @log_excess_runtime(
     logger,
     debug_cutoff=0.01,
-    msg='Inventory {inventory_id} host facts: updated {updated_ct}, cleared {cleared_ct}, unchanged {unmodified_ct}, took {delta:.3f} s',
+    msg=(
+        'Inventory {inventory_id} host facts: updated {updated_ct}, cleared {cleared_ct}, unchanged {unmodified_ct}, '
+        'took {delta:.3f} s (database {db_time:.3f} s, files {io_time:.3f} s)'
+    ),
     add_log_data=True,
 )
 def finish_fact_cache(hosts, destination, facts_write_time, log_data, job_id=None, inventory_id=None):
@@ -91,49 +227,94 @@ def finish_fact_cache(hosts, destination, facts_write_time, log_data, job_id=Non
     log_data['updated_ct'] = 0
     log_data['unmodified_ct'] = 0
     log_data['cleared_ct'] = 0
+    log_data['db_time'] = 0.0
+    log_data['io_time'] = 0.0
 
     if isinstance(hosts, QuerySet):
-        hosts = hosts.iterator()
+        # the facts are replaced by what is in the files, the saved ones are never needed
+        hosts = hosts.defer('ansible_facts').iterator()
+
+    start = time.time()
+    mtimes = scan_fact_cache(destination)
+    log_data['io_time'] += time.time() - start
 
-    hosts_to_update = []
-    for host in hosts:
-        filepath = os.sep.join(map(str, [destination, host.name]))
-        if not os.path.realpath(filepath).startswith(destination):
-            system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
-            continue
-        if os.path.exists(filepath):
-            # If the file changed since we wrote the last facts file, pre-playbook run...
-            modified = os.path.getmtime(filepath)
-            if (not facts_write_time) or modified > facts_write_time:
-                with codecs.open(filepath, 'r', encoding='utf-8') as f:
-                    try:
-                        ansible_facts = json.load(f)
-                    except ValueError:
-                        continue
-                    host.ansible_facts = ansible_facts
+    inventory_names = {}
+
+    def inventory_name(host):
+        if host.inventory_id not in inventory_names:
+            inventory_names[host.inventory_id] = smart_str(host.inventory.name)
+        return inventory_names[host.inventory_id]
+
+    with fact_cache_io_map() as io_map:
+        for batch in iter_batches(hosts, log_data):
+            hosts_to_update = []
+            hosts_to_touch = []
+            to_read = []
+            for host in batch:
+                filepath = fact_cache_path(destination, host.name)
+                if filepath is None or (host.name in mtimes and mtimes[host.name] is None):
+                    system_tracking_logger.error('facts for host {} could not be cached'.format(smart_str(host.name)))
+                    continue
+                if host.name in mtimes:
+                    # If the file changed since we wrote the last facts file, pre-playbook run...
+                    if (not facts_write_time) or mtimes[host.name] > facts_write_time:
+                        to_read.append((host, filepath))
+                    else:
+                        log_data['unmodified_ct'] += 1
+                elif host.ansible_facts_digest == CLEARED_FACTS_DIGEST:
+                    log_data['unmodified_ct'] += 1
+                else:
+                    # if the file goes missing, ansible removed it (likely via clear_facts)
+                    host.ansible_facts = {}
                     host.ansible_facts_modified = now()
+                    host.ansible_facts_digest = CLEARED_FACTS_DIGEST
                     hosts_to_update.append(host)
-                    system_tracking_logger.info(
-                        'New fact for inventory {} host {}'.format(smart_str(host.inventory.name), smart_str(host.name)),
-                        extra=dict(
-                            inventory_id=host.inventory.id,
-                            host_name=host.name,
-                            ansible_facts=host.ansible_facts,
-                            ansible_facts_modified=host.ansible_facts_modified.isoformat(),
-                            job_id=job_id,
-                        ),
-                    )
-                    log_data['updated_ct'] += 1
-            else:
-                log_data['unmodified_ct'] += 1
-        else:
-            # if the file goes missing, ansible removed it (likely via clear_facts)
-            host.ansible_facts = {}
-            host.ansible_facts_modified = now()
-            hosts_to_update.append(host)
-            system_tracking_logger.info('Facts cleared for inventory {} host {}'.format(smart_str(host.inventory.name), smart_str(host.name)))
-            log_data['cleared_ct'] += 1
-        if len(hosts_to_update) > 100:
+                    system_tracking_logger.info('Facts cleared for inventory {} host {}'.format(inventory_name(host), smart_str(host.name)))
+                    log_data['cleared_ct'] += 1
+
+            start = time.time()
+            read_facts = list(io_map(read_host_facts, to_read))
+            log_data['io_time'] += time.time() - start
+
+            old_facts = {}
+            if settings.ANSIBLE_FACT_LOG_DIFF:
+                # the saved facts are only loaded for the hosts whose facts changed
+                deferred_ids = [
+                    host.pk
+                    for (host, filepath), (digest, facts) in zip(to_read, read_facts)
+                    if facts is not None and 'ansible_facts' in host.get_deferred_fields()
+                ]
+                if deferred_ids:
+                    start = time.time()
+                    old_facts = dict(Host.objects.filter(pk__in=deferred_ids).values_list('pk', 'ansible_facts'))
+                    log_data['db_time'] += time.time() - start
+
+            for (host, filepath), (digest, ansible_facts) in zip(to_read, read_facts):
+                if digest is None:
+                    continue
+                if ansible_facts is None:
+                    # gathered again, with the same result
+                    hosts_to_touch.append(host)
+                    log_data['unmodified_ct'] += 1
+                    continue
+                extra = dict(
+                    inventory_id=host.inventory_id,
+                    host_name=host.name,
+                    ansible_facts=ansible_facts,
+                    job_id=job_id,
+                )
+                if settings.ANSIBLE_FACT_LOG_DIFF:
+                    previous = old_facts[host.pk] if host.pk in old_facts else host.ansible_facts
+                    extra['ansible_facts'], extra['ansible_facts_removed'] = top_level_facts_diff(previous or {}, ansible_facts)
+                host.ansible_facts = ansible_facts
+                host.ansible_facts_modified = now()
+                host.ansible_facts_digest = digest
+                hosts_to_update.append(host)
+                extra['ansible_facts_modified'] = host.ansible_facts_modified.isoformat()
+                system_tracking_logger.info('New fact for inventory {} host {}'.format(inventory_name(host), smart_str(host.name)), extra=extra)
+                log_data['updated_ct'] += 1
+
+            start = time.time()
             update_hosts(hosts_to_update)
-            hosts_to_update = []
-    update_hosts(hosts_to_update)
+            touch_hosts(hosts_to_touch)
+            log_data['db_time'] += time.time() - start
@@ -86,6 +86,9 @@ from django.utils.translation import gettext_lazy as _
 
 logger = logging.getLogger('awx.main.tasks.jobs')
 
+# streamed inventory scripts are written as adjacent string literals of about this many characters each
+INVENTORY_SCRIPT_LITERAL_SIZE = 65536
+
 
 def with_path_cleanup(f):
     @functools.wraps(f)
@@ -313,7 +316,9 @@ class BaseTask(object):
         return env
 
     def write_inventory_file(self, inventory, private_data_dir, file_name, script_params):
-        script_data = inventory.get_script_data(**script_params)
+        if settings.INVENTORY_SCRIPT_STREAMING:
+            return self.stream_inventory_file(inventory, private_data_dir, file_name, script_params)
+        script_data = inventory.get_cached_script_data(**script_params)
         for hostname, hv in script_data.get('_meta', {}).get('hostvars', {}).items():
             # maintain a list of host_name --> host_id
             # so we can associate emitted events to Host objects
@@ -321,6 +326,27 @@ class BaseTask(object):
         file_content = '#! /usr/bin/env python3\n# -*- coding: utf-8 -*-\nprint(%r)\n' % json.dumps(script_data)
         return self.write_private_data_file(private_data_dir, file_name, file_content, sub_dir='inventory', file_permissions=0o700)
 
+    def stream_inventory_file(self, inventory, private_data_dir, file_name, script_params):
+        """
+        Write the same inventory script as write_inventory_file, with the JSON
+        text streamed from the database into the file as a sequence of string
+        literals, so the whole inventory is never held in memory
+        """
+        file_path = self.write_private_data_file(private_data_dir, file_name, '', sub_dir='inventory', file_permissions=0o700)
+        with open(file_path, 'w') as f:
+            f.write('#! /usr/bin/env python3\n# -*- coding: utf-8 -*-\nprint(\n')
+            buffered = []
+            buffered_size = 0
+            for piece in inventory.stream_script_data(host_map=self.runner_callback.host_map, **script_params):
+                buffered.append(piece)
+                buffered_size += len(piece)
+                if buffered_size >= INVENTORY_SCRIPT_LITERAL_SIZE:
+                    f.write('%r\n' % ''.join(buffered))
+                    buffered = []
+                    buffered_size = 0
+            f.write('%r\n)\n' % ''.join(buffered))
+        return file_path
+
     def build_inventory(self, instance, private_data_dir):
         script_params = dict(hostvars=True, towervars=True)
         if hasattr(instance, 'job_slice_number'):
@@ -461,6 +487,12 @@ class BaseTask(object):
     def should_use_fact_cache(self):
         return False
 
+    def flush_buffered_events(self):
+        try:
+            self.runner_callback.dispatcher.flush()
+        except Exception:
+            logger.exception('{} Failed to send buffered events to the callback receiver.'.format(self.instance.log_format))
+
     @with_path_cleanup
     @with_signal_handling
     def run(self, pk, **kwargs):
@@ -632,6 +664,7 @@ class BaseTask(object):
             logger.exception('%s Exception occurred while running task', self.instance.log_format)
         finally:
             logger.debug('%s finished running, producing %s events.', self.instance.log_format, self.runner_callback.event_ct)
+            self.flush_buffered_events()
 
         try:
             self.post_run_hook(self.instance, status)
@@ -644,6 +677,9 @@ class BaseTask(object):
         except Exception:
             logger.exception('{} Post run hook errored.'.format(self.instance.log_format))
 
+        # inventory updates emit events from the post run hook
+        self.flush_buffered_events()
+
         self.instance = self.update_model(pk)
         self.instance = self.update_model(pk, status=status, select_for_update=True, **self.runner_callback.get_delayed_update_fields())
 
@@ -1120,6 +1156,9 @@ class RunJob(SourceControlMixin, BaseTask):
             pass
         else:
             if inventory is not None:
+                if settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL and inventory.kind == '' and not inventory.computed_fields_recount_due():
+                    # the playbook stats already adjusted the failed hosts, nothing else changes with a job run
+                    return
                 update_inventory_computed_fields.delay(inventory.id)
 
 
@@ -1644,8 +1683,12 @@ class RunInventoryUpdate(SourceControlMixin, BaseTask):
         inventory_update.refresh_from_db()
         private_data_dir = inventory_update.job_env['AWX_PRIVATE_DATA_DIR']
         expected_output = os.path.join(private_data_dir, 'artifacts', str(inventory_update.id), 'output.json')
-        with open(expected_output) as f:
-            data = json.load(f)
+        if settings.INVENTORY_IMPORT_STREAM_JSON:
+            # parsed as it is read by the import
+            data = open(expected_output, encoding='utf-8')
+        else:
+            with open(expected_output) as f:
+                data = json.load(f)
 
         # build inventory save options
         options = dict(
@@ -1706,6 +1749,9 @@ class RunInventoryUpdate(SourceControlMixin, BaseTask):
         except Exception:
             logger.exception('Exception saving {} content, rolling back changes.'.format(inventory_update.log_format))
             raise PostRunError('Error occured while saving inventory data, see traceback or server logs', status='error', tb=traceback.format_exc())
+        finally:
+            if not isinstance(data, dict):
+                data.close()
 
 
 @task(queue=get_task_queuename)
@@ -17,6 +17,7 @@ from datetime import datetime
 # Django
 from django.conf import settings
 from django.db import connection, transaction, DatabaseError, IntegrityError
+from django.db.models import Q
 from django.db.models.fields.related import ForeignKey
 from django.utils.timezone import now, timedelta
 from django.utils.encoding import smart_str
@@ -24,7 +25,7 @@ from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext_noop
 from django.core.cache import cache
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import EmptyResultSet, ObjectDoesNotExist
 
 # Django-CRUM
 from crum import impersonate
@@ -47,16 +48,19 @@ from awx.main.models import (
     UnifiedJob,
     Notification,
     Inventory,
+    Host,
     SmartInventoryMembership,
     Job,
+    JobEventTreeSummary,
     convert_jsonfields,
 )
 from awx.main.constants import ACTIVE_STATES
 from awx.main.dispatch.publish import task
 from awx.main.dispatch import get_task_queuename, reaper
-from awx.main.utils.common import ignore_inventory_computed_fields, ignore_inventory_group_removal
+from awx.main.utils.common import ignore_inventory_computed_fields, ignore_inventory_group_removal, task_manager_bulk_reschedule
 
 from awx.main.utils.reload import stop_local_services
+from awx.main.utils.inventory_cache import InventoryScriptCache
 from awx.main.utils.pglock import advisory_lock
 from awx.main.tasks.helpers import is_run_threshold_reached
 from awx.main.tasks.receptor import get_receptor_ctl, worker_info, worker_cleanup, administrative_workunit_reaper, write_receptor_config
@@ -88,6 +92,10 @@ def dispatch_startup():
     except Exception:
         logger.exception("Failed json field conversion, skipping.")
 
+    if not settings.INVENTORY_SCRIPT_CACHE_ENABLED:
+        # the changes made while the cache is disabled do not bump the revisions the copies are keyed on
+        InventoryScriptCache.purge()
+
     startup_logger.debug("Syncing Schedules")
     for sch in Schedule.objects.all():
         try:
@@ -376,6 +384,26 @@ def purge_old_stdout_files():
             logger.debug("Removing {}".format(os.path.join(settings.JOBOUTPUT_ROOT, f)))
 
 
+@task(queue=get_task_queuename)
+def build_stdout_index(unified_job_id):
+    try:
+        unified_job = UnifiedJob.objects.get(pk=unified_job_id)
+    except UnifiedJob.DoesNotExist:
+        return
+    unified_job.get_stdout_index()
+
+
+@task(queue=get_task_queuename)
+def build_job_event_tree_summary(job_id):
+    try:
+        job = Job.objects.get(pk=job_id)
+    except Job.DoesNotExist:
+        return
+    # if events are still being saved, the summary is built on the first request after they are
+    if job.event_processing_finished:
+        JobEventTreeSummary.build(job)
+
+
 def _cleanup_images_and_files(**kwargs):
     if settings.IS_K8S:
         return
@@ -418,6 +446,7 @@ def handle_removed_image(remove_images=None):
 @task(queue=get_task_queuename)
 def cleanup_images_and_files():
     _cleanup_images_and_files(image_prune=True)
+    InventoryScriptCache.purge(max_age=settings.INVENTORY_SCRIPT_CACHE_MAX_AGE)
 
 
 @task(queue=get_task_queuename)
@@ -725,10 +754,16 @@ def awx_periodic_scheduler():
         state.schedule_last_run = run_now
         state.save()
 
+        batch = settings.AWX_PERIODIC_SCHEDULER_BATCH
         old_schedules = Schedule.objects.enabled().before(last_run)
-        for schedule in old_schedules:
-            schedule.update_computed_fields()
-        schedules = Schedule.objects.enabled().between(last_run, run_now)
+        if batch:
+            update_schedules_computed_fields(old_schedules)
+        else:
+            for schedule in old_schedules:
+                schedule.update_computed_fields()
+        schedules = list(Schedule.objects.enabled().between(last_run, run_now))
+        # the time each schedule was due, before next_run moves on
+        due_times = {schedule.pk: schedule.next_run for schedule in schedules}
 
         invalid_license = False
         try:
@@ -736,36 +771,77 @@ def awx_periodic_scheduler():
         except PermissionDenied as e:
             invalid_license = e
 
-        for schedule in schedules:
-            template = schedule.unified_job_template
-            schedule.update_computed_fields()  # To update next_run timestamp.
-            if template.cache_timeout_blocked:
-                logger.warning("Cache timeout is in the future, bypassing schedule for template %s" % str(template.id))
-                continue
-            try:
-                job_kwargs = schedule.get_job_kwargs()
-                new_unified_job = schedule.unified_job_template.create_unified_job(**job_kwargs)
-                logger.debug('Spawned {} from schedule {}-{}.'.format(new_unified_job.log_format, schedule.name, schedule.pk))
-
-                if invalid_license:
-                    new_unified_job.status = 'failed'
-                    new_unified_job.job_explanation = str(invalid_license)
-                    new_unified_job.save(update_fields=['status', 'job_explanation'])
-                    new_unified_job.websocket_emit_status("failed")
-                    raise invalid_license
-                can_start = new_unified_job.signal_start()
-            except Exception:
-                logger.exception('Error spawning scheduled job.')
-                continue
-            if not can_start:
-                new_unified_job.status = 'failed'
-                new_unified_job.job_explanation = gettext_noop(
-                    "Scheduled job could not start because it \
-                    was not in the right state or required manual credentials"
-                )
-                new_unified_job.save(update_fields=['status', 'job_explanation'])
-                new_unified_job.websocket_emit_status("failed")
-            emit_channel_notification('schedules-changed', dict(id=schedule.id, group_name="schedules"))
+        subsystem_metrics = DispatcherMetrics(auto_pipe_execute=False)
+        latencies = []
+        if batch:
+            update_schedules_computed_fields(schedules)
+            # the task and dependency managers are woken up once, after all jobs are spawned
+            with task_manager_bulk_reschedule():
+                for schedule in schedules:
+                    if spawn_scheduled_job(schedule, invalid_license):
+                        latencies.append((now() - due_times[schedule.pk]).total_seconds())
+        else:
+            for schedule in schedules:
+                schedule.update_computed_fields()  # To update next_run timestamp.
+                if spawn_scheduled_job(schedule, invalid_license):
+                    latencies.append((now() - due_times[schedule.pk]).total_seconds())
+        for latency in latencies:
+            subsystem_metrics.observe('periodic_scheduler_launch_latency_seconds', latency)
+        subsystem_metrics.set('periodic_scheduler_launch_latency_max_seconds', max(latencies, default=0.0))
+        subsystem_metrics.set('periodic_scheduler_jobs_spawned', len(latencies))
+        subsystem_metrics.pipe_execute()
+
+
+def update_schedules_computed_fields(schedules):
+    """
+    Recompute the next run of schedules in memory, save those that changed
+    with one bulk update, and update the computed fields of each of their
+    templates once
+    """
+    changed = [schedule for schedule in schedules if schedule.update_computed_fields_no_save()]
+    if not changed:
+        return
+    Schedule.objects.bulk_update(changed, ['next_run', 'dtstart', 'dtend'], batch_size=100)
+    templates = {}
+    for schedule in changed:
+        templates.setdefault(schedule.unified_job_template_id, schedule.unified_job_template)
+        emit_channel_notification('schedules-changed', dict(id=schedule.id, group_name='schedules'))
+    with ignore_inventory_computed_fields():
+        for template in templates.values():
+            template.update_computed_fields()
+
+
+def spawn_scheduled_job(schedule, invalid_license):
+    """Create and start the job of a due schedule, returns True if the job was started"""
+    template = schedule.unified_job_template
+    if template.cache_timeout_blocked:
+        logger.warning("Cache timeout is in the future, bypassing schedule for template %s" % str(template.id))
+        return False
+    try:
+        job_kwargs = schedule.get_job_kwargs()
+        new_unified_job = schedule.unified_job_template.create_unified_job(**job_kwargs)
+        logger.debug('Spawned {} from schedule {}-{}.'.format(new_unified_job.log_format, schedule.name, schedule.pk))
+
+        if invalid_license:
+            new_unified_job.status = 'failed'
+            new_unified_job.job_explanation = str(invalid_license)
+            new_unified_job.save(update_fields=['status', 'job_explanation'])
+            new_unified_job.websocket_emit_status("failed")
+            raise invalid_license
+        can_start = new_unified_job.signal_start()
+    except Exception:
+        logger.exception('Error spawning scheduled job.')
+        return False
+    if not can_start:
+        new_unified_job.status = 'failed'
+        new_unified_job.job_explanation = gettext_noop(
+            "Scheduled job could not start because it \
+            was not in the right state or required manual credentials"
+        )
+        new_unified_job.save(update_fields=['status', 'job_explanation'])
+        new_unified_job.websocket_emit_status("failed")
+    emit_channel_notification('schedules-changed', dict(id=schedule.id, group_name="schedules"))
+    return can_start
 
 
 @task(queue=get_task_queuename)
@@ -812,34 +888,67 @@ def update_inventory_computed_fields(inventory_id):
         logger.debug('Exiting duplicate update_inventory_computed_fields task.')
 
 
-def update_smart_memberships_for_inventory(smart_inventory):
-    current = set(SmartInventoryMembership.objects.filter(inventory=smart_inventory).values_list('host_id', flat=True))
-    new = set(smart_inventory.hosts.values_list('id', flat=True))
-    additions = new - current
-    removals = current - new
-    if additions or removals:
-        with transaction.atomic():
-            if removals:
-                SmartInventoryMembership.objects.filter(inventory=smart_inventory, host_id__in=removals).delete()
-            if additions:
-                add_for_inventory = [SmartInventoryMembership(inventory_id=smart_inventory.id, host_id=host_id) for host_id in additions]
-                SmartInventoryMembership.objects.bulk_create(add_for_inventory, ignore_conflicts=True)
-        logger.debug(
-            'Smart host membership cached for {}, {} additions, {} removals, {} total count.'.format(
-                smart_inventory.pk, len(additions), len(removals), len(new)
+def update_smart_memberships_for_inventory(smart_inventory, host_names=None):
+    """
+    Bring the cached host memberships of a smart inventory in line with its
+    host filter, with one DELETE and one INSERT ... SELECT in the database.
+    If host_names is given, only the memberships of the hosts with those
+    names are refreshed.
+    """
+    table = connection.ops.quote_name(SmartInventoryMembership._meta.db_table)
+    try:
+        matched_sql, matched_params = smart_inventory.hosts.values('id').query.sql_with_params()
+    except EmptyResultSet:
+        matched_sql, matched_params = 'SELECT NULL AS id WHERE 1 = 0', ()
+    restrict_sql, restrict_params = '', ()
+    if host_names is not None:
+        if not host_names:
+            return False
+        # a smart inventory matches one host per name, so a host change can move the membership to
+        # another host of the same name, every host of the name is refreshed
+        ids_sql, restrict_params = Host.objects.filter(name__in=list(host_names)).values('id').query.sql_with_params()
+        restrict_sql = f' AND {{column}} IN ({ids_sql})'
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} AS member WHERE member.inventory_id = %s'
+                + restrict_sql.format(column='member.host_id')
+                + f' AND NOT EXISTS (SELECT 1 FROM ({matched_sql}) matched WHERE matched.id = member.host_id)',
+                [smart_inventory.id, *restrict_params, *matched_params],
             )
-        )
+            removals = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} (inventory_id, host_id) SELECT %s, matched.id FROM ({matched_sql}) matched WHERE 1 = 1'
+                + restrict_sql.format(column='matched.id')
+                + ' ON CONFLICT DO NOTHING',
+                [smart_inventory.id, *matched_params, *restrict_params],
+            )
+            additions = cursor.rowcount
+    if additions or removals:
+        logger.debug('Smart host membership cached for {}, {} additions, {} removals.'.format(smart_inventory.pk, additions, removals))
         return True  # changed
     return False
 
 
 @task(queue=get_task_queuename)
-def update_host_smart_inventory_memberships():
+def update_host_smart_inventory_memberships(host_names=None, inventory_ids=None):
+    """
+    Refresh the cached host memberships of smart inventories, of all of them,
+    or only those in inventory_ids. If host_names is given, only the memberships
+    of the hosts with those names are refreshed, in the smart inventories that
+    could match them.
+    """
     smart_inventories = Inventory.objects.filter(kind='smart', host_filter__isnull=False, pending_deletion=False)
+    if inventory_ids is not None:
+        smart_inventories = smart_inventories.filter(pk__in=inventory_ids)
+    if host_names is not None:
+        # the host filter of a smart inventory with an organization only matches hosts in that organization
+        organizations = Inventory.objects.filter(hosts__name__in=host_names).values('organization_id')
+        smart_inventories = smart_inventories.filter(Q(organization__isnull=True) | Q(organization__in=organizations))
     changed_inventories = set([])
     for smart_inventory in smart_inventories:
         try:
-            changed = update_smart_memberships_for_inventory(smart_inventory)
+            changed = update_smart_memberships_for_inventory(smart_inventory, host_names=host_names)
             if changed:
                 changed_inventories.add(smart_inventory)
         except IntegrityError:
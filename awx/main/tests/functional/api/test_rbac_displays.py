@@ -3,10 +3,10 @@ import pytest
 from awx.api.versioning import reverse
 from django.test.client import RequestFactory
 
-from awx.main.models import Role, Group, UnifiedJobTemplate, JobTemplate, WorkflowJobTemplate
+from awx.main.models import Role, Group, Job, UnifiedJobTemplate, JobTemplate, WorkflowJobTemplate
 from awx.main.access import access_registry, WorkflowJobTemplateAccess
 from awx.main.utils import prefetch_page_capabilities
-from awx.api.serializers import JobTemplateSerializer, UnifiedJobTemplateSerializer
+from awx.api.serializers import JobListSerializer, JobTemplateSerializer, UnifiedJobTemplateSerializer
 
 # This file covers special-cases of displays of user_capabilities
 # general functionality should be covered fully by unit tests, see:
@@ -278,6 +278,28 @@ def test_prefetch_ujt_project_capabilities(alice, project, job_template, mocker)
     assert 'capability_map' not in list_serializer.child.context
 
 
+@pytest.mark.django_db
+def test_page_job_capabilities(job_template, organization, rando, django_assert_num_queries):
+    job_template.execute_role.members.add(rando)
+    jobs = [Job.objects.create(job_template=job_template, organization=organization) for i in range(3)]
+
+    class MockObj:
+        pass
+
+    view = MockObj()
+    view.request = MockObj()
+    view.request.user = rando
+    view.request.method = 'GET'
+    view.kwargs = {}
+
+    list_serializer = JobListSerializer(jobs, many=True, context={'view': view})
+    assert list_serializer.child._obj_capability_dict(jobs[0]) == {'start': True, 'delete': False}
+    # the rest of the page was computed along with the first job
+    with django_assert_num_queries(0):
+        for job in jobs[1:]:
+            assert list_serializer.child._obj_capability_dict(job) == {'start': True, 'delete': False}
+
+
 @pytest.mark.django_db
 def test_prefetch_group_capabilities(group, rando):
     group.inventory.adhoc_role.members.add(rando)
@@ -28,6 +28,13 @@ from awx.main.models import (
 )
 
 
+def _content(response):
+    # downloads are streamed
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
 def _mk_project_update(created=None):
     kwargs = {}
     if created:
@@ -89,14 +96,14 @@ def test_ansi_stdout_filtering(sqlite_copy, Parent, Child, relation, view, downl
     # ansi codes in ?format=txt should get filtered
     fmt = "?format={}".format("txt_download" if download else "txt")
     response = get(url + fmt, user=admin, expect=200)
-    assert smart_str(response.content).splitlines() == ['Testing %d' % i for i in range(3)]
+    assert smart_str(_content(response)).splitlines() == ['Testing %d' % i for i in range(3)]
     has_download_header = response.has_header('Content-Disposition')
     assert has_download_header if download else not has_download_header
 
     # ask for ansi and you'll get it
     fmt = "?format={}".format("ansi_download" if download else "ansi")
     response = get(url + fmt, user=admin, expect=200)
-    assert smart_str(response.content).splitlines() == ['\x1B[0;36mTesting %d\x1B[0m' % i for i in range(3)]
+    assert smart_str(_content(response)).splitlines() == ['\x1B[0;36mTesting %d\x1B[0m' % i for i in range(3)]
     has_download_header = response.has_header('Content-Disposition')
     assert has_download_header if download else not has_download_header
 
@@ -201,7 +208,7 @@ def test_max_bytes_display(sqlite_copy, Parent, Child, relation, view, fmt, get,
     )
 
     response = get(url + '?format={}_download'.format(fmt), user=admin, expect=200)
-    assert smart_str(response.content) == large_stdout
+    assert smart_str(_content(response)) == large_stdout
 
 
 @pytest.mark.django_db
@@ -218,7 +225,7 @@ def test_legacy_result_stdout_text_fallback(Cls, view, fmt, get, admin):
     url = reverse(view, kwargs={'pk': job.pk})
 
     response = get(url + '?format={}'.format(fmt), user=admin, expect=200)
-    assert smart_str(response.content) == 'LEGACY STDOUT!'
+    assert smart_str(_content(response)) == 'LEGACY STDOUT!'
 
 
 @pytest.mark.django_db
@@ -241,7 +248,7 @@ def test_legacy_result_stdout_with_max_bytes(Cls, view, fmt, get, admin):
     )
 
     response = get(url + '?format={}'.format(fmt + '_download'), user=admin, expect=200)
-    assert smart_str(response.content) == large_stdout
+    assert smart_str(_content(response)) == large_stdout
 
 
 @pytest.mark.django_db
@@ -263,7 +270,7 @@ def test_text_with_unicode_stdout(sqlite_copy, Parent, Child, relation, view, ge
     url = reverse(view, kwargs={'pk': job.pk}) + '?format=' + fmt
 
     response = get(url, user=admin, expect=200)
-    assert smart_str(response.content).splitlines() == ['オ%d' % i for i in range(3)]
+    assert smart_str(_content(response)).splitlines() == ['オ%d' % i for i in range(3)]
 
 
 @pytest.mark.django_db
@@ -3,13 +3,15 @@ import time
 from unittest import mock
 from uuid import uuid4
 
+from django.db import connection
 from django.test import TransactionTestCase
+from django.utils.timezone import now
 
 from awx.main.dispatch.worker.callback import job_stats_wrapup, CallbackBrokerWorker
 
 from awx.main.models.jobs import Job
 from awx.main.models.inventory import InventoryUpdate, InventorySource
-from awx.main.models.events import InventoryUpdateEvent
+from awx.main.models.events import InventoryUpdateEvent, JobEvent
 
 
 @pytest.mark.django_db
@@ -144,3 +146,105 @@ class TestCallbackBrokerWorker(TransactionTestCase):
 
             event = InventoryUpdateEvent.objects.get(uuid=events[0].uuid)
             assert "\x00" not in event.stdout
+
+    def test_copy_mode_isolates_bad_rows(self):
+        worker = self.get_worker()
+        worker.ingest_mode = 'copy'
+        kwargs = self.event_create_kwargs()
+        events = [InventoryUpdateEvent(uuid=str(uuid4()), stdout=f'line{i}', **kwargs) for i in range(8)]
+        events[5].stdout = 'bad'
+        copied = []
+
+        def fake_copy_rows(cls, batch):
+            if any(e.stdout == 'bad' for e in batch):
+                raise ValueError('bad row')
+            copied.extend(batch)
+
+        worker.buff = {InventoryUpdateEvent: events.copy()}
+        with mock.patch.object(worker, 'copy_rows', side_effect=fake_copy_rows) as copy_mock:
+            with mock.patch.object(worker, 'bulk_create_events', return_value=([], 0, 0, 1)) as bulk_create_mock:
+                worker.flush(force=True)
+        assert copied == events[:5] + events[6:]
+        # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1, only the halves containing the bad row are retried
+        assert copy_mock.call_count == 7
+        # the bad row is left to bulk_create, which keeps it for another try
+        bulk_create_mock.assert_called_once_with(InventoryUpdateEvent, [events[5]])
+        assert worker.buff == {InventoryUpdateEvent: [events[5]]}
+
+    def test_perform_work_with_batch(self):
+        worker = self.get_worker()
+        inventory_update_id = self.event_create_kwargs()['inventory_update'].id
+        messages = [dict(inventory_update_id=inventory_update_id, uuid=str(uuid4()), stdout=f'line{i}', counter=i) for i in range(3)]
+        with mock.patch.object(worker, 'flush') as flush_mock:
+            worker.perform_work({'event': 'BATCH', 'messages': messages})
+        flush_mock.assert_called_once_with(force=False)
+        assert [e.uuid for e in worker.buff[InventoryUpdateEvent]] == [m['uuid'] for m in messages]
+
+    def test_perform_work_with_bad_message_in_batch(self):
+        worker = self.get_worker()
+        inventory_update_id = self.event_create_kwargs()['inventory_update'].id
+        messages = [dict(inventory_update_id=inventory_update_id, uuid=str(uuid4()), stdout=f'line{i}', counter=i) for i in range(2)]
+        messages.insert(1, dict(inventory_update_id=inventory_update_id, uuid=str(uuid4()), created=12345))
+        in_memory = worker.subsystem_metrics.get('callback_receiver_events_in_memory')
+        with mock.patch.object(worker, 'flush'):
+            worker.perform_work({'event': 'BATCH', 'messages': messages})
+        assert [e.uuid for e in worker.buff[InventoryUpdateEvent]] == [messages[0]['uuid'], messages[2]['uuid']]
+        # the message that could not be buffered is no longer counted as in memory
+        assert worker.subsystem_metrics.get('callback_receiver_events_in_memory') == in_memory - 1
+
+    def create_job_events(self, stdouts):
+        job = Job.objects.create()
+        return [
+            JobEvent.create_from_data(
+                job_id=job.id,
+                uuid=str(uuid4()),
+                counter=i,
+                created=now().isoformat(),
+                event='runner_on_ok',
+                stdout=stdout,
+                event_data={'res': {'msg': stdout, 'rc': [None, 1.5, True]}},
+            )
+            for i, stdout in enumerate(stdouts)
+        ]
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY is only used with PostgreSQL')
+    def test_copy_mode_round_trip(self):
+        worker = self.get_worker()
+        worker.ingest_mode = 'copy'
+        events = self.create_job_events(['tab\there', 'new\nline\r\n', 'back\\slash \\N \\.', 'quotes \' " and unicode ✓', ''])
+        worker.buff = {JobEvent: events.copy()}
+        with mock.patch.object(worker, 'bulk_create_events') as bulk_create_mock:
+            worker.flush(force=True)
+        bulk_create_mock.assert_not_called()
+        assert worker.buff == {JobEvent: []}
+        saved = {e.pk: e for e in JobEvent.objects.filter(job_id=events[0].job_id)}
+        assert sorted(saved) == sorted(e.pk for e in events)
+        for e in events:
+            row = saved[e.pk]
+            assert (row.uuid, row.counter, row.stdout, row.event_data) == (e.uuid, e.counter, e.stdout, e.event_data)
+            # NULL columns
+            assert (row.host_id, row.job_created) == (None, None)
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY is only used with PostgreSQL')
+    def test_copy_mode_falls_back_to_bulk_create(self):
+        worker = self.get_worker()
+        worker.ingest_mode = 'copy'
+        events = self.create_job_events([f'line{i}' for i in range(4)])
+        worker.buff = {JobEvent: events.copy()}
+        with mock.patch.object(worker, 'copy_rows', side_effect=RuntimeError('COPY failed')):
+            worker.flush(force=True)
+        assert worker.buff == {JobEvent: []}
+        assert sorted(JobEvent.objects.filter(job_id=events[0].job_id).values_list('uuid', flat=True)) == sorted(e.uuid for e in events)
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY is only used with PostgreSQL')
+    def test_copy_mode_invalid_NUL_char(self):
+        worker = self.get_worker()
+        worker.ingest_mode = 'copy'
+        events = self.create_job_events(['good1', 'NUL \x00 char', 'good2'])
+        worker.buff = {JobEvent: events.copy()}
+        worker.flush(force=True)
+        # PostgreSQL rejects the row, neither COPY nor bulk_create can save it before it is sanitized
+        assert worker.buff == {JobEvent: [events[1]]}
+        worker.flush(force=True)
+        assert worker.buff == {JobEvent: []}
+        assert list(JobEvent.objects.filter(job_id=events[0].job_id).order_by('counter').values_list('stdout', flat=True)) == ['good1', 'NUL  char', 'good2']
@@ -0,0 +1,87 @@
+import datetime
+import logging
+
+import pytest
+from django.utils.timezone import now
+
+from awx.main.management.commands.cleanup_jobs import ChunkedDeleteMeta, Command, JobPurgePlan
+from awx.main.models import Job, JobHostSummary, Label, Project, ProjectUpdate, UnifiedJob, WorkflowJob, WorkflowJobNode
+
+
+@pytest.fixture
+def cutoff():
+    return now() - datetime.timedelta(days=30)
+
+
+def old_job(created, **kwargs):
+    job = Job(created=created, **kwargs)
+    job.save()
+    return job
+
+
+@pytest.mark.django_db
+def test_chunked_delete(inventory, organization, cutoff):
+    host = inventory.hosts.create(name='foo')
+    label = Label.objects.create(name='foo', organization=organization)
+    old = now() - datetime.timedelta(days=60)
+    jobs = [old_job(old, status='successful', inventory=inventory) for i in range(5)]
+    running = old_job(old, status='running', inventory=inventory)
+    recent = old_job(now(), status='successful', inventory=inventory)
+    for job in jobs:
+        job.labels.add(label)
+        summary = JobHostSummary.objects.create(job=job, host=host, host_name=host.name)
+    host.last_job = jobs[-1]
+    host.last_job_host_summary = summary
+    host.save()
+    workflow_job = WorkflowJob.objects.create(status='running')
+    node = WorkflowJobNode.objects.create(workflow_job=workflow_job, job=jobs[0])
+
+    qs = Job.objects.filter(created__lt=cutoff).exclude(status__in=['pending', 'waiting', 'running'])
+    delete_meta = ChunkedDeleteMeta(logging.getLogger('awx'), Job, cutoff, False, qs, chunk_size=2)
+    delete_meta.find_jobs_to_delete()
+    assert (delete_meta.jobs_to_delete_count, delete_meta.jobs_no_delete_count) == (5, 2)
+    delete_meta.delete_jobs()
+
+    assert delete_meta.jobs_deleted == 5
+    assert set(UnifiedJob.objects.values_list('pk', flat=True)) == {running.pk, recent.pk, workflow_job.pk}
+    assert set(Job.objects.values_list('pk', flat=True)) == {running.pk, recent.pk}
+    assert JobHostSummary.objects.count() == 0
+    assert Label.objects.filter(pk=label.pk).exists()
+    assert label.unifiedjob_labels.count() == 0
+    host.refresh_from_db()
+    assert host.last_job is None and host.last_job_host_summary is None
+    node.refresh_from_db()
+    assert node.job is None
+
+
+@pytest.mark.django_db
+def test_chunked_dry_run(inventory, cutoff):
+    old_job(now() - datetime.timedelta(days=60), status='successful', inventory=inventory)
+    qs = Job.objects.filter(created__lt=cutoff)
+    delete_meta = ChunkedDeleteMeta(logging.getLogger('awx'), Job, cutoff, True, qs)
+    delete_meta.find_jobs_to_delete()
+    delete_meta.delete_jobs()
+    assert delete_meta.jobs_to_delete_count == 1
+    assert Job.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_purge_plan_cascades_workflow_nodes():
+    statements = JobPurgePlan(WorkflowJob).statements
+    nodes = [i for i, statement in enumerate(statements) if statement.startswith('DELETE FROM "main_workflowjobnode" ')]
+    node_labels = [i for i, statement in enumerate(statements) if statement.startswith('DELETE FROM "main_workflowjobnode_labels" ')]
+    assert len(nodes) == 1 and len(node_labels) == 1
+    # rows are deleted before those they are selected through
+    assert node_labels[0] < nodes[0] < statements.index('DELETE FROM "main_unifiedjob" WHERE "id" IN ({ids})')
+
+
+@pytest.mark.django_db
+def test_purge_candidates_keep_last_project_update(project, cutoff):
+    old = now() - datetime.timedelta(days=60)
+    updates = [ProjectUpdate(project=project, status='successful', created=old) for i in range(3)]
+    for update in updates:
+        update.save()
+    Project.objects.filter(pk=project.pk).update(last_job=updates[-1])
+    command = Command()
+    command.cutoff = cutoff
+    assert set(command.purge_candidates(ProjectUpdate).values_list('pk', flat=True)) == {updates[0].pk, updates[1].pk}
@@ -2,6 +2,7 @@
 # All Rights Reserved
 
 # Python
+import copy
 import pytest
 from unittest import mock
 import os
@@ -9,6 +10,7 @@ import yaml
 
 # Django
 from django.core.management.base import CommandError
+from django.db import connection
 
 # for license errors
 from rest_framework.exceptions import PermissionDenied
@@ -157,6 +159,64 @@ class TestMigrationCases:
                 assert host.instance_id == ('fooval' if id_var else '')
 
 
+def snapshot_inventory(inventory):
+    hosts = {
+        host.name: (host.instance_id, host.enabled, host.variables_dict, host.description, sorted(host.groups.values_list('name', flat=True)))
+        for host in inventory.hosts.all()
+    }
+    groups = {group.name: (group.variables_dict, group.description, sorted(group.children.values_list('name', flat=True))) for group in inventory.groups.all()}
+    source = inventory.inventory_sources.get()
+    return hosts, groups, sorted(source.hosts.values_list('name', flat=True)), sorted(source.groups.values_list('name', flat=True))
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='the bulk mode only runs on PostgreSQL, elsewhere both modes use the ORM')
+@pytest.mark.parametrize('overwrite', [True, False])
+@mock.patch.object(inventory_import.Command, 'set_logging_level', mock_logging)
+def test_import_modes_agree(organization, overwrite):
+    syncs = [
+        {
+            '_meta': {
+                'hostvars': {
+                    'host-1': {'foo': {'id': 'id-1'}, 'a': 1},
+                    'host-2': {'foo': {'id': 'id-2'}, '_awx_description': 'second'},
+                    'host-3': {'a': 3},
+                    'host-4': {},
+                }
+            },
+            'all': {'children': ['g1', 'g3'], 'vars': {'inv': 'var'}},
+            'g1': {'children': ['g2'], 'vars': {'g': 1}},
+            'g2': {'hosts': ['host-1', 'host-2']},
+            'g3': {'hosts': ['host-3', 'host-4']},
+        },
+        {
+            '_meta': {
+                'hostvars': {
+                    'host-1-renamed': {'foo': {'id': 'id-1'}, 'b': 1},
+                    'host-3': {'a': 4},
+                    'host-4': {},
+                    'host-5': {'_awx_description': 'fifth'},
+                }
+            },
+            'all': {'children': ['g1', 'g2', 'g4']},
+            'g1': {'vars': {'h': 2}},
+            'g2': {'hosts': ['host-1-renamed', 'host-4']},
+            'g4': {'hosts': ['host-3', 'host-5'], 'children': ['g2']},
+        },
+    ]
+
+    def sync(import_mode):
+        inventory = Inventory.objects.create(name=import_mode, organization=organization)
+        inv_src = InventorySource.objects.create(inventory=inventory, source='gce')
+        options = dict(overwrite=overwrite, instance_id_var='foo.id', import_mode=import_mode)
+        for data in syncs:
+            inventory_import.Command().perform_update(options.copy(), copy.deepcopy(data), inv_src.create_unified_job())
+        inventory.refresh_from_db()
+        return snapshot_inventory(inventory), (inventory.total_hosts, inventory.total_groups), inventory.variables_dict
+
+    assert sync('orm') == sync('bulk')
+
+
 @pytest.mark.django_db
 @pytest.mark.inventory_import
 @mock.patch.object(inventory_import.Command, 'check_license', mock.MagicMock())
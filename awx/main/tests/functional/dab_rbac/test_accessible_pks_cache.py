@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from awx.main.access import InventoryAccess
+from awx.main.models import Inventory, JobTemplate, RbacRevision, UnifiedJobTemplate
+from awx.main.utils.rbac_cache import RevisionBump, get_rbac_revision
+
+
+@pytest.fixture
+def accessible_pks_cache(settings):
+    settings.RBAC_ACCESSIBLE_IDS_CACHE_ENABLED = True
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_cached_until_role_change(accessible_pks_cache, organization, rando, django_assert_num_queries, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        inv1 = Inventory.objects.create(name='inv1', organization=organization)
+        inv2 = Inventory.objects.create(name='inv2', organization=organization)
+        inv1.read_role.members.add(rando)
+
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv1.pk]
+    # only the revision is read
+    with django_assert_num_queries(1):
+        assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv1.pk]
+    # the first access check creates the system auditor role definition, which bumps the revision
+    with django_capture_on_commit_callbacks(execute=True):
+        assert list(InventoryAccess(rando).get_queryset()) == [inv1]
+
+    revision = get_rbac_revision()
+    with django_capture_on_commit_callbacks(execute=True):
+        inv2.admin_role.members.add(rando)
+        # the transaction of the change does not read what was cached before it
+        assert Inventory.objects.filter(pk__in=Inventory.accessible_pk_qs(rando, 'read_role')).count() == 2
+        assert get_rbac_revision() == revision
+    assert get_rbac_revision() != revision
+    assert sorted(Inventory.accessible_pk_qs(rando, 'read_role')) == [inv1.pk, inv2.pk]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        inv1.read_role.members.remove(rando)
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv2.pk]
+
+
+@pytest.mark.django_db
+def test_revision_kept_in_the_database(accessible_pks_cache, organization, rando, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        inv = Inventory.objects.create(name='inv', organization=organization)
+        inv.read_role.members.add(rando)
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv.pk]
+
+    # nothing but the revision in the database tells this node about a change made on another one
+    with mock.patch.object(RbacRevision, 'bump'):
+        with django_capture_on_commit_callbacks(execute=True):
+            inv.read_role.members.remove(rando)
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv.pk]
+    RbacRevision.bump()
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == []
+
+
+@pytest.mark.django_db
+def test_bumped_once_per_transaction(accessible_pks_cache, organization, rando, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        with CaptureQueriesContext(connection) as ctx:
+            inv = Inventory.objects.create(name='inv', organization=organization)
+            inv.read_role.members.add(rando)
+            inv.admin_role.members.add(rando)
+    assert not any('rbacrevision' in q['sql'] for q in ctx.captured_queries)
+    assert len([c for c in callbacks if isinstance(c, RevisionBump)]) == 1
+
+
+@pytest.mark.django_db
+def test_bumped_only_on_changes(accessible_pks_cache, settings, organization, project, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        project.description = 'new description'
+        project.save()
+    assert not [c for c in callbacks if isinstance(c, RevisionBump)]
+
+    settings.RBAC_ACCESSIBLE_IDS_CACHE_ENABLED = False
+    with django_capture_on_commit_callbacks() as callbacks:
+        with CaptureQueriesContext(connection) as ctx:
+            Inventory.objects.create(name='inv', organization=organization)
+    assert not any('rbacrevision' in q['sql'] for q in ctx.captured_queries)
+    assert not [c for c in callbacks if isinstance(c, RevisionBump)]
+
+
+@pytest.mark.django_db
+def test_cached_until_organization_change(accessible_pks_cache, organization, rando, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        organization.admin_role.members.add(rando)
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == []
+    with django_capture_on_commit_callbacks(execute=True):
+        inv = Inventory.objects.create(name='inv', organization=organization)
+    assert Inventory.accessible_pk_qs(rando, 'read_role') == [inv.pk]
+    with django_capture_on_commit_callbacks(execute=True):
+        jt = JobTemplate.objects.create(name='jt', organization=organization)
+    assert UnifiedJobTemplate.accessible_pk_qs(rando, 'read_role') == [jt.pk]
+
+
+@pytest.mark.django_db
+def test_too_many_to_cache(accessible_pks_cache, settings, organization, rando):
+    settings.RBAC_ACCESSIBLE_IDS_CACHE_MAX_IDS = 1
+    for name in ('inv1', 'inv2'):
+        Inventory.objects.create(name=name, organization=organization).read_role.members.add(rando)
+    qs = Inventory.accessible_pk_qs(rando, 'read_role')
+    assert not isinstance(qs, list)
+    assert Inventory.objects.filter(pk__in=qs).count() == 2
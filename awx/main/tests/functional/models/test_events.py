@@ -3,7 +3,9 @@ import pytest
 
 from django.utils.timezone import now
 
+from django.db import connection
 from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 
 from awx.main.models import Job, JobEvent, Inventory, Host, JobHostSummary, HostMetric
 
@@ -167,6 +169,28 @@ class TestEvents:
         assert len(HostMetric.objects.filter(Q(deleted=False) & Q(deleted_counter=0) & Q(last_deleted__isnull=True))) == 6
         assert len(HostMetric.objects.filter(Q(deleted=False) & Q(deleted_counter=1) & Q(last_deleted__isnull=False))) == 6
 
+    def test_incremental_failed_hosts(self, settings):
+        settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL = True
+        self._generate_hosts(6)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._create_job_event(ok={h: 1 for h in self.hostnames[:3]}, failures={h: 1 for h in self.hostnames[3:]})
+        if connection.vendor == 'postgresql':
+            assert any('FOR UPDATE' in q['sql'] for q in ctx.captured_queries)
+        self.inventory.refresh_from_db()
+        assert self.inventory.hosts_with_active_failures == 3
+
+        for ok, failures in ((self.hostnames[3:5], self.hostnames[:2]), (self.hostnames, [])):
+            self.job = Job(inventory=self.inventory)
+            self.job.save()
+            self._create_job_event(ok={h: 1 for h in ok}, failures={h: 1 for h in failures})
+            self.inventory.refresh_from_db()
+            incremental = self.inventory.hosts_with_active_failures
+            self.inventory.update_computed_fields()
+            assert incremental == self.inventory.hosts_with_active_failures
+
+        assert self.inventory.hosts_with_active_failures == 0
+
     def _generate_hosts(self, cnt, id_from=0):
         self.hostnames = [f'Host {i}' for i in range(id_from, id_from + cnt)]
         self.inventory = Inventory()
@@ -1,11 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import json
+
 import pytest
 from unittest import mock
 
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+
 # AWX
-from awx.main.models import Host, Inventory, InventorySource, InventoryUpdate, CredentialType, Credential, Job
+from awx.main.models import Host, Inventory, InventoryScriptRevision, InventorySource, InventoryUpdate, CredentialType, Credential, Job
 from awx.main.constants import CLOUD_PROVIDERS
+from awx.main.tasks.jobs import RunJob
+from awx.main.tasks.system import update_inventory_computed_fields
+from awx.main.utils import ignore_inventory_computed_fields
 from awx.main.utils.filters import SmartFilter
 
 
@@ -89,6 +98,108 @@ class TestInventoryScript:
             data.pop('all')
             assert data == expected_data
 
+    def test_sliced_hosts_queryset(self, inventory):
+        for i in range(7):
+            inventory.hosts.create(name='host{}'.format(i), enabled=i % 2 == 0)
+        host_queryset = inventory.hosts.order_by('name')
+        names = list(host_queryset.values_list('name', flat=True))
+        for i in range(3):
+            sliced = inventory.get_sliced_hosts(host_queryset, i + 1, 3)
+            assert isinstance(sliced, QuerySet)
+            assert list(sliced.values_list('name', flat=True)) == names[i::3]
+            # filtering the slice does not renumber the hosts
+            assert list(sliced.filter(enabled=True).values_list('name', flat=True)) == [name for name in names[i::3] if int(name[-1]) % 2 == 0]
+
+    @pytest.mark.parametrize('script_params', [{}, {'hostvars': True, 'towervars': True}, {'hostvars': True, 'slice_number': 2, 'slice_count': 3}])
+    def test_stream_script_data(self, inventory, script_params):
+        inventory.variables = '{"inv": 1}'
+        inventory.save()
+        hosts = [inventory.hosts.create(name='host{}'.format(i), variables={'i': i}, enabled=i != 4) for i in range(6)]
+        g1 = inventory.groups.create(name='g1', variables={'v1': 'v1'})
+        g2 = inventory.groups.create(name='g2')
+        inventory.groups.create(name='empty')
+        g1.children.add(g2)
+        g1.hosts.add(*hosts[:3])
+        g2.hosts.add(*hosts[2:5])
+        host_map = {}
+        data = json.loads(''.join(inventory.stream_script_data(host_map=host_map, **script_params)))
+        assert data == inventory.get_script_data(**script_params)
+        assert host_map == {name: hostvars.get('remote_tower_id', '') for name, hostvars in data.get('_meta', {}).get('hostvars', {}).items()}
+
+    def test_stream_script_data_all_group(self, inventory):
+        inventory.groups.create(name='all', variables={'a1': 'a1'})
+        assert json.loads(''.join(inventory.stream_script_data())) == inventory.get_script_data()
+
+    def test_cached_script_data(self, inventory, settings, tmp_path, django_capture_on_commit_callbacks):
+        settings.INVENTORY_SCRIPT_CACHE_ENABLED = True
+        settings.INVENTORY_SCRIPT_CACHE_ROOT = str(tmp_path)
+        with django_capture_on_commit_callbacks(execute=True):
+            host = inventory.hosts.create(name='ahost')
+            group = inventory.groups.create(name='agroup')
+        assert inventory.get_cached_script_data(hostvars=True) == inventory.get_script_data(hostvars=True)
+
+        # memberships change no host or group row, but are kept in the revision stored in the database
+        revision = InventoryScriptRevision.get(inventory.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            group.hosts.add(host)
+            # bumped once the change is committed
+            assert InventoryScriptRevision.get(inventory.pk) == revision
+        assert InventoryScriptRevision.get(inventory.pk) == revision + 1
+        data = inventory.get_cached_script_data(hostvars=True)
+        assert data['agroup']['hosts'] == ['ahost']
+        with mock.patch.object(Inventory, 'get_script_data') as get_script_data:
+            assert inventory.get_cached_script_data(hostvars=True) == data
+        get_script_data.assert_not_called()
+
+    def test_script_revision_bumped_once_per_transaction(self, inventory, settings, django_capture_on_commit_callbacks):
+        settings.INVENTORY_SCRIPT_CACHE_ENABLED = True
+        with django_capture_on_commit_callbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                group = inventory.groups.create(name='agroup')
+                for i in range(3):
+                    group.hosts.add(inventory.hosts.create(name=f'host{i}'))
+            assert not any('inventoryscriptrevision' in q['sql'] for q in ctx.captured_queries)
+        assert InventoryScriptRevision.get(inventory.pk) == 1
+
+        settings.INVENTORY_SCRIPT_CACHE_ENABLED = False
+        with django_capture_on_commit_callbacks(execute=True):
+            inventory.hosts.create(name='another')
+        assert InventoryScriptRevision.get(inventory.pk) == 1
+
+
+@pytest.mark.django_db
+class TestComputedFields:
+    def test_update_computed_fields(self, inventory):
+        with ignore_inventory_computed_fields():
+            inventory.hosts.create(name='host1')
+            inventory.hosts.create(name='host2')
+            inventory.groups.create(name='group1')
+        inventory.update_computed_fields()
+        assert (inventory.total_hosts, inventory.total_groups, inventory.has_active_failures, inventory.has_inventory_sources) == (2, 1, False, False)
+        inventory.refresh_from_db()
+        assert (inventory.total_hosts, inventory.total_groups, inventory.has_active_failures, inventory.has_inventory_sources) == (2, 1, False, False)
+
+    def test_adjust_computed_fields(self, inventory):
+        inventory.adjust_computed_fields(hosts=3, failed_hosts=2, groups=1)
+        assert (inventory.total_hosts, inventory.hosts_with_active_failures, inventory.has_active_failures, inventory.total_groups) == (3, 2, True, 1)
+        inventory.adjust_computed_fields(failed_hosts=-2)
+        inventory.refresh_from_db()
+        assert (inventory.total_hosts, inventory.hosts_with_active_failures, inventory.has_active_failures, inventory.total_groups) == (3, 0, False, 1)
+
+    def test_drift_corrected_by_recount(self, inventory, settings, mocker, tmp_path):
+        settings.INVENTORY_COMPUTED_FIELDS_INCREMENTAL = True
+        settings.INVENTORY_COMPUTED_FIELDS_RECOUNT_INTERVAL = 3
+        # the failed host was deleted without adjusting the count
+        inventory.adjust_computed_fields(failed_hosts=1)
+        job = Job.objects.create(inventory=inventory)
+        mocker.patch('awx.main.tasks.jobs.update_inventory_computed_fields.delay', side_effect=update_inventory_computed_fields)
+        task = RunJob()
+        task.instance = job
+        for runs in (1, 2, 3):
+            task.final_run_hook(job, 'successful', str(tmp_path))
+            inventory.refresh_from_db()
+            assert (inventory.hosts_with_active_failures, inventory.has_active_failures) == ((1, True) if runs < 3 else (0, False))
+
 
 @pytest.mark.django_db
 class TestActiveCount:
@@ -8,6 +8,8 @@ import pytest
 import pytz
 
 from awx.main.models import JobTemplate, Schedule, ActivityStream
+from awx.main.models.schedules import RRuleOccurrences, rrule_cache
+from awx.main.tasks.system import update_schedules_computed_fields
 
 from crum import impersonate
 
@@ -120,6 +122,22 @@ class TestComputedFields:
         job_template.refresh_from_db()
         assert job_template.next_schedule == expected_schedule
 
+    def test_computed_fields_batch(self, job_template):
+        schedules = [
+            Schedule.objects.create(name='schedule {}'.format(i), rrule=self.continuing_rrule, unified_job_template=job_template, enabled=True)
+            for i in range(3)
+        ]
+        old_next_run = datetime(2009, 3, 13, tzinfo=pytz.utc)
+        Schedule.objects.filter(pk__in=[s.pk for s in schedules[:2]]).update(next_run=old_next_run)
+        with self.assert_no_unwanted_stuff(schedules[0]):
+            with mock.patch('awx.main.tasks.system.emit_channel_notification') as emit:
+                update_schedules_computed_fields(Schedule.objects.filter(pk__in=[s.pk for s in schedules]))
+        # only the schedules that changed are saved and announced
+        assert emit.call_count == 2
+        for s in schedules:
+            s.refresh_from_db()
+            assert s.next_run == schedules[2].next_run != old_next_run
+
 
 @pytest.mark.django_db
 @pytest.mark.parametrize('freq, delta', (('MINUTELY', 1), ('HOURLY', 1)))
@@ -553,3 +571,39 @@ def test_skip_sundays():
 def test_get_end_date(rrule, expected_result):
     ruleset = Schedule.rrulestr(rrule)
     assert expected_result == Schedule.get_end_date(ruleset)
+
+
+@pytest.mark.django_db
+def test_rrule_cache(job_template, settings):
+    settings.SCHEDULE_RRULE_CACHE_SIZE = 2
+    rrule_cache.clear()
+    rrule = 'DTSTART;TZID=America/New_York:20300101T090000 RRULE:FREQ=DAILY;INTERVAL=1 EXDATE;TZID=America/New_York:20300105T090000'
+    s = Schedule.objects.create(name='Some Schedule', rrule=rrule, unified_job_template=job_template)
+    assert Schedule.rrulestr(rrule) is Schedule.rrulestr(rrule)
+    assert s.next_run == datetime(2030, 1, 1, 14, tzinfo=pytz.utc)
+
+    # least recently used rrules are dropped
+    Schedule.rrulestr('DTSTART:20300101T000000Z RRULE:FREQ=DAILY;INTERVAL=1')
+    Schedule.rrulestr(rrule)
+    Schedule.rrulestr('DTSTART:20300101T000000Z RRULE:FREQ=WEEKLY;INTERVAL=1')
+    assert list(rrule_cache.entries) == [rrule, 'DTSTART:20300101T000000Z RRULE:FREQ=WEEKLY;INTERVAL=1']
+
+
+@pytest.mark.parametrize(
+    'rrule',
+    [
+        'DTSTART;TZID=America/New_York:20300101T090000 RRULE:FREQ=DAILY;INTERVAL=1 EXDATE;TZID=America/New_York:20300105T090000',
+        'DTSTART;TZID=America/New_York:20300101T090000 RRULE:FREQ=DAILY;INTERVAL=2;COUNT=7',
+    ],
+)
+def test_rrule_occurrences_window(rrule):
+    ruleset = Schedule.parse_rrule(rrule)
+    occurrences = RRuleOccurrences(ruleset, window_size=3)
+    dt = datetime(2029, 12, 31, tzinfo=pytz.utc)
+    for i in range(30):
+        assert occurrences.after(dt) == ruleset.after(dt)
+        assert occurrences.xafter(dt, 2) == list(ruleset.xafter(dt, count=2))
+        assert occurrences.xafter(dt, 5) == list(ruleset.xafter(dt, count=5))
+        dt += timedelta(hours=13)
+    assert occurrences.first() == ruleset[0]
+    assert occurrences.end_date() == Schedule.get_end_date(ruleset)
@@ -8,7 +8,18 @@ from crum import impersonate
 from django.contrib.contenttypes.models import ContentType
 
 # AWX
-from awx.main.models import UnifiedJobTemplate, Job, JobTemplate, WorkflowJobTemplate, WorkflowApprovalTemplate, Project, WorkflowJob, Schedule, Credential
+from awx.main.models import (
+    UnifiedJobTemplate,
+    Inventory,
+    Job,
+    JobTemplate,
+    WorkflowJobTemplate,
+    WorkflowApprovalTemplate,
+    Project,
+    WorkflowJob,
+    Schedule,
+    Credential,
+)
 from awx.api.versioning import reverse
 from awx.main.constants import JOB_VARIABLE_PREFIXES
 
@@ -282,3 +293,22 @@ class TestTaskImpact:
         # recalculate task_impact
         jobs[0].task_impact = jobs[0]._get_task_impact()
         assert [job.task_impact for job in jobs] == [3, 2, 2]
+
+    def test_pending_task_impact(self, slice_job_factory):
+        workflow_job = slice_job_factory(3, jt_kwargs={'forks': 50}, spawn=True)
+        jobs = sorted((node.job for node in workflow_job.workflow_nodes.all()), key=lambda job: job.job_slice_number)
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(status='pending', task_impact=0)
+        inventory = jobs[0].inventory
+        inventory.hosts.create(name='remainder_foo')
+        Inventory.objects.filter(pk=inventory.pk).update(total_hosts=0)
+        inventory.refresh_from_db()
+        inventory.update_computed_fields()
+        for job in jobs:
+            job.refresh_from_db()
+        assert [job.task_impact for job in jobs] == [3, 2, 2]
+        assert [job.task_impact for job in jobs] == [job._get_task_impact() for job in jobs]
+        # the same update follows incremental changes to the number of hosts
+        inventory.adjust_computed_fields(hosts=3)
+        for job in jobs:
+            job.refresh_from_db()
+        assert [job.task_impact for job in jobs] == [4, 3, 3]
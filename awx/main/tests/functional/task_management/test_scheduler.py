@@ -4,6 +4,7 @@ import json
 from datetime import timedelta
 
 from awx.main.scheduler import TaskManager, DependencyManager, WorkflowManager
+from awx.main.scheduler.task_cache import ActiveTaskCache
 from awx.main.utils import encrypt_field
 from awx.main.models import WorkflowJobTemplate, JobTemplate, Job
 from awx.main.models.ha import Instance
@@ -212,6 +213,53 @@ def test_single_jt_multi_job_launch_blocks_last(job_template_factory):
     assert j2.status == "waiting"
 
 
+@pytest.mark.django_db
+def test_incremental_task_manager_only_loads_changed_tasks(job_template_factory, settings, mocker):
+    settings.TASK_MANAGER_INCREMENTAL = True
+    cache = ActiveTaskCache()
+    mocker.patch('awx.main.scheduler.task_manager.active_task_cache', cache)
+    objects = job_template_factory('jt', organization='org1', project='proj', inventory='inv', credential='cred')
+    j1 = create_job(objects.job_template)
+    j2 = create_job(objects.job_template)
+
+    TaskManager().schedule()
+    j1.refresh_from_db()
+    assert j1.status == "waiting"
+    # the test transaction never commits, so mark the cache as usable by hand
+    cache.mark_consistent()
+
+    j1.status = "successful"
+    j1.save()
+    load = mocker.spy(cache, 'load')
+    TaskManager().schedule()
+
+    # j1 is dropped from the cache, and j2 is started without being loaded again
+    assert load.call_args[0][1] == []
+    assert list(cache.tasks) == [j2.pk]
+    j2.refresh_from_db()
+    assert j2.status == "waiting"
+
+
+@pytest.mark.django_db
+def test_incremental_task_manager_refetches_related_objects(job_template_factory, django_assert_num_queries):
+    objects = job_template_factory('jt', organization='org1', project='proj', inventory='inv', credential='cred')
+    jobs = [create_job(objects.job_template) for _ in range(3)]
+    cache = ActiveTaskCache()
+    qs = Job.objects.filter(status='pending')
+    for task in cache.refresh(qs):
+        assert (task.unified_job_template.name, task.inventory.name) == ('jt', 'inv')
+    cache.mark_consistent()
+
+    # the template changes, the job rows do not
+    JobTemplate.objects.filter(pk=objects.job_template.pk).update(name='renamed')
+    # the snapshot, the inventories, and the templates, which are polymorphic and take two, however many tasks there are
+    with django_assert_num_queries(4):
+        tasks = cache.refresh(qs)
+    with django_assert_num_queries(0):
+        assert [(task.unified_job_template.name, task.inventory.name) for task in tasks] == [('renamed', 'inv')] * 3
+    assert tasks == [cache.tasks[job.pk] for job in jobs]
+
+
 @pytest.mark.django_db
 def test_single_jt_multi_job_launch_allow_simul_allowed(job_template_factory):
     objects = job_template_factory('jt', organization='org1', project='proj', inventory='inv', credential='cred')
@@ -19,7 +19,7 @@ from awx.main.models import (
     ExecutionEnvironment,
 )
 from awx.main.tasks.system import cluster_node_heartbeat
-from awx.main.tasks.facts import update_hosts
+from awx.main.tasks.facts import touch_hosts, update_hosts
 
 from django.db import OperationalError
 from django.test.utils import override_settings
@@ -160,6 +160,18 @@ class TestAnsibleFactsSave:
             host.refresh_from_db()
             assert host.ansible_facts == {'foo': 'bar'}
 
+    def test_touch_hosts_resolved_deadlock(self, inventory, mocker):
+        hosts = [Host.objects.create(inventory=inventory, name=f'foo{i}') for i in range(3)]
+        raw_touch_hosts = mocker.patch('awx.main.tasks.facts.raw_touch_hosts', side_effect=[OperationalError('deadlock detected')] * 2 + [None])
+        touch_hosts(hosts)
+        assert raw_touch_hosts.call_count == 3
+
+    def test_touch_hosts_forever_deadlock(self, inventory, mocker):
+        hosts = [Host.objects.create(inventory=inventory, name=f'foo{i}') for i in range(3)]
+        mocker.patch('awx.main.tasks.facts.raw_touch_hosts', side_effect=OperationalError('deadlock detected'))
+        with pytest.raises(OperationalError):
+            touch_hosts(hosts)
+
 
 @pytest.mark.django_db
 class TestLaunchConfig:
@@ -2,7 +2,7 @@ import pytest
 
 from rest_framework.exceptions import PermissionDenied
 
-from awx.main.access import JobAccess, JobLaunchConfigAccess, AdHocCommandAccess, InventoryUpdateAccess, ProjectUpdateAccess
+from awx.main.access import JobAccess, JobLaunchConfigAccess, AdHocCommandAccess, InventoryUpdateAccess, ProjectUpdateAccess, WorkflowJobAccess
 from awx.main.models import (
     Job,
     JobLaunchConfig,
@@ -16,6 +16,8 @@ from awx.main.models import (
     ExecutionEnvironment,
     InstanceGroup,
     Label,
+    WorkflowJob,
+    WorkflowJobTemplate,
 )
 
 from crum import impersonate
@@ -350,3 +352,53 @@ class TestLaunchConfigAccess:
 
         assert access.can_use(config)
         assert rando.can_access(JobLaunchConfig, 'use', config)
+
+
+@pytest.mark.django_db
+class TestPageCapabilities:
+    @pytest.fixture
+    def unified_jobs(self, deploy_jobtemplate, organization, project, inventory):
+        other_jt = JobTemplate.objects.create(name='other-jt', project=project, inventory=inventory)
+        inv_src = InventorySource.objects.create(inventory=inventory, source='ec2')
+        wfjt = WorkflowJobTemplate.objects.create(name='wfjt', organization=organization)
+        return [
+            Job.objects.create(job_template=deploy_jobtemplate, organization=organization),
+            Job.objects.create(job_template=other_jt, organization=organization),
+            Job.objects.create(job_template=other_jt),
+            Job.objects.create(),
+            ProjectUpdate.objects.create(project=project),
+            InventoryUpdate.objects.create(inventory_source=inv_src, inventory=inventory, source='ec2'),
+            AdHocCommand.objects.create(inventory=inventory),
+            WorkflowJob.objects.create(workflow_job_template=wfjt),
+            WorkflowJob.objects.create(),
+        ]
+
+    @pytest.mark.parametrize('grant', ['jt_execute', 'org_admin', 'resource_admin', 'nothing'])
+    def test_matches_object_capabilities(self, unified_jobs, deploy_jobtemplate, organization, project, inventory, rando, grant):
+        if grant == 'jt_execute':
+            deploy_jobtemplate.execute_role.members.add(rando)
+            WorkflowJobTemplate.objects.get(name='wfjt').execute_role.members.add(rando)
+            project.update_role.members.add(rando)
+            inventory.update_role.members.add(rando)
+        elif grant == 'org_admin':
+            organization.admin_role.members.add(rando)
+        elif grant == 'resource_admin':
+            project.admin_role.members.add(rando)
+            inventory.admin_role.members.add(rando)
+        for access_class in (JobAccess, ProjectUpdateAccess, InventoryUpdateAccess, AdHocCommandAccess, WorkflowJobAccess):
+            access = access_class(rando)
+            objs = [obj for obj in unified_jobs if isinstance(obj, access.model)]
+            page = access.get_page_user_capabilities(objs, method_list=['start', 'delete'])
+            for obj in objs:
+                expected = access.get_user_capabilities(obj, method_list=['start', 'delete'])
+                if access_class is AdHocCommandAccess:
+                    assert page[obj.pk]['delete'] == expected['delete']
+                else:
+                    assert page[obj.pk] == {display_method: bool(value) for display_method, value in expected.items()}
+
+    def test_page_queries(self, deploy_jobtemplate, organization, rando, django_assert_max_num_queries):
+        deploy_jobtemplate.execute_role.members.add(rando)
+        jobs = [Job.objects.create(job_template=deploy_jobtemplate, organization=organization) for i in range(10)]
+        with django_assert_max_num_queries(4):
+            page = JobAccess(rando).get_page_user_capabilities(jobs, method_list=['start', 'delete'])
+        assert page == {job.pk: {'start': True, 'delete': False} for job in jobs}
@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 from awx.main.access import (
@@ -7,6 +9,7 @@ from awx.main.access import (
     TeamAccess,
 )
 from awx.main.models import Role, Organization
+from awx.main.models.rbac import batch_role_ancestor_rebuilding
 
 
 @pytest.mark.django_db
@@ -192,3 +195,71 @@ def test_orphaned_user_allowed(org_admin, rando, organization, org_credential):
     # Cannot edit the user directly without adding to org first
     user_access = UserAccess(org_admin)
     assert not user_access.can_change(rando, {'last_name': 'Witzel'})
+
+
+@pytest.fixture
+def legacy_roles(settings):
+    settings.ANSIBLE_BASE_ROLE_SYSTEM_ACTIVATED = False
+    settings.ROLE_ANCESTRY_REBUILD_CHUNK_SIZE = 2
+    return {name: Role.objects.create(role_field=f'{name}_role') for name in 'abcde'}
+
+
+def stored_ancestors(roles):
+    return {name: {a.role_field[0] for a in role.ancestors.all()} for name, role in roles.items()}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('mode', ['sweep', 'closure'])
+def test_role_ancestry_rebuild(legacy_roles, settings, mode):
+    settings.ROLE_ANCESTRY_REBUILD_MODE = mode
+    r = legacy_roles
+    r['b'].parents.add(r['a'])
+    r['c'].parents.add(r['b'])
+    r['d'].parents.add(r['c'], r['a'])
+    r['e'].parents.add(r['d'])
+    assert stored_ancestors(r) == {'a': {'a'}, 'b': {'a', 'b'}, 'c': {'a', 'b', 'c'}, 'd': {'a', 'b', 'c', 'd'}, 'e': {'a', 'b', 'c', 'd', 'e'}}
+
+    with batch_role_ancestor_rebuilding():
+        r['c'].parents.remove(r['b'])
+        r['d'].parents.remove(r['a'])
+        r['e'].parents.add(r['b'])
+    assert stored_ancestors(r) == {'a': {'a'}, 'b': {'a', 'b'}, 'c': {'c'}, 'd': {'c', 'd'}, 'e': {'a', 'b', 'c', 'd', 'e'}}
+
+
+@pytest.mark.django_db
+def test_role_ancestry_closure_loop(legacy_roles, settings):
+    settings.ROLE_ANCESTRY_REBUILD_MODE = 'closure'
+    r = legacy_roles
+    r['b'].parents.add(r['a'])
+    r['c'].parents.add(r['b'])
+    r['d'].parents.add(r['c'])
+    r['b'].parents.add(r['d'])
+    r['e'].parents.add(r['d'])
+    loop = {'a', 'b', 'c', 'd'}
+    assert stored_ancestors(r) == {'a': {'a'}, 'b': loop, 'c': loop, 'd': loop, 'e': loop | {'e'}}
+
+    # the roles of the loop are each other's ancestors, only the closure mode
+    # notices that none of them has a left after this
+    r['b'].parents.remove(r['a'])
+    loop = {'b', 'c', 'd'}
+    assert stored_ancestors(r) == {'a': {'a'}, 'b': loop, 'c': loop, 'd': loop, 'e': loop | {'e'}}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('mode', ['sweep', 'closure'])
+def test_role_ancestry_rebuild_metrics(legacy_roles, settings, mode):
+    settings.ROLE_ANCESTRY_REBUILD_MODE = mode
+    with mock.patch('awx.main.analytics.subsystem_metrics.DispatcherMetrics') as metrics:
+        legacy_roles['c'].parents.add(legacy_roles['b'])
+    # a single role change only reports its rebuild in the closure mode
+    assert metrics.called == (mode == 'closure')
+
+    with mock.patch('awx.main.analytics.subsystem_metrics.DispatcherMetrics') as metrics:
+        with batch_role_ancestor_rebuilding():
+            legacy_roles['d'].parents.add(legacy_roles['b'])
+    recorded = {c.args[0]: c.args[1] for c in metrics.return_value.inc.call_args_list}
+    assert recorded['role_ancestry_rebuild_calls'] == 1
+    assert recorded['role_ancestry_rebuild_passes'] >= 1
+    assert recorded['role_ancestry_rebuild_rows_inserted'] == 1
+    assert recorded['role_ancestry_rebuild_rows_deleted'] == 0
+    metrics.return_value.pipe_execute.assert_called_once()
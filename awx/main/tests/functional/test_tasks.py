@@ -5,8 +5,10 @@ import tempfile
 import shutil
 
 from awx.main.tasks.jobs import RunJob
-from awx.main.tasks.system import execution_node_health_check, _cleanup_images_and_files
-from awx.main.models import Instance, Job
+from django.db import connection
+
+from awx.main.tasks.system import execution_node_health_check, _cleanup_images_and_files, update_host_smart_inventory_memberships
+from awx.main.models import Instance, Inventory, Job, Host, SmartInventoryMembership
 
 
 @pytest.fixture
@@ -73,3 +75,46 @@ def test_does_not_run_reaped_job(mocker, mock_me):
     job.refresh_from_db()
     assert job.status == 'failed'
     mock_run.assert_not_called()
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='smart inventories match one host per name with DISTINCT ON')
+def test_smart_memberships_follow_hosts_of_the_same_name(organization):
+    inventories = [Inventory.objects.create(name=f'inv-{i}', organization=organization) for i in range(2)]
+    first, second = [inv.hosts.create(name='web') for inv in inventories]
+    smart = Inventory.objects.create(name='smart', kind='smart', host_filter='name=web', organization=organization)
+
+    def members():
+        return list(SmartInventoryMembership.objects.filter(inventory=smart).values_list('host_id', flat=True))
+
+    update_host_smart_inventory_memberships(inventory_ids=[smart.pk])
+    assert members() == [first.pk]
+
+    # the other host of the old name takes the place of a renamed host
+    Host.objects.filter(pk=first.pk).update(name='db')
+    update_host_smart_inventory_memberships(host_names=['db', 'web'])
+    assert members() == [second.pk]
+
+    # and of a deleted host
+    Host.objects.filter(pk=first.pk).update(name='web')
+    update_host_smart_inventory_memberships(host_names=['web'])
+    assert members() == [first.pk]
+    first.delete()
+    update_host_smart_inventory_memberships(host_names=['web'])
+    assert members() == [second.pk]
+
+
+@pytest.mark.django_db
+def test_host_changes_refresh_smart_memberships_of_old_and_new_names(inventory, settings, django_capture_on_commit_callbacks):
+    settings.AWX_REBUILD_SMART_MEMBERSHIP = True
+    host = inventory.hosts.create(name='web')
+    with mock.patch('awx.main.tasks.system.update_host_smart_inventory_memberships.delay') as delay:
+        with django_capture_on_commit_callbacks(execute=True):
+            host.name = 'db'
+            host.save()
+        delay.assert_called_once_with(host_names=['db', 'web'])
+
+        delay.reset_mock()
+        with django_capture_on_commit_callbacks(execute=True):
+            host.delete()
+        delay.assert_called_once_with(host_names=['db'])
@@ -0,0 +1,108 @@
+import os
+from unittest import mock
+
+import prometheus_client
+import pytest
+from prometheus_client.registry import CollectorRegistry
+
+from awx.main.analytics.subsystem_metrics import CallbackReceiverMetrics, DispatcherMetrics, InstanceMetricsCollector
+
+# higher than any pid the kernel hands out
+DEAD_PID = 2**22 + 1
+
+
+@pytest.fixture
+def local_metrics(settings, tmp_path):
+    settings.SUBSYSTEM_METRICS_BACKEND = 'local'
+    settings.SUBSYSTEM_METRICS_LOCAL_DIR = str(tmp_path)
+    return CallbackReceiverMetrics()
+
+
+def record_in_dead_process(metrics, field, value):
+    with mock.patch.object(os, 'getpid', return_value=DEAD_PID):
+        metrics.inc(field, value)
+        metrics.set('callback_receiver_events_queue_size_redis', 7)
+        for m in metrics.METRICS.values():
+            m.store_value(metrics.pipe)
+
+
+def test_local_values_of_all_processes(local_metrics):
+    local_metrics.inc('callback_receiver_events_popped_redis', 3)
+    local_metrics.set('callback_receiver_events_queue_size_redis', 5)
+    local_metrics.observe('callback_receiver_events_popped_batch_size', 20)
+    for m in local_metrics.METRICS.values():
+        m.store_value(local_metrics.pipe)
+    record_in_dead_process(local_metrics, 'callback_receiver_events_popped_redis', 4)
+
+    data = local_metrics.load_local_metrics()
+    assert data['callback_receiver_events_popped_redis'] == 7
+    # the value that was set last wins
+    assert data['callback_receiver_events_queue_size_redis'] == 7
+    assert data['callback_receiver_events_popped_batch_size'] == {'counts': [0, 0, 1, 0, 0, 0, 0], 'sum': 20, 'inf': 1}
+
+
+def test_launch_latency_in_seconds(local_metrics):
+    metrics = DispatcherMetrics()
+    metrics.observe('periodic_scheduler_launch_latency_seconds', 0.5)
+    metrics.observe('periodic_scheduler_launch_latency_seconds', 2.25)
+    metrics.set('periodic_scheduler_launch_latency_max_seconds', 2.25)
+    for m in metrics.METRICS.values():
+        m.store_value(metrics.pipe)
+
+    data = metrics.load_local_metrics()
+    assert data['periodic_scheduler_launch_latency_seconds'] == {'counts': [1, 1, 0, 0, 0, 0], 'sum': 2.75, 'inf': 2}
+    assert data['periodic_scheduler_launch_latency_max_seconds'] == 2.25
+
+
+def test_local_compact(local_metrics):
+    local_metrics.inc('callback_receiver_events_popped_redis', 1)
+    local_metrics.METRICS['callback_receiver_events_popped_redis'].store_value(local_metrics.pipe)
+    record_in_dead_process(local_metrics, 'callback_receiver_events_popped_redis', 2)
+    record_in_dead_process(local_metrics, 'callback_receiver_events_popped_redis', 4)
+    assert DEAD_PID in dict(local_metrics.conn.files())
+
+    local_metrics.conn.compact()
+    assert sorted(dict(local_metrics.conn.files())) == [0, os.getpid()]
+    assert local_metrics.load_local_metrics()['callback_receiver_events_popped_redis'] == 7
+
+
+def test_local_clear(local_metrics):
+    local_metrics.inc('callback_receiver_events_popped_redis', 1)
+    local_metrics.METRICS['callback_receiver_events_popped_redis'].store_value(local_metrics.pipe)
+    record_in_dead_process(local_metrics, 'callback_receiver_events_popped_redis', 2)
+    local_metrics.conn.compact()
+    record_in_dead_process(local_metrics, 'callback_receiver_events_popped_redis', 4)
+    # a process that is still running, pid 1 is always there
+    with mock.patch.object(os, 'getpid', return_value=1):
+        local_metrics.inc('callback_receiver_events_popped_redis', 8)
+        local_metrics.METRICS['callback_receiver_events_popped_redis'].store_value(local_metrics.pipe)
+    running_buffer = local_metrics.conn.buffer
+
+    local_metrics.conn.clear()
+    assert sorted(dict(local_metrics.conn.files())) == [1, os.getpid()]
+    assert local_metrics.load_local_metrics()['callback_receiver_events_popped_redis'] == 8
+
+    # the running process still writes to a file the readers see
+    local_metrics.conn.SLOT.pack_into(running_buffer, local_metrics.conn.offset('callback_receiver_events_popped_redis'), 9, 0)
+    assert local_metrics.load_local_metrics()['callback_receiver_events_popped_redis'] == 9
+
+
+def test_instance_metrics_collector(local_metrics):
+    instance_data = {
+        'awx-1': {
+            'callback_receiver_events_popped_redis': 3,
+            'callback_receiver_events_popped_batch_size': {'counts': [1, 0, 2, 0, 0, 0, 0], 'sum': 90, 'inf': 4},
+        },
+        'awx-2': {'callback_receiver_events_popped_redis': 5},
+    }
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(
+        InstanceMetricsCollector(local_metrics, instance_data, ['callback_receiver_events_popped_redis', 'callback_receiver_events_popped_batch_size'])
+    )
+    lines = prometheus_client.generate_latest(registry).decode('UTF-8').splitlines()
+    assert 'callback_receiver_events_popped_redis{node="awx-1"} 3.0' in lines
+    assert 'callback_receiver_events_popped_redis{node="awx-2"} 5.0' in lines
+    assert 'callback_receiver_events_popped_batch_size_bucket{le="50",node="awx-1"} 3.0' in lines
+    assert 'callback_receiver_events_popped_batch_size_bucket{le="+Inf",node="awx-1"} 4.0' in lines
+    assert 'callback_receiver_events_popped_batch_size_sum{node="awx-1"} 90.0' in lines
+    assert not any(line.startswith('callback_receiver_events_in_memory') for line in lines)
@@ -2,7 +2,7 @@ from datetime import datetime
 from datetime import timezone
 import pytest
 
-from awx.main.models import JobEvent, ProjectUpdateEvent, AdHocCommandEvent, InventoryUpdateEvent, SystemJobEvent
+from awx.main.models import JobEvent, JobEventTreeSummary, ProjectUpdateEvent, AdHocCommandEvent, InventoryUpdateEvent, SystemJobEvent
 
 
 @pytest.mark.parametrize(
@@ -41,3 +41,34 @@ def test_playbook_event_strip_invalid_keys(job_identifier, cls):
 def test_really_long_event_fields(field):
     event = JobEvent.create_from_data(**{'job_id': 123, 'event_data': {field: 'X' * 4096}})
     assert event.event_data[field] == 'X' * 1023 + '…'
+
+
+def test_event_tree_summary_nests_meta_events_under_next_event():
+    """
+    E1
+      E2
+    verbose
+    verbose <- nested under E2, the parent of the deeper event after it
+        E3
+    """
+    events = [
+        (1, 'uuid1', '', 'playbook_on_start'),
+        (2, 'uuid2', 'uuid1', 'playbook_on_play_start'),
+        (3, 'uuid3', '', 'verbose'),
+        (4, 'uuid4', '', 'verbose'),
+        (5, 'uuid5', 'uuid2', 'playbook_on_task_start'),
+    ]
+    is_tree, children, meta = JobEventTreeSummary.summarize(events)
+    assert is_tree is True
+    assert children == [[1, 0, 4], [2, 1, 3]]
+    assert meta == [[3, 'uuid2'], [4, 'uuid2']]
+
+
+def test_event_tree_summary_not_a_tree():
+    events = [
+        (1, 'uuid1', '', 'playbook_on_start'),
+        (2, 'uuid2', 'uuid1', 'playbook_on_play_start'),
+        (3, 'uuid3', 'uuid1', 'playbook_on_play_start'),
+        (4, 'uuid4', 'uuid2', 'playbook_on_task_start'),
+    ]
+    assert JobEventTreeSummary.summarize(events) == (False, [], [])
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import json
 import os
 import time
@@ -103,7 +104,7 @@ def test_finish_job_fact_cache_with_existing_data(hosts, mocker, tmpdir, ref_tim
         assert host.ansible_facts_modified == ref_time
     assert hosts[1].ansible_facts == ansible_facts_new
     assert hosts[1].ansible_facts_modified > ref_time
-    bulk_update.assert_called_once_with([hosts[1]], ['ansible_facts', 'ansible_facts_modified'])
+    bulk_update.assert_called_once_with([hosts[1]], ['ansible_facts', 'ansible_facts_modified', 'ansible_facts_digest'])
 
 
 def test_finish_job_fact_cache_with_bad_data(hosts, mocker, tmpdir):
@@ -139,4 +140,94 @@ def test_finish_job_fact_cache_clear(hosts, mocker, ref_time, tmpdir):
         assert host.ansible_facts_modified == ref_time
     assert hosts[1].ansible_facts == {}
     assert hosts[1].ansible_facts_modified > ref_time
-    bulk_update.assert_called_once_with([hosts[1]], ['ansible_facts', 'ansible_facts_modified'])
+    bulk_update.assert_called_once_with([hosts[1]], ['ansible_facts', 'ansible_facts_modified', 'ansible_facts_digest'])
+
+
+def test_fact_cache_with_io_threads(hosts, mocker, tmpdir, settings):
+    settings.ANSIBLE_FACT_CACHE_IO_THREADS = 4
+    fact_cache = os.path.join(tmpdir, 'facts')
+    last_modified = start_fact_cache(hosts, fact_cache, timeout=0)
+
+    for host in hosts:
+        with open(os.path.join(fact_cache, host.name), 'r') as f:
+            assert json.load(f) == host.ansible_facts
+
+    bulk_update = mocker.patch('django.db.models.query.QuerySet.bulk_update')
+
+    for host in hosts[:2]:
+        filepath = os.path.join(fact_cache, host.name)
+        with open(filepath, 'w') as f:
+            f.write(json.dumps({"name": host.name}))
+        new_modification_time = time.time() + 3600
+        os.utime(filepath, (new_modification_time, new_modification_time))
+
+    finish_fact_cache(hosts, fact_cache, last_modified)
+
+    assert [host.ansible_facts for host in hosts] == [{"name": "host1"}, {"name": "host2"}, {"a": 1, "b": 2}, {"a": 1, "b": 2}]
+    bulk_update.assert_called_once_with(hosts[:2], ['ansible_facts', 'ansible_facts_modified', 'ansible_facts_digest'])
+
+
+def test_finish_job_fact_cache_ignores_links(hosts, mocker, tmpdir):
+    fact_cache = os.path.join(tmpdir, 'facts')
+    last_modified = start_fact_cache(hosts, fact_cache, timeout=0)
+
+    bulk_update = mocker.patch('django.db.models.query.QuerySet.bulk_update')
+
+    outside = os.path.join(tmpdir, 'outside')
+    with open(outside, 'w') as f:
+        f.write(json.dumps({"secret": "value"}))
+    filepath = os.path.join(fact_cache, hosts[1].name)
+    os.remove(filepath)
+    os.symlink(outside, filepath)
+
+    finish_fact_cache(hosts, fact_cache, last_modified)
+
+    assert hosts[1].ansible_facts == {"a": 1, "b": 2}
+    bulk_update.assert_not_called()
+
+
+def test_finish_job_fact_cache_same_facts_gathered(hosts, mocker, tmpdir, ref_time):
+    fact_cache = os.path.join(tmpdir, 'facts')
+    last_modified = start_fact_cache(hosts, fact_cache, timeout=0)
+
+    bulk_update = mocker.patch('django.db.models.query.QuerySet.bulk_update')
+    update = mocker.patch('django.db.models.query.QuerySet.update')
+    log = mocker.patch('awx.main.tasks.facts.system_tracking_logger')
+
+    content = json.dumps({"a": 1, "b": 2}, indent=4).encode('utf-8')
+    hosts[1].ansible_facts_digest = hashlib.sha256(content).hexdigest()
+    filepath = os.path.join(fact_cache, hosts[1].name)
+    with open(filepath, 'wb') as f:
+        f.write(content)
+    new_modification_time = time.time() + 3600
+    os.utime(filepath, (new_modification_time, new_modification_time))
+
+    finish_fact_cache(hosts, fact_cache, last_modified)
+
+    # the facts are only marked as fresh
+    bulk_update.assert_not_called()
+    log.info.assert_not_called()
+    update.assert_called_once()
+    assert hosts[1].ansible_facts_modified > ref_time
+
+
+def test_finish_job_fact_cache_log_diff(hosts, mocker, tmpdir, settings):
+    settings.ANSIBLE_FACT_LOG_DIFF = True
+    fact_cache = os.path.join(tmpdir, 'facts')
+    last_modified = start_fact_cache(hosts, fact_cache, timeout=0)
+
+    mocker.patch('django.db.models.query.QuerySet.bulk_update')
+    log = mocker.patch('awx.main.tasks.facts.system_tracking_logger')
+
+    filepath = os.path.join(fact_cache, hosts[1].name)
+    with open(filepath, 'w') as f:
+        f.write(json.dumps({"a": 1, "c": 3}))
+    new_modification_time = time.time() + 3600
+    os.utime(filepath, (new_modification_time, new_modification_time))
+
+    finish_fact_cache(hosts, fact_cache, last_modified)
+
+    extra = log.info.call_args[1]['extra']
+    assert extra['ansible_facts'] == {"c": 3}
+    assert extra['ansible_facts_removed'] == ["b"]
+    assert hosts[1].ansible_facts == {"a": 1, "c": 3}
@@ -183,14 +183,15 @@ class TestSelectBestInstanceForTask(object):
             (Job(task_impact=100), Is([50, 0, 20, 99, 11, 1, 5, 99]), None, "The task don't a fit, you must a quit!"),
         ],
     )
-    def test_fit_task_to_most_remaining_capacity_instance(self, task, instances, instance_fit_index, reason):
+    @pytest.mark.parametrize('capacity_index', [True, False])
+    def test_fit_task_to_most_remaining_capacity_instance(self, task, instances, instance_fit_index, reason, capacity_index):
         ig = InstanceGroup(id=10, name='controlplane')
         tasks = []
         for instance in instances:
             ig.instances.add(instance)
             for _ in range(instance.jobs_running):
                 tasks.append(Job(execution_node=instance.hostname, controller_node=instance.hostname, instance_group=ig))
-        tm_models = TaskManagerModels.init_with_consumed_capacity(tasks=tasks, instances=instances, instance_groups=[ig])
+        tm_models = TaskManagerModels.init_with_consumed_capacity(tasks=tasks, instances=instances, instance_groups=[ig], capacity_index=capacity_index)
         instance_picked = tm_models.instance_groups.fit_task_to_most_remaining_capacity_instance(task, 'controlplane')
 
         if instance_fit_index is None:
@@ -198,6 +199,21 @@ class TestSelectBestInstanceForTask(object):
         else:
             assert instance_picked.hostname == instances[instance_fit_index].hostname, reason
 
+    def test_fit_task_follows_consumed_capacity(self):
+        ig = InstanceGroup(id=10, name='controlplane')
+        instances = Is([100, 150, 120])
+        ig.instances.add(*instances)
+        tm_models = TaskManagerModels(instances=instances, instance_groups=[ig])
+        picked = []
+        for _ in range(4):
+            task = Job(task_impact=40)
+            instance = tm_models.instance_groups.fit_task_to_most_remaining_capacity_instance(task, 'controlplane')
+            task.execution_node = instance.hostname
+            tm_models.consume_capacity(task)
+            picked.append(instance.hostname)
+        # 150 -> 110, then 120 -> 80, then 110 -> 70, then 100 -> 60
+        assert picked == ['fakehost-1', 'fakehost-2', 'fakehost-1', 'fakehost-0']
+
     @pytest.mark.parametrize(
         'instances,instance_fit_index,reason',
         [
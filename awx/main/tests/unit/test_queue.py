@@ -0,0 +1,68 @@
+from unittest import mock
+
+import pytest
+
+from awx.main.queue import BufferedCallbackQueueDispatcher, CallbackQueueDispatcher, load_callback_message
+
+
+@pytest.fixture
+def redis_conn():
+    with mock.patch('awx.main.queue.redis.Redis.from_url') as from_url:
+        yield from_url.return_value
+
+
+def test_dispatch_plain_json(redis_conn, settings):
+    settings.JOB_EVENT_DISPATCH_COMPRESS_THRESHOLD = 0
+    CallbackQueueDispatcher().dispatch({'event': 'runner_on_ok', 'counter': 1})
+    queue, message = redis_conn.rpush.call_args[0]
+    assert message.startswith(b'{')
+    assert load_callback_message(message) == {'event': 'runner_on_ok', 'counter': 1}
+
+
+@pytest.mark.parametrize('serializer', ['json', 'orjson'])
+def test_large_events_are_compressed(redis_conn, settings, serializer):
+    settings.JOB_EVENT_DISPATCH_SERIALIZER = serializer
+    settings.JOB_EVENT_DISPATCH_COMPRESS_THRESHOLD = 1024
+    event = {'event': 'runner_on_ok', 'event_data': {'res': {'ansible_facts': {'x': 'y' * 4096}}}}
+    CallbackQueueDispatcher().dispatch(event)
+    queue, message = redis_conn.rpush.call_args[0]
+    assert message.startswith(b'zlib:')
+    assert len(message) < 1024
+    assert load_callback_message(message) == event
+
+
+def test_buffered_dispatch_flushes_by_size(redis_conn, settings):
+    settings.JOB_EVENT_DISPATCH_BUFFER_SIZE = 3
+    settings.JOB_EVENT_DISPATCH_BUFFER_SECONDS = 60
+    dispatcher = BufferedCallbackQueueDispatcher()
+    for i in range(2):
+        dispatcher.dispatch({'counter': i})
+    redis_conn.rpush.assert_not_called()
+    dispatcher.dispatch({'counter': 2})
+    messages = redis_conn.rpush.call_args[0][1:]
+    assert [load_callback_message(m) for m in messages] == [{'counter': 0}, {'counter': 1}, {'counter': 2}]
+
+
+def test_buffered_dispatch_sends_eof_immediately(redis_conn, settings):
+    settings.JOB_EVENT_DISPATCH_BUFFER_SIZE = 100
+    settings.JOB_EVENT_DISPATCH_BUFFER_SECONDS = 60
+    dispatcher = BufferedCallbackQueueDispatcher()
+    dispatcher.dispatch({'counter': 1})
+    dispatcher.dispatch({'event': 'EOF', 'final_counter': 1})
+    assert redis_conn.rpush.call_count == 1
+    assert len(redis_conn.rpush.call_args[0][1:]) == 2
+    dispatcher.flush()
+    assert redis_conn.rpush.call_count == 1
+
+
+def test_buffered_dispatch_flushes_when_idle(redis_conn, settings):
+    settings.JOB_EVENT_DISPATCH_BUFFER_SIZE = 100
+    settings.JOB_EVENT_DISPATCH_BUFFER_SECONDS = 0.01
+    dispatcher = BufferedCallbackQueueDispatcher()
+    dispatcher.dispatch({'counter': 1})
+    timer = dispatcher.timer
+    timer.join(5)
+    assert not timer.is_alive()
+    messages = redis_conn.rpush.call_args[0][1:]
+    assert [load_callback_message(m) for m in messages] == [{'counter': 1}]
+    assert dispatcher.timer is None
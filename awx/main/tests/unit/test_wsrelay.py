@@ -0,0 +1,117 @@
+import asyncio
+import collections
+
+import pytest
+from channels_redis.core import RedisChannelLayer
+
+from awx.main.analytics.broadcast_websocket import RelayWebsocketStats
+from awx.main.consumers import unwrap_broadcast_msg
+from awx.main.wsrelay import WebsocketRelayConnection, wrap_broadcast_batch, wrap_broadcast_msg
+
+
+class FakeRedis:
+    """The sorted set commands RedisChannelLayer sends and receives messages with"""
+
+    def __init__(self):
+        self.keys = collections.defaultdict(dict)
+        self.added = asyncio.Condition()
+
+    async def pop(self):
+        return self
+
+    def push(self, connection):
+        pass
+
+    async def conn_error(self, connection):
+        pass
+
+    async def zadd(self, key, score, member):
+        self.keys[key][member] = score
+        async with self.added:
+            self.added.notify_all()
+
+    async def zcard(self, key):
+        return len(self.keys[key])
+
+    async def zcount(self, key):
+        return len(self.keys[key])
+
+    async def zremrangebyscore(self, key, min, max):
+        pass
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def zpopmin(self, key):
+        member = min(self.keys[key], key=self.keys[key].get, default=None)
+        if member is not None:
+            return [member, self.keys[key].pop(member)]
+
+    async def bzpopmin(self, key, timeout):
+        async with self.added:
+            try:
+                await asyncio.wait_for(self.added.wait_for(lambda: self.keys[key]), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return [key] + await self.zpopmin(key)
+
+    async def eval(self, script, keys, args):
+        # puts the messages of an interrupted receive back on the channel
+        channel, backup = args
+        self.keys[channel].update(self.keys.pop(backup, {}))
+
+
+@pytest.fixture
+def channel_layer():
+    layer = RedisChannelLayer()
+    layer.pools = [FakeRedis()]
+    return layer
+
+
+def test_unwrap_single_and_batched_frames():
+    assert unwrap_broadcast_msg(wrap_broadcast_msg('jobs', {'text': 'a'})) == ('jobs', [{'text': 'a'}])
+    assert unwrap_broadcast_msg(wrap_broadcast_batch('jobs', [{'text': 'a'}, {'text': 'b'}])) == ('jobs', [{'text': 'a'}, {'text': 'b'}])
+
+
+def test_receive_batch(settings, channel_layer):
+    settings.BROADCAST_WEBSOCKET_BATCH_SIZE = 3
+    settings.BROADCAST_WEBSOCKET_BATCH_MAX_DELAY_MS = 1
+
+    async def run():
+        connection = WebsocketRelayConnection('awx-2', RelayWebsocketStats('awx-1', 'awx-2'), 'awx-2')
+        connection.event_loop = asyncio.get_running_loop()
+        connection.channel_layer = channel_layer
+        channel = await channel_layer.new_channel()
+        for i in range(4):
+            await channel_layer.send(channel, {'text': str(i)})
+        batches = [await connection.receive_batch(channel, timeout=1)]
+        assert await connection.queue_depth(channel) == 1
+        batches.append(await connection.receive_batch(channel, timeout=1))
+        assert await connection.queue_depth(channel) == 0
+
+        # waiting for messages does not drop the one that arrives after the wait timed out
+        with pytest.raises(asyncio.TimeoutError):
+            await connection.receive_batch(channel, timeout=0.01)
+        await channel_layer.send(channel, {'text': '4'})
+        batches.append(await connection.receive_batch(channel, timeout=1))
+        connection.receive_tasks.pop(channel).cancel()
+        return batches
+
+    batches = asyncio.run(run())
+    assert [[m['text'] for m in batch] for batch in batches] == [
+        ['0', '1', '2'],
+        # the last message goes alone once nothing else arrived before the deadline
+        ['3'],
+        ['4'],
+    ]
+
+
+def test_record_batch_sent():
+    stats = RelayWebsocketStats('awx-1', 'awx-2')
+    stats.record_batch_sent(5, 2)
+    stats.record_batch_sent(3, 0)
+    lines = stats.serialize().splitlines()
+    assert 'awx_awx_2_messages_sent_total 8.0' in lines
+    assert 'awx_awx_2_batches_sent_total 2.0' in lines
+    assert 'awx_awx_2_last_batch_size 3.0' in lines
+    assert 'awx_awx_2_producer_queue_depth 0.0' in lines
@@ -0,0 +1,61 @@
+import os
+import time
+
+import pytest
+
+from awx.main.utils.inventory_cache import InventoryScriptCache
+
+
+SCRIPT_DATA = {'all': {'hosts': ['foo', 'bar']}, '_meta': {'hostvars': {'foo': {'a': 1}, 'bar': {}}}}
+
+
+@pytest.fixture
+def cache_root(tmp_path, settings):
+    settings.INVENTORY_SCRIPT_CACHE_ROOT = str(tmp_path / 'inventory_cache')
+    return tmp_path / 'inventory_cache'
+
+
+def test_inventory_script_cache_round_trip(cache_root):
+    InventoryScriptCache(1, {'hostvars': True}).save([3, 'x'], SCRIPT_DATA)
+    assert InventoryScriptCache(1, {'hostvars': True}).load([3, 'x']) == SCRIPT_DATA
+    assert [path.name for path in cache_root.iterdir()] == [InventoryScriptCache(1, {'hostvars': True}).path.rsplit('/', 1)[-1]]
+
+
+def test_inventory_script_cache_key_mismatch(cache_root):
+    InventoryScriptCache(1, {'hostvars': True}).save([3, 'x'], SCRIPT_DATA)
+    assert InventoryScriptCache(1, {'hostvars': True}).load([4, 'x']) is None
+    # a rebuild replaces the old copy
+    InventoryScriptCache(1, {'hostvars': True}).save([4, 'x'], {})
+    assert InventoryScriptCache(1, {'hostvars': True}).load([4, 'x']) == {}
+    assert len(list(cache_root.iterdir())) == 1
+
+
+def test_inventory_script_cache_params(cache_root):
+    InventoryScriptCache(1, {'hostvars': True, 'slice_number': 1}).save([3], SCRIPT_DATA)
+    assert InventoryScriptCache(1, {'slice_number': 1, 'hostvars': True}).load([3]) == SCRIPT_DATA
+    assert InventoryScriptCache(1, {'hostvars': True, 'slice_number': 2}).load([3]) is None
+    assert InventoryScriptCache(2, {'hostvars': True, 'slice_number': 1}).load([3]) is None
+
+
+def test_inventory_script_cache_corrupt(cache_root):
+    script_cache = InventoryScriptCache(1, {})
+    assert script_cache.load([1]) is None
+    cache_root.mkdir()
+    with open(script_cache.path, 'wb') as f:
+        f.write(b'not compressed')
+    assert script_cache.load([1]) is None
+
+
+def test_inventory_script_cache_purge(cache_root):
+    for inventory_id in (1, 2, 12):
+        InventoryScriptCache(inventory_id, {}).save([1], SCRIPT_DATA)
+    InventoryScriptCache.purge(1)
+    assert InventoryScriptCache(1, {}).load([1]) is None
+    assert InventoryScriptCache(12, {}).load([1]) == SCRIPT_DATA
+
+    # a copy that is used is kept
+    os.utime(InventoryScriptCache(2, {}).path, (time.time() - 100, time.time() - 100))
+    os.utime(InventoryScriptCache(12, {}).path, (time.time() - 100, time.time() - 100))
+    assert InventoryScriptCache(12, {}).load([1]) == SCRIPT_DATA
+    InventoryScriptCache.purge(max_age=50)
+    assert sorted(path.name.split('-')[0] for path in cache_root.iterdir()) == ['12']
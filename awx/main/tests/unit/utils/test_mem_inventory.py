@@ -1,8 +1,11 @@
 # AWX utils
-from awx.main.utils.mem_inventory import MemInventory, mem_data_to_dict, dict_to_mem_data
+from awx.main.utils.mem_inventory import InventoryJSONStream, MemInventory, mem_data_to_dict, dict_to_mem_data, stream_to_mem_data
 
+import io
+import re
 import pytest
 import json
+from unittest import mock
 
 
 @pytest.fixture
@@ -118,3 +121,45 @@ def test_host_lists_accepted(JSON_with_lists):
     # Check that marietta's hosts was saved
     h = inventory.get_host('host6.example.com')
     assert h.name == 'host6.example.com'
+
+
+@pytest.mark.inventory_import
+def test_group_membership_lookups():
+    inventory = MemInventory()
+    group = inventory.get_group('g')
+    hosts = [inventory.get_host('host-{}'.format(i)) for i in range(40)]
+    for host in hosts + hosts:
+        group.add_host(host)
+    assert group.hosts == hosts
+    inventory.drop_indexes()
+    group.add_host(hosts[0])
+    assert group.hosts == hosts
+
+
+# streamed JSON --> MemObject tests
+
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_stream_matches_dict(JSON_with_lists, chunk_size):
+    JSON_with_lists['_meta'] = {'hostvars': {'host1.example.com': {'a': [1, 2.5, None]}, 'host3.example.com': {'n': 1234567}}}
+    JSON_with_lists['zeta'] = {'hosts': {'host8.example.com': {'x': 'y'}}, 'vars': {'s': 'q"uo\\te\u00e9'}}
+    text = json.dumps(JSON_with_lists, indent=2)
+    with mock.patch.object(InventoryJSONStream, 'CHUNK_SIZE', chunk_size):
+        streamed = mem_data_to_dict(stream_to_mem_data(io.StringIO(text)))
+    assert streamed == mem_data_to_dict(dict_to_mem_data(json.loads(text)))
+    assert streamed['_meta']['hostvars']['host3.example.com'] == {'n': 1234567}
+
+
+@pytest.mark.inventory_import
+def test_stream_host_filter(JSON_of_inv):
+    inventory = MemInventory(host_filter_re=re.compile('^group_'))
+    inventory = stream_to_mem_data(io.StringIO(json.dumps(JSON_of_inv)), inventory=inventory)
+    assert list(inventory.all_group.all_hosts) == ['group_host']
+
+
+@pytest.mark.inventory_import
+@pytest.mark.parametrize('text', ['[]', '{"all": {}', '{"all": {}} {}', '{"all" {}}'])
+def test_stream_invalid(text):
+    with pytest.raises((TypeError, ValueError)):
+        stream_to_mem_data(io.StringIO(text))
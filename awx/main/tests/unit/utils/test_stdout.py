@@ -0,0 +1,46 @@
+from unittest import mock
+
+import pytest
+
+from awx.main.utils.stdout import StdoutIndex
+
+
+STDOUT_LINES = [f'line {i}\r with a carriage return\n' for i in range(50)] + ['no trailing newline']
+STDOUT_TEXT = ''.join(STDOUT_LINES)
+
+
+@pytest.fixture
+def stdout_index(tmp_path, settings):
+    settings.JOBOUTPUT_ROOT = str(tmp_path)
+    unified_job = mock.Mock(pk=42, **{'model_to_str.return_value': 'job'})
+    with mock.patch.object(StdoutIndex, 'CHUNK_LINES', 7):
+        # events do not necessarily end on line boundaries
+        StdoutIndex(unified_job).build(STDOUT_TEXT[i : i + 13] for i in range(0, len(STDOUT_TEXT), 13))
+        index = StdoutIndex(unified_job)
+        assert index.load()
+        yield index
+
+
+def test_stdout_index_totals(stdout_index):
+    assert stdout_index.lines == len(STDOUT_LINES)
+    assert stdout_index.chars == len(STDOUT_TEXT)
+    assert len(stdout_index.chunks) == 8
+
+
+@pytest.mark.parametrize('start, stop', [(0, 5), (3, 20), (6, 7), (7, 8), (45, 60), (50, 51), (20, 20)])
+def test_stdout_index_read_lines(stdout_index, start, stop):
+    assert stdout_index.read_lines(start, stop) == STDOUT_LINES[start:stop]
+
+
+def test_stdout_index_iter_text(stdout_index):
+    assert ''.join(stdout_index.iter_text()) == STDOUT_TEXT
+
+
+def test_stdout_index_incomplete(tmp_path, settings):
+    settings.JOBOUTPUT_ROOT = str(tmp_path)
+    unified_job = mock.Mock(pk=43, **{'model_to_str.return_value': 'job'})
+    index = StdoutIndex(unified_job).build(['some output\n'])
+    assert StdoutIndex(unified_job).load()
+    with open(index.data_path, 'wb'):
+        pass  # truncated
+    assert not StdoutIndex(unified_job).load()
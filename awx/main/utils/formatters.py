@@ -193,6 +193,8 @@ class LogstashFormatter(LogstashFormatterBase):
                 data['ansible_python'].pop('version_info', None)
 
             data_for_log['ansible_facts'] = data
+            if 'ansible_facts_removed' in raw_data:
+                data_for_log['ansible_facts_removed'] = raw_data['ansible_facts_removed']
             data_for_log['ansible_facts_modified'] = raw_data.get('ansible_facts_modified')
             data_for_log['inventory_id'] = raw_data.get('inventory_id')
             data_for_log['host_name'] = raw_data.get('host_name')
@@ -0,0 +1,109 @@
+# Copyright (c) 2024 Ansible, Inc.
+# All Rights Reserved.
+
+# Python
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+
+# Django
+from django.conf import settings
+from django.db import connection
+
+__all__ = ['InventoryScriptCache', 'bump_inventory_revision']
+
+logger = logging.getLogger('awx.main.utils.inventory_cache')
+
+
+class InventoryScriptCache(object):
+    """
+    The rendered script data of an inventory for one set of get_script_data
+    arguments, stored zlib compressed under INVENTORY_SCRIPT_CACHE_ROOT along
+    with the key it was built for. There is a single file per inventory and set
+    of arguments, a rebuild for a newer key replaces it. The modification time
+    of a file is the last time it was used.
+    """
+
+    def __init__(self, inventory_id, script_params):
+        params = json.dumps(script_params, sort_keys=True)
+        name = '{}-{}.json.z'.format(inventory_id, hashlib.sha1(params.encode('utf-8')).hexdigest()[:16])
+        self.path = os.path.join(settings.INVENTORY_SCRIPT_CACHE_ROOT, name)
+
+    @staticmethod
+    def purge(inventory_id=None, max_age=None):
+        """Removes the copies of an inventory or of all of them, only those not used for max_age seconds if given"""
+        pattern = '{}-*.json.z'.format(inventory_id if inventory_id is not None else '*')
+        for path in glob.glob(os.path.join(settings.INVENTORY_SCRIPT_CACHE_ROOT, pattern)):
+            try:
+                if max_age is None or os.stat(path).st_mtime < time.time() - max_age:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def load(self, key):
+        """Returns the cached script data if it was built for key, None otherwise"""
+        try:
+            with open(self.path, 'rb') as f:
+                cached = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return None
+        if cached.get('key') != key:
+            return None
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+        return cached['data']
+
+    def save(self, key, data):
+        os.makedirs(settings.INVENTORY_SCRIPT_CACHE_ROOT, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '-', dir=settings.INVENTORY_SCRIPT_CACHE_ROOT)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(json.dumps({'key': key, 'data': data}).encode('utf-8'), 1))
+            os.rename(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+class ScriptRevisionBump(object):
+    """The bumps of the script revisions of the inventories a transaction changed, made once it commits"""
+
+    done = False
+
+    def __init__(self):
+        self.inventory_ids = set()
+
+    def __call__(self):
+        from awx.main.models import InventoryScriptRevision  # circular import
+
+        for inventory_id in sorted(self.inventory_ids):
+            InventoryScriptRevision.bump(inventory_id)
+            # the copies on other nodes are replaced when used or expire
+            InventoryScriptCache.purge(inventory_id)
+        self.done = True
+
+
+def bump_inventory_revision(inventory_id):
+    """
+    Invalidates the script data cached for an inventory on every node, once the
+    current transaction commits. The bumps of a transaction are made together
+    after the commit, so that writers to an inventory do not wait on each other
+    for its revision row.
+    """
+    if not settings.INVENTORY_SCRIPT_CACHE_ENABLED:
+        return
+    if connection.in_atomic_block:
+        for entry in connection.run_on_commit:
+            if isinstance(entry[1], ScriptRevisionBump) and not entry[1].done:
+                entry[1].inventory_ids.add(inventory_id)
+                return
+    bump = ScriptRevisionBump()
+    bump.inventory_ids.add(inventory_id)
+    connection.on_commit(bump)
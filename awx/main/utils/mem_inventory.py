@@ -2,8 +2,10 @@
 # All Rights Reserved.
 
 # Python
+import json
 import re
 import logging
+import sys
 from collections import OrderedDict
 
 
@@ -12,10 +14,11 @@ from collections import OrderedDict
 logger = logging.getLogger('awx.main.commands.inventory_import')
 
 
-__all__ = ['MemHost', 'MemGroup', 'MemInventory', 'mem_data_to_dict', 'dict_to_mem_data']
+__all__ = ['MemHost', 'MemGroup', 'MemInventory', 'InventoryJSONStream', 'mem_data_to_dict', 'dict_to_mem_data', 'stream_to_mem_data']
 
 
 ipv6_port_re = re.compile(r'^\[([A-Fa-f0-9:]{3,})\]:(\d+?)$')
+whitespace_re = re.compile(r'[ \t\n\r]*')
 
 
 # Models for in-memory objects that represent an inventory
@@ -23,12 +26,16 @@ ipv6_port_re = re.compile(r'^\[([A-Fa-f0-9:]{3,})\]:(\d+?)$')
 
 class MemObject(object):
     """
-    Common code shared between in-memory groups and hosts.
+    Common code shared between in-memory groups and hosts. These are kept
+    small with __slots__, as a large inventory source has hundreds of
+    thousands of hosts.
     """
 
+    __slots__ = ('name',)
+
     def __init__(self, name):
         assert name, 'no name'
-        self.name = name
+        self.name = sys.intern(name)
 
 
 class MemGroup(MemObject):
@@ -36,6 +43,12 @@ class MemGroup(MemObject):
     In-memory representation of an inventory group.
     """
 
+    __slots__ = ('children', 'hosts', 'variables', 'parents', 'all_hosts', 'all_groups', '_children_index', '_hosts_index')
+
+    # children and hosts are plain lists, once they grow past this many
+    # members a set is kept next to them to look up existing members
+    INDEX_THRESHOLD = 16
+
     def __init__(self, name):
         super(MemGroup, self).__init__(name)
         self.children = []
@@ -46,7 +59,8 @@ class MemGroup(MemObject):
         # maps host and group names to hosts to prevent redudant additions
         self.all_hosts = {}
         self.all_groups = {}
-        self.variables = {}
+        self._children_index = None
+        self._hosts_index = None
         logger.debug('Loaded group: %s', self.name)
 
     def __repr__(self):
@@ -56,16 +70,44 @@ class MemGroup(MemObject):
         assert group.name != 'all', 'group name is all'
         assert isinstance(group, MemGroup), 'not MemGroup instance'
         logger.debug('Adding child group %s to parent %s', group.name, self.name)
-        if group not in self.children:
+        if not self.has_child_group(group):
             self.children.append(group)
+            if self._children_index is not None:
+                self._children_index.add(group)
         if self not in group.parents:
             group.parents.append(self)
 
+    def remove_child_group(self, group):
+        self.children.remove(group)
+        if self._children_index is not None:
+            self._children_index.discard(group)
+
+    def has_child_group(self, group):
+        if self._children_index is None:
+            if len(self.children) < self.INDEX_THRESHOLD:
+                return group in self.children
+            self._children_index = set(self.children)
+        return group in self._children_index
+
     def add_host(self, host):
         assert isinstance(host, MemHost), 'not MemHost instance'
         logger.debug('Adding host %s to group %s', host.name, self.name)
-        if host not in self.hosts:
+        if not self.has_host(host):
             self.hosts.append(host)
+            if self._hosts_index is not None:
+                self._hosts_index.add(host)
+
+    def has_host(self, host):
+        if self._hosts_index is None:
+            if len(self.hosts) < self.INDEX_THRESHOLD:
+                return host in self.hosts
+            self._hosts_index = set(self.hosts)
+        return host in self._hosts_index
+
+    def drop_indexes(self):
+        """Frees the sets used to look up members, they are rebuilt when needed"""
+        self._children_index = None
+        self._hosts_index = None
 
     def debug_tree(self, group_names=None):
         group_names = group_names or set()
@@ -88,11 +130,12 @@ class MemHost(MemObject):
     In-memory representation of an inventory host.
     """
 
+    __slots__ = ('variables', 'instance_id')
+
     def __init__(self, name, port=None):
         super(MemHost, self).__init__(name)
         self.variables = {}
         self.instance_id = None
-        self.name = name
         if port:
             # was `ansible_ssh_port` in older Ansible versions
             self.variables['ansible_port'] = port
@@ -174,10 +217,110 @@ class MemInventory(object):
             if not group.children and not group.hosts and not group.variables:
                 logger.debug('Removing empty group %s', name)
                 for parent in group.parents:
-                    if group in parent.children:
-                        parent.children.remove(group)
+                    if parent.has_child_group(group):
+                        parent.remove_child_group(group)
                 del self.all_group.all_groups[name]
 
+    def drop_indexes(self):
+        self.all_group.drop_indexes()
+        for group in self.all_group.all_groups.values():
+            group.drop_indexes()
+
+
+class InventoryJSONStream(object):
+    """
+    Reads the output of `ansible-inventory --list` from a text file object a
+    chunk at a time. Each top level group and each host in _meta.hostvars is
+    decoded on its own, so neither the whole text nor the whole decoded
+    document is held in memory. Iterating yields ('group', name, data) and
+    ('hostvars', name, variables) tuples in the order of the file.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # json.loads shares the keys of all objects in a document, do the
+        # same across the separately decoded values
+        keys = {}
+        self.decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs})
+
+    def _read(self, size=0):
+        """Appends at least size characters to the buffer, returns False at the end of the file"""
+        if self.eof:
+            return False
+        chunk = self.fp.read(max(size, self.CHUNK_SIZE))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self.pos = whitespace_re.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError('Expecting one of {!r}'.format(chars), self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # the value goes past the end of the buffer, read as much again
+            self._read(len(self.buffer) - self.pos)
+
+    def _keys(self):
+        """Yields the keys of the object at the current position, the caller consumes each value"""
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError('Expecting property name', self.buffer, self.pos)
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def __iter__(self):
+        if self._peek() != '{':
+            raise TypeError('Returned JSON must be a dictionary')
+        for key in self._keys():
+            if key == '_meta' and self._peek() == '{':
+                for meta_key in self._keys():
+                    if meta_key == 'hostvars' and self._peek() == '{':
+                        for host_name in self._keys():
+                            yield 'hostvars', host_name, self._decode()
+                    else:
+                        self._decode()
+            else:
+                yield 'group', key, self._decode()
+        if self._peek():
+            raise json.JSONDecodeError('Extra data', self.buffer, self.pos)
+
 
 # Conversion utilities
 
@@ -224,6 +367,85 @@ def mem_data_to_dict(inventory):
     return inventory_data
 
 
+def load_group_data(inventory, k, v):
+    """
+    Adds the group k of the output of `ansible-inventory --list`, with its
+    hosts, variables and children from v, to `inventory`.
+    """
+    group = inventory.get_group(k)
+    if not group:
+        return
+
+    # Load group hosts/vars/children from a dictionary.
+    if isinstance(v, dict):
+        # Process hosts within a group.
+        hosts = v.get('hosts', {})
+        if isinstance(hosts, dict):
+            for hk, hv in hosts.items():
+                host = inventory.get_host(hk)
+                if not host:
+                    continue
+                if isinstance(hv, dict):
+                    host.variables.update(hv)
+                else:
+                    logger.warning('Expected dict of vars for host "%s", got %s instead', hk, str(type(hv)))
+                group.add_host(host)
+        elif isinstance(hosts, (list, tuple)):
+            for hk in hosts:
+                host = inventory.get_host(hk)
+                if not host:
+                    continue
+                group.add_host(host)
+        else:
+            logger.warning('Expected dict or list of "hosts" for group "%s", got %s instead', k, str(type(hosts)))
+        # Process group variables.
+        vars = v.get('vars', {})
+        if isinstance(vars, dict):
+            group.variables.update(vars)
+        else:
+            logger.warning('Expected dict of vars for group "%s", got %s instead', k, str(type(vars)))
+        # Process child groups.
+        children = v.get('children', [])
+        if isinstance(children, (list, tuple)):
+            for c in children:
+                child = inventory.get_group(c, inventory.all_group, child=True)
+                if child and c != 'ungrouped':
+                    group.add_child_group(child)
+        else:
+            logger.warning('Expected list of children for group "%s", got %s instead', k, str(type(children)))
+
+    # Load host names from a list.
+    elif isinstance(v, (list, tuple)):
+        for h in v:
+            host = inventory.get_host(h)
+            if not host:
+                continue
+            group.add_host(host)
+    else:
+        logger.warning('')
+        logger.warning('Expected dict or list for group "%s", got %s instead', k, str(type(v)))
+
+    if k not in ['all', 'ungrouped']:
+        inventory.all_group.add_child_group(group)
+
+
+def load_hostvars(inventory, hostvars, owned=False):
+    """
+    Adds the variables of _meta.hostvars to the hosts of `inventory`, after
+    those of the groups. With owned, the dicts of hostvars are not used
+    anywhere else and become the variables of hosts that have none yet.
+    """
+    for k, v in inventory.all_group.all_hosts.items():
+        meta_hostvars = hostvars.get(k, {})
+        if isinstance(meta_hostvars, dict):
+            if owned and not v.variables:
+                v.variables = meta_hostvars
+            else:
+                v.variables.update(meta_hostvars)
+        else:
+            logger.warning('Expected dict of vars for host "%s", got %s instead', k, str(type(meta_hostvars)))
+
+
 def dict_to_mem_data(data, inventory=None):
     """
     In-place operation on `inventory`, adds contents from `data` to the
@@ -237,68 +459,31 @@ def dict_to_mem_data(data, inventory=None):
     _meta = data.pop('_meta', {})
 
     for k, v in data.items():
-        group = inventory.get_group(k)
-        if not group:
-            continue
-
-        # Load group hosts/vars/children from a dictionary.
-        if isinstance(v, dict):
-            # Process hosts within a group.
-            hosts = v.get('hosts', {})
-            if isinstance(hosts, dict):
-                for hk, hv in hosts.items():
-                    host = inventory.get_host(hk)
-                    if not host:
-                        continue
-                    if isinstance(hv, dict):
-                        host.variables.update(hv)
-                    else:
-                        logger.warning('Expected dict of vars for host "%s", got %s instead', hk, str(type(hv)))
-                    group.add_host(host)
-            elif isinstance(hosts, (list, tuple)):
-                for hk in hosts:
-                    host = inventory.get_host(hk)
-                    if not host:
-                        continue
-                    group.add_host(host)
-            else:
-                logger.warning('Expected dict or list of "hosts" for group "%s", got %s instead', k, str(type(hosts)))
-            # Process group variables.
-            vars = v.get('vars', {})
-            if isinstance(vars, dict):
-                group.variables.update(vars)
-            else:
-                logger.warning('Expected dict of vars for group "%s", got %s instead', k, str(type(vars)))
-            # Process child groups.
-            children = v.get('children', [])
-            if isinstance(children, (list, tuple)):
-                for c in children:
-                    child = inventory.get_group(c, inventory.all_group, child=True)
-                    if child and c != 'ungrouped':
-                        group.add_child_group(child)
-            else:
-                logger.warning('Expected list of children for group "%s", got %s instead', k, str(type(children)))
+        load_group_data(inventory, k, v)
 
-        # Load host names from a list.
-        elif isinstance(v, (list, tuple)):
-            for h in v:
-                host = inventory.get_host(h)
-                if not host:
-                    continue
-                group.add_host(host)
-        else:
-            logger.warning('')
-            logger.warning('Expected dict or list for group "%s", got %s instead', k, str(type(v)))
+    if _meta:
+        load_hostvars(inventory, _meta['hostvars'])
 
-        if k not in ['all', 'ungrouped']:
-            inventory.all_group.add_child_group(group)
+    inventory.drop_indexes()
+    return inventory
 
-    if _meta:
-        for k, v in inventory.all_group.all_hosts.items():
-            meta_hostvars = _meta['hostvars'].get(k, {})
-            if isinstance(meta_hostvars, dict):
-                v.variables.update(meta_hostvars)
-            else:
-                logger.warning('Expected dict of vars for host "%s", got %s instead', k, str(type(meta_hostvars)))
 
+def stream_to_mem_data(fp, inventory=None):
+    """
+    Same as dict_to_mem_data, for the output of `ansible-inventory --list`
+    read from the text file object `fp` with InventoryJSONStream.
+    """
+    if inventory is None:
+        inventory = MemInventory()
+
+    hostvars = {}
+    for kind, k, v in InventoryJSONStream(fp):
+        if kind == 'group':
+            load_group_data(inventory, k, v)
+        elif not inventory.host_filter_re or inventory.host_filter_re.match(k):
+            # groups may come after _meta, so the variables are added at the end
+            hostvars[k] = v
+
+    load_hostvars(inventory, hostvars, owned=True)
+    inventory.drop_indexes()
     return inventory
@@ -0,0 +1,108 @@
+# Copyright (c) 2024 Ansible, Inc.
+# All Rights Reserved.
+
+# Python
+import contextlib
+import threading
+
+# Django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+
+__all__ = ['get_rbac_revision', 'bump_rbac_revision', 'ignore_rbac_revision_bumps', 'cached_accessible_pks']
+
+_rbac_revision = threading.local()
+
+
+@contextlib.contextmanager
+def ignore_rbac_revision_bumps():
+    """
+    Context manager to skip bumping the RBAC revision, for the migrations that
+    rebuild the role ancestry before the revision table exists.
+    """
+    try:
+        previous_value = getattr(_rbac_revision, 'ignore_bumps', False)
+        _rbac_revision.ignore_bumps = True
+        yield
+    finally:
+        _rbac_revision.ignore_bumps = previous_value
+
+
+def get_rbac_revision():
+    """
+    Returns the current revision of the roles, role assignments and object
+    organizations, read from the database so that every node sees a change
+    as soon as it is committed.
+    """
+    if not settings.RBAC_ACCESSIBLE_IDS_CACHE_ENABLED:
+        return None
+    from awx.main.models import RbacRevision  # circular import
+
+    return RbacRevision.get()
+
+
+class RevisionBump:
+    """The bump of the RBAC revision queued on commit of a transaction that changed roles"""
+
+    done = False
+
+    def __call__(self):
+        from awx.main.models import RbacRevision  # circular import
+
+        RbacRevision.bump()
+        self.done = True
+
+
+def bump_pending():
+    """Whether the current transaction changed roles and bumps the revision when it commits"""
+    return connection.in_atomic_block and any(isinstance(entry[1], RevisionBump) and not entry[1].done for entry in connection.run_on_commit)
+
+
+def bump_rbac_revision():
+    """
+    Invalidates the accessible pks cached for all users, on every node, once the
+    current transaction commits. The bump is queued once per transaction and is
+    made after the commit, so that writers do not wait on each other for the
+    revision row.
+    """
+    if not settings.RBAC_ACCESSIBLE_IDS_CACHE_ENABLED or getattr(_rbac_revision, 'ignore_bumps', False):
+        return
+    if not bump_pending():
+        connection.on_commit(RevisionBump())
+
+
+def cached_accessible_pks(cls, accessor, role_field, compute, content_types=None):
+    """
+    Returns the pks of the cls objects that accessor has role_field to, for use
+    in pk__in style filters. compute returns the queryset that finds them
+    through the role tables. With RBAC_ACCESSIBLE_IDS_CACHE_ENABLED, the pks a
+    user has are cached as a list until the RBAC revision changes, the
+    queryset is returned as is for other accessors and for users with more
+    than RBAC_ACCESSIBLE_IDS_CACHE_MAX_IDS of them.
+    """
+    if not settings.RBAC_ACCESSIBLE_IDS_CACHE_ENABLED or not isinstance(accessor, User) or not accessor.pk or accessor.is_superuser:
+        return compute()
+    if bump_pending():
+        # this transaction changed roles, what is cached does not show its changes
+        return compute()
+
+    key = f'awx-rbac-accessible-pks-{get_rbac_revision()}-{accessor.pk}-{cls._meta.label_lower}-{role_field}'
+    if content_types:
+        key += '-' + ','.join(str(ct) for ct in sorted(content_types))
+    pks = cache.get(key)
+    if pks is False:
+        # too many to filter on as a list
+        return compute()
+    if pks is not None:
+        return pks
+
+    qs = compute()
+    max_ids = settings.RBAC_ACCESSIBLE_IDS_CACHE_MAX_IDS
+    pks = [row[0] if isinstance(row, tuple) else row for row in qs[: max_ids + 1]]
+    if len(pks) > max_ids:
+        cache.set(key, False, timeout=settings.RBAC_ACCESSIBLE_IDS_CACHE_TIMEOUT)
+        return qs
+    cache.set(key, pks, timeout=settings.RBAC_ACCESSIBLE_IDS_CACHE_TIMEOUT)
+    return pks
@@ -0,0 +1,151 @@
+# Copyright (c) 2024 Ansible, Inc.
+# All Rights Reserved.
+
+# Python
+import bisect
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+# Django
+from django.conf import settings
+
+__all__ = ['StdoutIndex', 'split_lines']
+
+logger = logging.getLogger('awx.main.utils.stdout')
+
+
+def split_lines(text):
+    # unlike str.splitlines, only break on \n so line numbers match what readlines() gives
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+class StdoutIndex(object):
+    """
+    A compressed copy of the stdout of a finished unified job, with an index of
+    line offsets so that line ranges can be served without rebuilding the
+    whole output from the database.
+
+    The stdout is stored in JOBOUTPUT_ROOT as a sequence of independently
+    zlib compressed chunks of CHUNK_LINES lines each. A JSON sidecar file
+    records the file offset, compressed length, first line, number of lines
+    and number of characters of every chunk. Like the other files in
+    JOBOUTPUT_ROOT, these expire after LOCAL_STDOUT_EXPIRE_TIME and are rebuilt
+    on the next access.
+    """
+
+    VERSION = 1
+    CHUNK_LINES = 1000
+
+    def __init__(self, unified_job):
+        name = '{}-{}.stdout'.format(unified_job.model_to_str(), unified_job.pk)
+        self.data_path = os.path.join(settings.JOBOUTPUT_ROOT, name + '.z')
+        self.index_path = os.path.join(settings.JOBOUTPUT_ROOT, name + '.idx')
+        self.lines = 0
+        self.chars = 0
+        self.chunks = []
+        self._first_lines = []
+
+    def _set_index(self, index):
+        self.lines = index['lines']
+        self.chars = index['chars']
+        self.chunks = index['chunks']
+        self._first_lines = [chunk[2] for chunk in self.chunks]
+
+    def load(self):
+        """Load the index from disk, returns False if there is no complete, current index"""
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != self.VERSION:
+                return False
+            if index['chunks']:
+                offset, length = index['chunks'][-1][:2]
+                if os.path.getsize(self.data_path) < offset + length:
+                    return False
+            elif not os.path.exists(self.data_path):
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self._set_index(index)
+        return True
+
+    def build(self, pieces):
+        """
+        Write the stdout from an iterable of text pieces (that may or may not
+        end on line boundaries) and its index to disk
+        """
+        if not os.path.exists(settings.JOBOUTPUT_ROOT):
+            os.makedirs(settings.JOBOUTPUT_ROOT, exist_ok=True)
+        data_fd, data_tmp = tempfile.mkstemp(prefix=os.path.basename(self.data_path) + '-', dir=settings.JOBOUTPUT_ROOT)
+        index_tmp = None
+        index = {'version': self.VERSION, 'lines': 0, 'chars': 0, 'chunks': []}
+        try:
+            with os.fdopen(data_fd, 'wb') as data_file:
+
+                def write_chunk(chunk_lines):
+                    text = ''.join(chunk_lines)
+                    compressed = zlib.compress(text.encode('utf-8'))
+                    index['chunks'].append([data_file.tell(), len(compressed), index['lines'], len(chunk_lines), len(text)])
+                    data_file.write(compressed)
+                    index['lines'] += len(chunk_lines)
+                    index['chars'] += len(text)
+
+                pending = ''
+                chunk_lines = []
+                for piece in pieces:
+                    pending += piece
+                    parts = pending.split('\n')
+                    pending = parts.pop()
+                    for part in parts:
+                        chunk_lines.append(part + '\n')
+                        if len(chunk_lines) >= self.CHUNK_LINES:
+                            write_chunk(chunk_lines)
+                            chunk_lines = []
+                if pending:
+                    chunk_lines.append(pending)
+                if chunk_lines:
+                    write_chunk(chunk_lines)
+            os.rename(data_tmp, self.data_path)
+            index_fd, index_tmp = tempfile.mkstemp(prefix=os.path.basename(self.index_path) + '-', dir=settings.JOBOUTPUT_ROOT)
+            with os.fdopen(index_fd, 'w') as index_file:
+                json.dump(index, index_file)
+            # the index is moved into place last, it is what marks the stored stdout as complete
+            os.rename(index_tmp, self.index_path)
+        finally:
+            for path in (data_tmp, index_tmp):
+                if path and os.path.exists(path):
+                    os.unlink(path)
+        self._set_index(index)
+        return self
+
+    def _read_chunk(self, data_file, chunk):
+        data_file.seek(chunk[0])
+        return zlib.decompress(data_file.read(chunk[1])).decode('utf-8')
+
+    def read_lines(self, start, stop):
+        """Return the list of lines [start, stop), reading only the chunks that contain them"""
+        stop = min(stop, self.lines)
+        if start >= stop:
+            return []
+        lines = []
+        first = bisect.bisect_right(self._first_lines, start) - 1
+        with open(self.data_path, 'rb') as data_file:
+            for chunk in self.chunks[first:]:
+                if chunk[2] >= stop:
+                    break
+                chunk_lines = split_lines(self._read_chunk(data_file, chunk))
+                lines.extend(chunk_lines[max(start - chunk[2], 0) : stop - chunk[2]])
+        return lines
+
+    def iter_text(self):
+        """Yield the whole stdout, one decompressed chunk at a time"""
+        with open(self.data_path, 'rb') as data_file:
+            for chunk in self.chunks:
+                yield self._read_chunk(data_file, chunk)
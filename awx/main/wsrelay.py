@@ -31,6 +31,10 @@ def wrap_broadcast_msg(group, message: str):
     return dict(group=group, message=message)
 
 
+def wrap_broadcast_batch(group, messages: list):
+    return dict(group=group, messages=messages)
+
+
 def get_local_host():
     Instance = apps.get_model('main', 'Instance')
     return Instance.objects.my_hostname()
@@ -55,6 +59,7 @@ class WebsocketRelayConnection:
         self.verify_ssl = verify_ssl
         self.channel_layer = None
         self.producers = dict()
+        self.receive_tasks = dict()
         self.connected = False
 
     async def run_loop(self, websocket: aiohttp.ClientWebSocketResponse):
@@ -160,6 +165,43 @@ class WebsocketRelayConnection:
                     except KeyError:
                         logger.warning(f"Producer {name} not found.")
 
+    async def queue_depth(self, consumer_channel):
+        """
+        Number of messages waiting in Redis to be read by this process. The
+        channel layer keeps the messages of all the channels of a process in
+        one sorted set, so this is the backlog of all the producers of the relay.
+        """
+        process_channel = self.channel_layer.non_local_name(consumer_channel)
+        async with self.channel_layer.connection(self.channel_layer.consistent_hash(process_channel)) as connection:
+            return await connection.zcard(self.channel_layer.prefix + process_channel)
+
+    async def receive_batch(self, consumer_channel, timeout):
+        """
+        Waits up to timeout seconds for a message, then adds the messages that
+        arrive within BROADCAST_WEBSOCKET_BATCH_MAX_DELAY_MS, up to
+        BROADCAST_WEBSOCKET_BATCH_SIZE messages in total.
+
+        The channel layer loses the message it is reading if receive() is
+        cancelled, so a receive() that does not finish in time is left running
+        and the next batch starts with it.
+        """
+        messages = []
+        deadline = self.event_loop.time() + timeout
+        while len(messages) < settings.BROADCAST_WEBSOCKET_BATCH_SIZE:
+            receiving = self.receive_tasks.get(consumer_channel)
+            if receiving is None:
+                receiving = self.receive_tasks[consumer_channel] = self.event_loop.create_task(self.channel_layer.receive(consumer_channel))
+            done, _ = await asyncio.wait({receiving}, timeout=max(deadline - self.event_loop.time(), 0))
+            if not done:
+                if not messages:
+                    raise asyncio.TimeoutError()
+                break
+            del self.receive_tasks[consumer_channel]
+            messages.append(receiving.result())
+            if len(messages) == 1:
+                deadline = self.event_loop.time() + settings.BROADCAST_WEBSOCKET_BATCH_MAX_DELAY_MS / 1000
+        return messages
+
     async def run_producer(self, name, websocket, group):
         try:
             logger.info(f"Starting producer for {name}")
@@ -170,7 +212,20 @@ class WebsocketRelayConnection:
 
             while True:
                 try:
-                    msg = await asyncio.wait_for(self.channel_layer.receive(consumer_channel), timeout=10)
+                    received = await self.receive_batch(consumer_channel, timeout=10)
+                except asyncio.TimeoutError:
+                    current_subscriptions = self.producers[name]["subscriptions"]
+                    if len(current_subscriptions) == 0:
+                        logger.info(f"Producer {name} has no subscribers, shutting down.")
+                        return
+
+                    continue
+                except aioredis.errors.ConnectionClosedError:
+                    logger.info(f"Producer {name} lost connection to Redis, shutting down.")
+                    return
+
+                messages = []
+                for msg in received:
                     if not msg.get("needs_relay"):
                         # This is added in by emit_channel_notification(). It prevents us from looping
                         # in the event that we are sharing a redis with a web instance. We'll see the
@@ -184,18 +239,16 @@ class WebsocketRelayConnection:
                     # still need to act on it. It seems weird, but it's necessary.
                     msg = dict(msg)
                     del msg["needs_relay"]
-                except asyncio.TimeoutError:
-                    current_subscriptions = self.producers[name]["subscriptions"]
-                    if len(current_subscriptions) == 0:
-                        logger.info(f"Producer {name} has no subscribers, shutting down.")
-                        return
+                    messages.append(msg)
 
+                if not messages:
                     continue
-                except aioredis.errors.ConnectionClosedError:
-                    logger.info(f"Producer {name} lost connection to Redis, shutting down.")
-                    return
-
-                await websocket.send_json(wrap_broadcast_msg(group, msg))
+                if len(messages) == 1:
+                    await websocket.send_json(wrap_broadcast_msg(group, messages[0]))
+                else:
+                    # one frame for all of them, the RelayConsumer of the web node unpacks it
+                    await websocket.send_json(wrap_broadcast_batch(group, messages))
+                self.stats.record_batch_sent(len(messages), await self.queue_depth(consumer_channel))
         except ConnectionResetError:
             # This can be hit when a web node is scaling down and we try to write to it.
             # There's really nothing to do in this case and it's a fairly typical thing to happen.
@@ -208,6 +261,9 @@ class WebsocketRelayConnection:
             # something goes wrong in here.
             logger.exception(f"Event relay producer {name} crashed")
         finally:
+            receiving = self.receive_tasks.pop(consumer_channel, None)
+            if receiving is not None:
+                receiving.cancel()
             await self.channel_layer.group_discard(group, consumer_channel)
             del self.producers[name]
 
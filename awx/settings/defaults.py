@@ -138,6 +138,19 @@ NAMED_URL_GRAPH = {}
 # Note: This setting may be overridden by database settings.
 SCHEDULE_MAX_JOBS = 10
 
+# Recompute the next run of all due schedules in memory and save them with one
+# bulk update, and wake up the task manager once after all scheduled jobs of a
+# periodic scheduler run are spawned, instead of once per job.
+AWX_PERIODIC_SCHEDULER_BATCH = False
+
+# Number of parsed schedule rrules each process keeps in memory, along with
+# their first and last occurrence and a window of their next
+# SCHEDULE_RRULE_CACHE_OCCURRENCES occurrences, so that saving schedules, the
+# periodic scheduler and the schedule API do not parse and expand the same
+# rrule over and over. 0 disables the cache.
+SCHEDULE_RRULE_CACHE_SIZE = 0
+SCHEDULE_RRULE_CACHE_OCCURRENCES = 20
+
 # Bulk API related settings
 # Maximum number of jobs that can be launched in 1 bulk job
 BULK_JOB_MAX_LAUNCH = 100
@@ -221,6 +234,33 @@ MAX_WEBSOCKET_EVENT_RATE = 30
 # Note that this can be recreated if the stdout is downloaded
 LOCAL_STDOUT_EXPIRE_TIME = 2592000
 
+# Keep a compressed, line-indexed copy of the stdout of finished jobs under
+# JOBOUTPUT_ROOT, so stdout ranges and downloads do not rebuild the output from
+# the job events every time. Like other stdout files, these expire after
+# LOCAL_STDOUT_EXPIRE_TIME.
+STDOUT_INDEX_ENABLED = False
+
+# Keep a compressed copy of the script data written for the jobs of an inventory
+# under INVENTORY_SCRIPT_CACHE_ROOT, and reuse it for later jobs until a host,
+# group, group membership or the inventory itself changes on any node. Smart
+# and constructed inventories are always rendered from the database. Copies not
+# used for INVENTORY_SCRIPT_CACHE_MAX_AGE seconds are removed by the periodic
+# cleanup, and all of them when the dispatcher starts with the cache disabled,
+# since changes are not tracked then.
+INVENTORY_SCRIPT_CACHE_ENABLED = False
+INVENTORY_SCRIPT_CACHE_ROOT = '/var/lib/awx/inventory_cache/'
+INVENTORY_SCRIPT_CACHE_MAX_AGE = 86400
+
+# Stream the inventory of a job from the database into its inventory script,
+# instead of building the whole inventory in memory first. Memory use no longer
+# grows with the number of hosts, but the script cache above is not used.
+INVENTORY_SCRIPT_STREAMING = False
+
+# Compute the collapsible tree summary served by the job events children_summary
+# endpoint as soon as the callback receiver has finished saving the events of a
+# job, instead of on the first request for it.
+JOB_EVENT_TREE_SUMMARY_PRECOMPUTE = False
+
 # The number of processes spawned by the callback receiver to process job
 # events into the database
 JOB_EVENT_WORKERS = 4
@@ -229,6 +269,38 @@ JOB_EVENT_WORKERS = 4
 # writes in memory before flushing via JobEvent.objects.bulk_create()
 JOB_EVENT_BUFFER_SECONDS = 1
 
+# How the callback receiver writes buffered events to the database
+#   'bulk_create': multi-row INSERT via Model.objects.bulk_create(), retrying
+#                  failed batches one event at a time
+#   'copy': stream each batch into the event table with PostgreSQL COPY,
+#           isolating bad rows by splitting failed batches in half
+# 'copy' requires PostgreSQL; other databases always use 'bulk_create'
+JOB_EVENT_INGEST_MODE = 'bulk_create'
+
+# The maximum number of messages each callback receiver worker pops from
+# redis in a single round trip; 1 pops one message per BLPOP
+JOB_EVENT_REDIS_BATCH_SIZE = 1
+
+# Events produced while processing ansible-runner output are sent to the
+# callback queue in groups of up to this many; 1 sends each event as it arrives
+JOB_EVENT_DISPATCH_BUFFER_SIZE = 1
+
+# The maximum number of seconds buffered events are held back before they are
+# sent to the callback queue
+JOB_EVENT_DISPATCH_BUFFER_SECONDS = 0.25
+
+# Serializer used for events sent to the callback queue, 'json' or 'orjson'
+# 'orjson' falls back to 'json' if the orjson module is not installed
+JOB_EVENT_DISPATCH_SERIALIZER = 'json'
+
+# Serialized events of at least this many bytes are compressed before being
+# sent to the callback queue; 0 disables compression
+JOB_EVENT_DISPATCH_COMPRESS_THRESHOLD = 0
+
+# Compression used for large events, 'zlib' or 'lz4'
+# 'lz4' falls back to 'zlib' if the lz4 module is not installed
+JOB_EVENT_DISPATCH_COMPRESSION = 'zlib'
+
 # The interval at which callback receiver statistics should be
 # recorded
 JOB_EVENT_STATISTICS_INTERVAL = 5
@@ -245,12 +317,26 @@ SUBSYSTEM_METRICS_REDIS_KEY_PREFIX = "awx_metrics"
 # Histogram buckets for the callback_receiver_batch_events_insert_db metric
 SUBSYSTEM_METRICS_BATCH_INSERT_BUCKETS = [10, 50, 150, 350, 650, 2000]
 
+# Histogram buckets for the callback_receiver_events_popped_batch_size metric
+SUBSYSTEM_METRICS_REDIS_POP_BUCKETS = [1, 10, 50, 100, 250, 500, 1000]
+
+# Histogram buckets for the periodic_scheduler_launch_latency_seconds metric
+SUBSYSTEM_METRICS_SCHEDULE_LAUNCH_LATENCY_BUCKETS = [1, 5, 15, 30, 60, 300]
+
 # Interval in seconds for sending local metrics to other nodes
 SUBSYSTEM_METRICS_INTERVAL_SEND_METRICS = 3
 
 # Interval in seconds for saving local metrics to redis
 SUBSYSTEM_METRICS_INTERVAL_SAVE_TO_REDIS = 2
 
+# Where the subsystem metrics of a node are aggregated. 'redis' saves every
+# value to a redis hash. 'local' saves the values of each process to a memory
+# mapped file under SUBSYSTEM_METRICS_LOCAL_DIR, adds those of all processes of
+# the node up when read, serves them through prometheus_client collectors and
+# only sends a compact snapshot of them to redis for the other nodes.
+SUBSYSTEM_METRICS_BACKEND = 'redis'
+SUBSYSTEM_METRICS_LOCAL_DIR = '/var/lib/awx/subsystem_metrics/'
+
 # Record task manager metrics at the following interval in seconds
 # If using Prometheus, it is recommended to be => the Prometheus scrape interval
 SUBSYSTEM_METRICS_TASK_MANAGER_RECORD_INTERVAL = 15
@@ -263,6 +349,12 @@ START_TASK_LIMIT = 100
 TASK_MANAGER_TIMEOUT = 300
 TASK_MANAGER_TIMEOUT_GRACE_PERIOD = 60
 
+# Keep the active tasks loaded by the task manager in memory between runs, and
+# only load the tasks that were created or changed since the previous run. All
+# tasks are loaded again every TASK_MANAGER_INCREMENTAL_REBUILD_INTERVAL seconds.
+TASK_MANAGER_INCREMENTAL = False
+TASK_MANAGER_INCREMENTAL_REBUILD_INTERVAL = 300
+
 # Number of seconds _in addition to_ the task manager timeout a job can stay
 # in waiting without being reaped
 JOB_WAITING_GRACE_PERIOD = 60
@@ -617,6 +709,27 @@ GALAXY_TASK_ENV = {'ANSIBLE_FORCE_COLOR': 'false', 'GIT_SSH_COMMAND': "ssh -o St
 # Rebuild Host Smart Inventory memberships.
 AWX_REBUILD_SMART_MEMBERSHIP = False
 
+# Adjust the host and group counts of an inventory by the changes already known
+# after a job run or an inventory import, instead of counting all of its hosts,
+# groups and inventory sources again. Hosts and groups changed through the API
+# still cause a full count. So does one in every
+# INVENTORY_COMPUTED_FIELDS_RECOUNT_INTERVAL job runs and imports of an
+# inventory, which corrects any drift of the adjusted counts.
+INVENTORY_COMPUTED_FIELDS_INCREMENTAL = False
+INVENTORY_COMPUTED_FIELDS_RECOUNT_INTERVAL = 100
+
+# How inventory updates write the imported hosts and groups to the database
+#   'orm': create, update and delete them one at a time through the Django ORM
+#   'bulk': stage the imported data in temporary tables with COPY and apply it
+#           with a few set based statements. Hosts and groups that are created
+#           or updated this way get no activity stream entries of their own.
+# 'bulk' requires PostgreSQL; other databases always use 'orm'
+INVENTORY_IMPORT_MODE = 'orm'
+
+# Parse the output of ansible-inventory a group and a host at a time as it is
+# read, instead of reading and decoding all of it before the import starts.
+INVENTORY_IMPORT_STREAM_JSON = False
+
 # By default, allow arbitrary Jinja templating in extra_vars defined on a Job Template
 ALLOW_JINJA_IN_EXTRA_VARS = 'template'
 
@@ -653,6 +766,15 @@ AWX_ISOLATION_BASE_PATH = tempfile.gettempdir()
 # Note: This setting may be overridden by database settings.
 AWX_ANSIBLE_CALLBACK_PLUGINS = ""
 
+# Number of threads used to write and read the per-host files of the fact cache
+# before and after a job runs. With 1, the files are handled one at a time.
+ANSIBLE_FACT_CACHE_IO_THREADS = 1
+
+# When facts gathered by a job change, send only the top level keys that were
+# added or changed (and the names of those removed) to the system tracking
+# logger, instead of all of the facts of the host.
+ANSIBLE_FACT_LOG_DIFF = False
+
 # Automatically remove nodes that have missed their heartbeats after some time
 AWX_AUTO_DEPROVISION_INSTANCES = False
 
@@ -1048,6 +1170,13 @@ BROADCAST_WEBSOCKET_NEW_INSTANCE_POLL_RATE_SECONDS = 10
 # How often websocket process will generate stats
 BROADCAST_WEBSOCKET_STATS_POLL_RATE_SECONDS = 5
 
+# Maximum number of messages the websocket relay sends to a web node in one
+# frame, and the time in milliseconds it waits for more messages to fill it.
+# Web nodes of older versions only understand frames of a single message,
+# which is what the default of 1 sends.
+BROADCAST_WEBSOCKET_BATCH_SIZE = 1
+BROADCAST_WEBSOCKET_BATCH_MAX_DELAY_MS = 20
+
 # How often should web instances advertise themselves?
 BROADCAST_WEBSOCKET_BEACON_FROM_WEB_RATE_SECONDS = 15
 
@@ -1159,6 +1288,26 @@ ANSIBLE_BASE_ROLE_CREATOR_NAME = '{cls.__name__} Creator'
 # Use the new Gateway RBAC system for evaluations? You should. We will remove the old system soon.
 ANSIBLE_BASE_ROLE_SYSTEM_ACTIVATED = True
 
+# How the ancestors table of the old role system is rebuilt when the role
+# hierarchy changes, only used while ANSIBLE_BASE_ROLE_SYSTEM_ACTIVATED is off.
+# 'sweep'   - updates the changed roles, then their children, one layer of the
+#             hierarchy at a time until a layer changes nothing
+# 'closure' - finds every role whose ancestors can change, and what they should
+#             be, with recursive queries over temporary tables, then applies
+#             the difference ROLE_ANCESTRY_REBUILD_CHUNK_SIZE roles at a time
+ROLE_ANCESTRY_REBUILD_MODE = 'sweep'
+ROLE_ANCESTRY_REBUILD_CHUNK_SIZE = 5000
+
+# Cache the pks of the objects a user has a role to, per model and role, and
+# filter list querysets on them instead of joining through the role tables on
+# every request. The cache keys include a revision kept in the database, so any
+# change to roles, role assignments or the organization of an object invalidates
+# the cache of all users on every node once it is committed. Users with more
+# than RBAC_ACCESSIBLE_IDS_CACHE_MAX_IDS objects of a model keep the join.
+RBAC_ACCESSIBLE_IDS_CACHE_ENABLED = False
+RBAC_ACCESSIBLE_IDS_CACHE_MAX_IDS = 5000
+RBAC_ACCESSIBLE_IDS_CACHE_TIMEOUT = 300
+
 # Permissions a user will get when creating a new item
 ANSIBLE_BASE_CREATOR_DEFAULTS = ['change', 'delete', 'execute', 'use', 'adhoc', 'approve', 'update', 'view']
 